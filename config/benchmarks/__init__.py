@@ -0,0 +1,6 @@
+"""
+Офлайн-бенчмарки бота на локальном мок-сервере бирж.
+
+Запуск из каталога config:
+    python -m benchmarks --iterations 200 --latency 0.05 --jitter 0.02
+"""
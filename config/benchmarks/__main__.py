@@ -0,0 +1,283 @@
+"""
+python -m benchmarks [--iterations N] [--concurrency C] [--latency S] [--jitter S]
+                     [--error-rate P] [--timeout-rate P] [--json FILE] [--baseline FILE]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tracemalloc
+
+from benchmarks.fixtures import Market
+from benchmarks.mock_server import FaultInjection, MockServerProcess
+from benchmarks.runner import bench_async, bench_sync, compare, report, save
+from charts import ChartRenderer, render_spread_chart
+from constants import CHART_WORKERS
+from funding_fetcher import (
+    BULK_FETCHERS,
+    BULK_SCHEMAS,
+    funding_flights,
+    get_all_funding,
+    get_history_all,
+    history_flights,
+    history_health,
+    live_health,
+)
+from http_client import HttpClientManager
+from series import FundingFrame
+from snapshot import FundingSnapshot
+from subscriptions import AlertEngine, SubscriptionStore
+from utils import calc_max_spread, normalize_funding_data
+
+BENCHMARKS = (
+    "get_all_funding",
+    "get_history_all",
+    "normalize_funding_data",
+    "calc_max_spread",
+    "decode_bulk",
+    "decode_bulk_stdlib",
+    "render",
+    "render_pool",
+    "alerts_evaluate",
+    "alerts_full_scan",
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--symbols", type=int, default=500, help="размер синтетического рынка")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка ответа биржи, с")
+    parser.add_argument("--jitter", type=float, default=0.01, help="разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="доля зависших запросов")
+    parser.add_argument("--rate-limit", action="store_true", help="включить лимитер запросов")
+    parser.add_argument("--rules", type=int, default=50000, help="правил подписок в замерах alerts_*")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="запустить только эти замеры")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--baseline", help="сравнить с сохраненными результатами")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение (доля)")
+    return parser.parse_args(argv)
+
+
+class _CapturingHttp:
+    """
+    Пропускает запросы к HttpClientManager и запоминает тело последнего успешного ответа
+    """
+
+    def __init__(self, http: HttpClientManager):
+        self.http = http
+        self.content = b""
+
+    async def get(self, url: str, **kwargs):
+        response = await self.http.get(url, **kwargs)
+        if response.status_code == 200:
+            self.content = response.content
+        return response
+
+
+async def _bulk_bodies(http: HttpClientManager) -> dict:
+    bodies = {}
+    for exchange, fetcher in BULK_FETCHERS.items():
+        capture = _CapturingHttp(http)
+        # С --error-rate часть ответов — ошибки, для замера нужен настоящий ответ
+        for _ in range(10):
+            await fetcher(capture)
+            if capture.content:
+                break
+        bodies[exchange] = capture.content
+    return bodies
+
+
+def _peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _alert_engine(market: Market, rules: int) -> AlertEngine:
+    """
+    AlertEngine над синтетическим снимком: `rules` правил по символам рынка
+    и несколько правил на все символы
+    """
+    rnd = random.Random(1)
+    snapshot = FundingSnapshot()
+    exchanges = ("BINANCE", "BYBIT", "OKX", "GATE")
+    for exchange in exchanges:
+        snapshot.update(exchange, [
+            {"symbol": s, "funding_rate": market.rate(exchange, s), "next_funding_time": 0} for s in market.symbols
+        ])
+    store = SubscriptionStore(":memory:")
+    for i in range(rules):
+        symbol = "*" if i % 1000 == 0 else rnd.choice(market.symbols)
+        metric, op = rnd.choice((("rate", ">"), ("rate", "<"), ("spread", ">"), ("spread", "<")))
+        threshold = round(rnd.uniform(0, 3) if op == ">" or metric == "spread" else rnd.uniform(-1, 1), 3)
+        store.add(i, symbol, metric, op, threshold)
+    engine = AlertEngine(store, snapshot, bot=None)
+    engine.sync()
+    engine.evaluate()
+    return engine
+
+
+def _tick(engine: AlertEngine, market: Market, i: int):
+    """
+    Обновление снимка, как из потока: 5% символов одной биржи получают новую ставку
+    """
+    rnd = random.Random(i)
+    exchange = ("BINANCE", "BYBIT", "OKX", "GATE")[i % 4]
+    symbols = rnd.sample(market.symbols, max(1, len(market.symbols) // 20))
+    engine.snapshot.upsert(exchange, [
+        {"symbol": s, "funding_rate": market.rate(exchange, s) * rnd.uniform(0.5, 1.5)} for s in symbols
+    ])
+
+
+def _full_scan(engine: AlertEngine):
+    """
+    Для сравнения: проверка всех правил по всем символам на каждом обновлении
+    """
+    symbols, _, rates = engine.snapshot.matrix()
+    values = engine._values_of(rates)
+    fired = 0
+    for rule in engine.index.rules.values():
+        column = values[:, rule.series]
+        if rule.symbol == "*":
+            fired += int((column > rule.threshold if rule.op == ">" else column < rule.threshold).sum())
+        else:
+            i = engine._positions.get(rule.symbol)
+            fired += i is not None and rule.matches(column[i])
+    return fired
+
+
+def _reset_state():
+    """
+    Между замерами: без кэша результатов и без накопленного состояния здоровья бирж
+    """
+    funding_flights.ttl = 0
+    history_flights.ttl = 0
+    live_health._exchanges.clear()
+    history_health._exchanges.clear()
+
+
+async def run(args) -> list:
+    market = Market(args.symbols)
+    faults = FaultInjection(args.latency, args.jitter, args.error_rate, args.timeout_rate)
+    server = MockServerProcess(args.symbols, faults).start()
+    http = HttpClientManager(rate_limit=args.rate_limit, transport_factory=server.transport)
+    selected = set(args.only or BENCHMARKS)
+    symbols = market.symbols
+    results = []
+
+    try:
+        if "get_all_funding" in selected:
+            _reset_state()
+            results.append(await bench_async(
+                "get_all_funding",
+                lambda i: get_all_funding(symbols[i % len(symbols)], http),
+                args.iterations,
+                args.concurrency,
+            ))
+
+        if "get_history_all" in selected:
+            _reset_state()
+            results.append(await bench_async(
+                "get_history_all",
+                lambda i: get_history_all(symbols[i % len(symbols)], http, 7),
+                max(1, args.iterations // 5),
+                args.concurrency,
+            ))
+
+        rows, _ = await get_all_funding("BTCUSDT", http)
+        if "normalize_funding_data" in selected:
+            results.append(bench_sync(
+                "normalize_funding_data", lambda i: normalize_funding_data(rows), args.iterations * 100
+            ))
+        if "calc_max_spread" in selected:
+            normalized = normalize_funding_data(rows)
+            results.append(bench_sync("calc_max_spread", lambda i: calc_max_spread(normalized), args.iterations * 100))
+
+        decoders = {
+            # массовые ответы разбираются по схеме, только нужные поля
+            "decode_bulk": lambda body, schema: schema.decode(body),
+            # как раньше: весь ответ в объекты Python, затем выборка полей
+            "decode_bulk_stdlib": lambda body, schema: schema.from_python(json.loads(body)),
+        }
+        if selected & set(decoders):
+            bodies = await _bulk_bodies(http)
+            for name, decode in decoders.items():
+                if name not in selected:
+                    continue
+
+                def run_all(i, decode=decode):
+                    return [decode(body, BULK_SCHEMAS[e]) for e, body in bodies.items()]
+
+                results.append(bench_sync(name, run_all, args.iterations))
+                print(f"{name}: пик памяти {_peak_memory(lambda: run_all(0)) / 2**20:.1f} МБ")
+
+        frame = (await get_history_all("BTCUSDT", http, 30, ["BINANCE"])).filter(exchange="BINANCE")
+        if not len(frame):
+            frame = FundingFrame.from_columns("BINANCE", "BTCUSDT", [0.0001, 0.0002], [0, 8 * 3600 * 1000])
+        chart_args = ("BTCUSDT", "BINANCE", frame.datetimes(), frame.cumsum(100 * 100), *frame.stats(100 * 100))
+        render_iterations = max(1, args.iterations // 10)
+        if "render" in selected:
+            results.append(bench_sync("render", lambda i: render_spread_chart(*chart_args), render_iterations))
+        if "render_pool" in selected:
+            renderer = ChartRenderer()
+            try:
+                # запуск процессов не замеряется
+                await asyncio.gather(
+                    *(renderer.render(render_spread_chart, *chart_args) for _ in range(CHART_WORKERS))
+                )
+                results.append(await bench_async(
+                    "render_pool",
+                    lambda i: renderer.render(render_spread_chart, *chart_args),
+                    render_iterations,
+                    renderer.max_pending,
+                ))
+            finally:
+                renderer.close()
+
+        if "alerts_evaluate" in selected or "alerts_full_scan" in selected:
+            engine = _alert_engine(market, args.rules)
+            print(f"Правил подписок: {len(engine.index.rules)}, символов: {len(symbols)}")
+            if "alerts_evaluate" in selected:
+                def evaluate(i):
+                    _tick(engine, market, i)
+                    engine.evaluate()
+
+                results.append(bench_sync("alerts_evaluate", evaluate, args.iterations))
+            if "alerts_full_scan" in selected:
+                def full_scan(i):
+                    _tick(engine, market, i)
+                    _full_scan(engine)
+
+                results.append(bench_sync("alerts_full_scan", full_scan, max(1, args.iterations // 10)))
+    finally:
+        await http.close()
+        server.stop()
+
+    print(f"Запросов к мок-серверу: {server.requests}")
+    return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print(report(results))
+    if args.json:
+        save(results, args.json)
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print("\nРегрессии:\n" + "\n".join(regressions))
+            return 1
+        print("\nРегрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
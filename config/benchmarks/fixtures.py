@@ -0,0 +1,448 @@
+"""
+Ответы бирж для мок-сервера.
+
+Если для запроса есть записанный ответ (benchmarks/fixtures/<host>/<path>__<query>.json,
+см. benchmarks.record), отдается он. Иначе ответ строится по синтетическому
+рынку в точности в том формате, который разбирает funding_fetcher.
+"""
+import json
+import math
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlencode
+
+from funding_fetcher import HOUR_MS
+from symbol_index import native_symbol
+from utils import canonical_symbol
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Ставки по истории за столько дней назад
+HISTORY_DEPTH_DAYS = 100
+FUNDING_PERIOD_MS = 8 * HOUR_MS
+
+MAJORS = ("BTC", "ETH", "SOL", "XRP", "DOGE", "ADA", "AVAX", "LINK", "TON", "TRX")
+
+
+class Market:
+    """
+    Синтетический рынок: `size` USDT-символов с детерминированными ставками
+    """
+
+    def __init__(self, size: int = 500):
+        bases = list(MAJORS[:size]) + [f"T{i:04d}" for i in range(max(0, size - len(MAJORS)))]
+        self.symbols = [f"{base}USDT" for base in bases]
+        self._known = set(self.symbols)
+
+    def has(self, native: str) -> bool:
+        return canonical_symbol(native) in self._known
+
+    @staticmethod
+    def _seed(exchange: str, symbol: str) -> int:
+        return zlib.crc32(f"{exchange}:{canonical_symbol(symbol)}".encode())
+
+    def rate(self, exchange: str, symbol: str, at: int = None) -> float:
+        """
+        Ставка в момент `at` (мс): у каждой пары (биржа, символ) своя фаза и амплитуда
+        """
+        seed = self._seed(exchange, symbol)
+        at = int(time.time() * 1000) if at is None else at
+        phase = (seed % 1000) / 1000 * 2 * math.pi
+        amplitude = 0.0001 + (seed % 7) * 0.00005
+        return round(amplitude * math.sin(at / (3 * 24 * HOUR_MS) + phase) + 0.0001, 8)
+
+    @staticmethod
+    def next_funding(now: int = None) -> int:
+        now = int(time.time() * 1000) if now is None else now
+        return (now // FUNDING_PERIOD_MS + 1) * FUNDING_PERIOD_MS
+
+    def history(self, exchange: str, symbol: str, start: int = None, end: int = None) -> list:
+        """
+        Выплаты [(время, ставка)] по возрастанию времени в интервале [start, end]
+        """
+        now = int(time.time() * 1000)
+        oldest = now - HISTORY_DEPTH_DAYS * 24 * HOUR_MS
+        start = oldest if start is None else max(int(start), oldest)
+        end = now if end is None else min(int(end), now)
+        first = -(-start // FUNDING_PERIOD_MS) * FUNDING_PERIOD_MS
+        return [(t, self.rate(exchange, symbol, t)) for t in range(first, end + 1, FUNDING_PERIOD_MS)]
+
+    def natives(self, exchange: str) -> list:
+        return [native_symbol(exchange, symbol) for symbol in self.symbols]
+
+
+def _page(items: list, page: int, page_size: int):
+    """
+    Страница `page` (с 1) и число страниц
+    """
+    total = max(1, math.ceil(len(items) / page_size))
+    return items[(page - 1) * page_size:page * page_size], total
+
+
+def _int(query: dict, key: str, default: int = None):
+    value = query.get(key)
+    return default if value in (None, "") else int(value)
+
+
+# ---------- Текущие ставки по одному символу ----------
+
+def binance_premium_index(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol")
+    if symbol is None:
+        return [
+            {"symbol": s, "lastFundingRate": str(market.rate("BINANCE", s)), "nextFundingTime": market.next_funding()}
+            for s in market.natives("BINANCE")
+        ]
+    if not market.has(symbol):
+        return 400, {"code": -1121, "msg": "Invalid symbol."}
+    return {"symbol": symbol, "lastFundingRate": str(market.rate("BINANCE", symbol)),
+            "nextFundingTime": market.next_funding()}
+
+
+def bingx_premium_index(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol")
+    if symbol is None:
+        return {"code": 0, "data": [
+            {"symbol": s, "lastFundingRate": str(market.rate("BINGX", s)), "nextFundingTime": market.next_funding()}
+            for s in market.natives("BINGX")
+        ]}
+    if not market.has(symbol):
+        return {"code": 109400, "data": {}}
+    return {"code": 0, "data": {"symbol": symbol, "lastFundingRate": str(market.rate("BINGX", symbol)),
+                                "nextFundingTime": market.next_funding()}}
+
+
+def bitget_current_fund_rate(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol")
+    if symbol is None:
+        return {"code": "00000", "data": [
+            {"symbol": s, "fundingRate": str(market.rate("BITGET", s)), "nextUpdate": market.next_funding()}
+            for s in market.natives("BITGET")
+        ]}
+    if not market.has(symbol):
+        return {"code": "40034", "data": []}
+    return {"code": "00000", "data": [
+        {"symbol": symbol, "fundingRate": str(market.rate("BITGET", symbol)), "nextUpdate": market.next_funding()}
+    ]}
+
+
+def bitmart_details(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol")
+    natives = market.natives("BITMART") if symbol is None else ([symbol] if market.has(symbol) else [])
+    return {"code": 1000, "data": {"symbols": [
+        {"symbol": s, "funding_rate": str(market.rate("BITMART", s)), "funding_time": market.next_funding()}
+        for s in natives
+    ]}}
+
+
+def bybit_tickers(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol")
+    natives = market.natives("BYBIT") if symbol is None else ([symbol] if market.has(symbol) else [])
+    return {"retCode": 0, "result": {"category": query.get("category"), "list": [
+        {"symbol": s, "fundingRate": str(market.rate("BYBIT", s)), "nextFundingTime": str(market.next_funding())}
+        for s in natives
+    ]}}
+
+
+def coinex_funding_rate(market: Market, query: dict, tail: str):
+    symbol = query.get("market", "")
+    if not market.has(symbol):
+        return {"code": 0, "data": []}
+    return {"code": 0, "data": [
+        {"market": symbol, "latest_funding_rate": str(market.rate("COINEX", symbol)),
+         "latest_funding_time": market.next_funding()}
+    ]}
+
+
+def gate_contracts(market: Market, query: dict, tail: str):
+    def contract(s):
+        return {"name": s, "funding_rate": str(market.rate("GATE", s)),
+                "funding_next_apply": market.next_funding() // 1000, "in_delisting": False}
+
+    if tail:
+        if not market.has(tail):
+            return 400, {"label": "CONTRACT_NOT_FOUND"}
+        return contract(tail)
+    return [contract(s) for s in market.natives("GATE")]
+
+
+def htx_funding_rate(market: Market, query: dict, tail: str):
+    symbol = query.get("contract_code", "")
+    if not market.has(symbol):
+        return {"status": "error", "data": {}}
+    return {"status": "ok", "data": {"contract_code": symbol, "funding_rate": str(market.rate("HTX", symbol)),
+                                     "funding_time": str(market.next_funding())}}
+
+
+def htx_batch_funding_rate(market: Market, query: dict, tail: str):
+    return {"status": "ok", "data": [
+        {"contract_code": s, "funding_rate": str(market.rate("HTX", s)), "funding_time": str(market.next_funding())}
+        for s in market.natives("HTX")
+    ]}
+
+
+def kucoin_contracts(market: Market, query: dict, tail: str):
+    def contract(s):
+        return {"symbol": s, "fundingFeeRate": market.rate("KUCOIN", s), "nextFundingRateTime": 4 * HOUR_MS}
+
+    if tail == "active":
+        return {"code": "200000", "data": [contract(s) for s in market.natives("KUCOIN")]}
+    if not market.has(tail):
+        return 404, {"code": "404", "msg": "Contract does not exist"}
+    return {"code": "200000", "data": contract(tail)}
+
+
+def okx_funding_rate(market: Market, query: dict, tail: str):
+    symbol = query.get("instId", "")
+    if not market.has(symbol):
+        return {"code": "51001", "data": []}
+    return {"code": "0", "data": [
+        {"instId": symbol, "fundingRate": str(market.rate("OKX", symbol)), "fundingTime": str(market.next_funding())}
+    ]}
+
+
+def mexc_funding_rate(market: Market, query: dict, tail: str, exchange: str = "MEXC"):
+    if not tail:
+        return {"success": True, "data": [
+            {"symbol": s, "fundingRate": market.rate(exchange, s), "nextSettleTime": market.next_funding()}
+            for s in market.natives(exchange)
+        ]}
+    if not market.has(tail):
+        return {"success": False, "code": 1001, "data": None}
+    return {"success": True, "data": {"symbol": tail, "fundingRate": market.rate(exchange, tail),
+                                      "nextSettleTime": market.next_funding(), "timestamp": market.next_funding()}}
+
+
+def ourbit_funding_rate(market: Market, query: dict, tail: str):
+    return mexc_funding_rate(market, query, tail, "OURBIT")
+
+
+def blofin_funding_rate(market: Market, query: dict, tail: str):
+    symbol = query.get("instId")
+    natives = market.natives("BLOFIN") if symbol is None else ([symbol] if market.has(symbol) else [])
+    return {"code": "0", "data": [
+        {"instId": s, "fundingRate": str(market.rate("BLOFIN", s)), "fundingTime": str(market.next_funding())}
+        for s in natives
+    ]}
+
+
+def xt_funding_rate(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    if not market.has(symbol):
+        return {"returnCode": 1, "result": None}
+    return {"returnCode": 0, "result": {"symbol": symbol, "fundingRate": market.rate("XT", symbol),
+                                        "nextCollectionTime": market.next_funding()}}
+
+
+# ---------- Списки контрактов ----------
+
+def binance_exchange_info(market: Market, query: dict, tail: str):
+    return {"symbols": [
+        {"symbol": s, "contractType": "PERPETUAL", "status": "TRADING"} for s in market.natives("BINANCE")
+    ]}
+
+
+def bybit_instruments(market: Market, query: dict, tail: str):
+    items = [{"symbol": s, "status": "Trading"} for s in market.natives("BYBIT")]
+    limit = _int(query, "limit", 500)
+    offset = _int(query, "cursor", 0)
+    page = items[offset:offset + limit]
+    cursor = str(offset + limit) if offset + limit < len(items) else ""
+    return {"retCode": 0, "result": {"list": page, "nextPageCursor": cursor}}
+
+
+def okx_instruments(market: Market, query: dict, tail: str):
+    return {"code": "0", "data": [{"instId": s, "state": "live"} for s in market.natives("OKX")]}
+
+
+def listing(exchange: str, key: str, wrap: str = "data", **extra):
+    def handler(market: Market, query: dict, tail: str):
+        return {wrap: [{key: s, **extra} for s in market.natives(exchange)]}
+    return handler
+
+
+# ---------- История ----------
+
+def binance_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows = market.history("BINANCE", symbol, _int(query, "startTime"), _int(query, "endTime"))
+    return [
+        {"symbol": symbol, "fundingRate": str(r), "fundingTime": t}
+        for t, r in rows[:_int(query, "limit", 100)]
+    ]
+
+
+def bybit_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows = market.history("BYBIT", symbol, _int(query, "startTime"), _int(query, "endTime"))
+    rows = rows[::-1][:_int(query, "limit", 200)]
+    return {"retCode": 0, "result": {"list": [
+        {"symbol": symbol, "fundingRate": str(r), "fundingRateTimestamp": str(t)} for t, r in rows
+    ]}}
+
+
+def kucoin_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows = market.history("KUCOIN", symbol, _int(query, "from"), _int(query, "to"))
+    return {"code": "200000", "data": [{"symbol": symbol, "fundingRate": r, "timepoint": t} for t, r in rows[::-1]]}
+
+
+def cursor_history(exchange: str):
+    """
+    OKX / Blofin: записи старше `after` по убыванию времени, не больше `limit`
+    """
+    def handler(market: Market, query: dict, tail: str):
+        symbol = query.get("instId", "")
+        after = _int(query, "after")
+        rows = market.history(exchange, symbol, end=None if after is None else after - 1)
+        rows = rows[::-1][:_int(query, "limit", 100)]
+        return {"code": "0", "data": [
+            {"instId": symbol, "fundingRate": str(r), "fundingTime": str(t)} for t, r in rows
+        ]}
+    return handler
+
+
+def mexc_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows, total = _page(
+        market.history("MEXC", symbol)[::-1], _int(query, "page_num", 1), _int(query, "page_size", 20)
+    )
+    return {"success": True, "data": {
+        "resultList": [{"symbol": symbol, "fundingRate": r, "settleTime": t} for t, r in rows],
+        "totalPage": total,
+    }}
+
+
+def htx_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("contract_code", "")
+    rows, total = _page(
+        market.history("HTX", symbol)[::-1], _int(query, "page_index", 1), _int(query, "page_size", 20)
+    )
+    return {"status": "ok", "data": {
+        "data": [{"contract_code": symbol, "funding_rate": str(r), "funding_time": str(t)} for t, r in rows],
+        "total_page": total,
+    }}
+
+
+def bitget_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows, _ = _page(market.history("BITGET", symbol)[::-1], _int(query, "pageNo", 1), _int(query, "pageSize", 20))
+    return {"code": "00000", "data": [
+        {"symbol": symbol, "fundingRate": str(r), "fundingTime": str(t)} for t, r in rows
+    ]}
+
+
+def bitmart_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows = market.history("BITMART", symbol)[::-1][:_int(query, "limit", 100)]
+    return {"code": 1000, "data": {"list": [
+        {"symbol": symbol, "funding_rate": str(r), "funding_time": str(t)} for t, r in rows
+    ]}}
+
+
+def coinex_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("market", "")
+    limit = _int(query, "limit", 100)
+    page = _int(query, "page", 1)
+    rows = market.history("COINEX", symbol, _int(query, "start_time"), _int(query, "end_time"))[::-1]
+    items, total = _page(rows, page, limit)
+    return {"code": 0, "data": [
+        {"market": symbol, "actual_funding_rate": str(r), "funding_time": t} for t, r in items
+    ], "pagination": {"has_next": page < total}}
+
+
+def bingx_funding_history(market: Market, query: dict, tail: str):
+    symbol = query.get("symbol", "")
+    rows = market.history("BINGX", symbol, _int(query, "startTime"), _int(query, "endTime"))
+    rows = rows[::-1][:_int(query, "limit", 100)]
+    return {"code": 0, "data": [{"symbol": symbol, "fundingRate": str(r), "fundingTime": t} for t, r in rows]}
+
+
+# (хост, путь) -> обработчик(market, query, tail). Для путей с символом в конце
+# ключ — префикс пути, а символ передается в tail.
+ROUTES = {
+    ("fapi.binance.com", "/fapi/v1/premiumIndex"): binance_premium_index,
+    ("fapi.binance.com", "/fapi/v1/exchangeInfo"): binance_exchange_info,
+    ("fapi.binance.com", "/fapi/v1/fundingRate"): binance_funding_history,
+    ("api.bybit.com", "/v5/market/tickers"): bybit_tickers,
+    ("api.bybit.com", "/v5/market/instruments-info"): bybit_instruments,
+    ("api.bybit.com", "/v5/market/funding/history"): bybit_funding_history,
+    ("www.okx.com", "/api/v5/public/funding-rate"): okx_funding_rate,
+    ("www.okx.com", "/api/v5/public/instruments"): okx_instruments,
+    ("www.okx.com", "/api/v5/public/funding-rate-history"): cursor_history("OKX"),
+    ("api.gateio.ws", "/api/v4/futures/usdt/contracts"): gate_contracts,
+    ("api.bitget.com", "/api/v2/mix/market/current-fund-rate"): bitget_current_fund_rate,
+    ("api.bitget.com", "/api/v2/mix/market/contracts"): listing("BITGET", "symbol"),
+    ("api.bitget.com", "/api/v2/mix/market/history-fund-rate"): bitget_funding_history,
+    ("api-cloud-v2.bitmart.com", "/contract/public/details"): bitmart_details,
+    ("api-cloud-v2.bitmart.com", "/contract/public/funding-rate-history"): bitmart_funding_history,
+    ("contract.mexc.com", "/api/v1/contract/funding_rate"): mexc_funding_rate,
+    ("contract.mexc.com", "/api/v1/contract/funding_rate/history"): mexc_funding_history,
+    ("contract.mexc.com", "/api/v1/contract/detail"): listing("MEXC", "symbol", state=0),
+    ("open-api.bingx.com", "/openApi/swap/v2/quote/premiumIndex"): bingx_premium_index,
+    ("open-api.bingx.com", "/openApi/swap/v2/quote/contracts"): listing("BINGX", "symbol"),
+    ("open-api.bingx.com", "/openApi/swap/v2/quote/fundingRate"): bingx_funding_history,
+    ("api.hbdm.com", "/linear-swap-api/v1/swap_funding_rate"): htx_funding_rate,
+    ("api.hbdm.com", "/linear-swap-api/v1/swap_batch_funding_rate"): htx_batch_funding_rate,
+    ("api.hbdm.com", "/linear-swap-api/v1/swap_contract_info"): listing("HTX", "contract_code", contract_status=1),
+    ("api.hbdm.com", "/linear-swap-api/v1/swap_historical_funding_rate"): htx_funding_history,
+    ("api-futures.kucoin.com", "/api/v1/contracts"): kucoin_contracts,
+    ("api-futures.kucoin.com", "/api/v1/contract/funding-rates"): kucoin_funding_history,
+    ("openapi.blofin.com", "/api/v1/market/funding-rate"): blofin_funding_rate,
+    ("openapi.blofin.com", "/api/v1/market/instruments"): listing("BLOFIN", "instId"),
+    ("openapi.blofin.com", "/api/v1/market/funding-rate-history"): cursor_history("BLOFIN"),
+    ("api.coinex.com", "/v2/futures/funding-rate"): coinex_funding_rate,
+    ("api.coinex.com", "/v2/futures/funding-rate-history"): coinex_funding_history,
+    ("api.coinex.com", "/v2/futures/market"): listing("COINEX", "market"),
+    ("futures.ourbit.com", "/api/v1/contract/funding_rate"): ourbit_funding_rate,
+    ("fapi.xt.com", "/future/market/v1/public/q/funding-rate"): xt_funding_rate,
+}
+
+
+def fixture_path(host: str, path: str, query: dict) -> Path:
+    name = path.strip("/")
+    if query:
+        name += "__" + urlencode(sorted(query.items()))
+    return FIXTURES_DIR / host / f"{name}.json"
+
+
+def load_recorded(host: str, path: str, query: dict):
+    """
+    Записанный ответ на запрос или None
+    """
+    file = fixture_path(host, path, query)
+    if not file.exists():
+        return None
+    with open(file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve(host: str, path: str):
+    """
+    Обработчик и хвост пути (символ) для запроса
+    """
+    handler = ROUTES.get((host, path))
+    if handler is not None:
+        return handler, ""
+    prefix, _, tail = path.rpartition("/")
+    handler = ROUTES.get((host, prefix))
+    if handler is not None:
+        return handler, tail
+    return None, ""
+
+
+def respond(market: Market, host: str, path: str, query: dict):
+    """
+    (код ответа, тело JSON) для запроса к бирже
+    """
+    recorded = load_recorded(host, path, query)
+    if recorded is not None:
+        return 200, recorded
+    handler, tail = resolve(host, path)
+    if handler is None:
+        return 404, {"error": f"no fixture for {host}{path}"}
+    result = handler(market, query, tail)
+    if isinstance(result, tuple):
+        return result
+    return 200, result
@@ -0,0 +1,295 @@
+"""
+Нагрузочный прогон бота целиком: синтетические пользователи отправляют команды
+через настоящий Dispatcher с хэндлерами из register_handlers, ответы уходят
+в поддельную сессию Bot API, биржи — локальный мок-сервер.
+
+python -m benchmarks.load --users 10,50,100 --duration 20 [--slo 5] [--ws]
+
+Каждый пользователь отправляет команду, ждет ответ, «думает» и отправляет
+следующую. Для каждой ступени нагрузки измеряются время первого ответа
+и полного ответа по командам, пропускная способность и блокировки event loop.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendMessage, SendPhoto
+from aiogram.types import Chat, Message, PhotoSize, Update
+
+from benchmarks.fixtures import Market
+from benchmarks.mock_server import FaultInjection, MockServerProcess
+from benchmarks.runner import Result, report
+from chart_cache import ChartCache
+from charts import ChartRenderer, render_top_tokens_chart
+from funding_fetcher import BULK_FETCHERS, HISTORY_FETCHERS, INSTRUMENT_FETCHERS
+from handlers import register_handlers
+from history_store import HistoryStore
+from http_client import HttpClientManager
+from snapshot import FundingSnapshot, SnapshotRefresher
+from streaming import StreamIngestor
+from symbol_index import SymbolIndex
+
+COMMANDS = ("funding", "funding_spread_chart", "top_tokens_chart")
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия Bot API без сети: запоминает исходящие вызовы и отвечает
+    правдоподобными объектами после задержки `latency`
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.first_reply = {}
+        self._ids = itertools.count(1)
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    def _message(self, bot: Bot, chat_id: int, **fields) -> Message:
+        return Message(
+            message_id=next(self._ids),
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type="private"),
+            **fields,
+        ).as_(bot)
+
+    async def make_request(self, bot: Bot, method, timeout=None):
+        self.calls[type(method).__name__] += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            self.first_reply.setdefault(chat_id, time.perf_counter())
+        await asyncio.sleep(self.latency)
+
+        if isinstance(method, (SendMessage, EditMessageText)):
+            return self._message(bot, chat_id, text=method.text)
+        if isinstance(method, SendPhoto):
+            n = next(self._ids)
+            photo = PhotoSize(file_id=f"photo{n}", file_unique_id=f"u{n}", width=1000, height=500)
+            return self._message(bot, chat_id, photo=[photo])
+        return True
+
+
+class LoopMonitor:
+    """
+    Задержки event loop: насколько позже запланированного просыпается sleep(interval)
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.lags = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        lags = np.asarray(self.lags or [0.0])
+        return {
+            "max_ms": float(lags.max()) * 1000,
+            "p99_ms": float(np.percentile(lags, 99)) * 1000,
+            "blocked_s": float(lags[lags > 0.05].sum()),
+        }
+
+
+class Workload:
+    """
+    Случайные команды: популярные символы запрашиваются чаще (закон Ципфа)
+    """
+
+    def __init__(self, market: Market, mix: dict, seed: int = 1):
+        self.random = random.Random(seed)
+        self.symbols = market.symbols
+        self.weights = [1 / (rank + 1) for rank in range(len(self.symbols))]
+        self.commands = list(mix)
+        self.mix = [mix[c] for c in self.commands]
+        self.exchanges = list(HISTORY_FETCHERS)
+
+    def _symbols(self, k: int) -> list:
+        return self.random.choices(self.symbols, self.weights, k=k)
+
+    def next(self):
+        command = self.random.choices(self.commands, self.mix)[0]
+        days = self.random.randint(1, 7)
+        exchange = self.random.choice(self.exchanges)
+        if command == "funding":
+            text = f"/funding {self._symbols(1)[0]}"
+        elif command == "funding_spread_chart":
+            text = f"/funding_spread_chart {exchange} {days} {self._symbols(1)[0]}"
+        else:
+            text = f"/top_tokens_chart {exchange} {days} {','.join(dict.fromkeys(self._symbols(3)))}"
+        return command, text
+
+
+def update_payload(update_id: int, user_id: int, text: str) -> dict:
+    """
+    Обновление с сообщением пользователя в том виде, в каком его присылает Telegram
+    """
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+def make_update(bot: Bot, update_id: int, user_id: int, text: str) -> Update:
+    """
+    Update, привязанный к bot так же, как при polling
+    """
+    return Update.model_validate(update_payload(update_id, user_id, text), context={"bot": bot})
+
+
+async def run_stage(dp, bot, session, deps, workload, users: int, duration: float, think: float):
+    """
+    Одна ступень нагрузки: `users` пользователей в течение `duration` секунд
+    """
+    latencies = {command: [] for command in COMMANDS}
+    first = {command: [] for command in COMMANDS}
+    errors = Counter()
+    ids = itertools.count(1)
+    deadline = time.perf_counter() + duration
+
+    async def user(user_id):
+        rnd = random.Random(user_id)
+        await asyncio.sleep(rnd.uniform(0, think))
+        while time.perf_counter() < deadline:
+            command, text = workload.next()
+            session.first_reply.pop(user_id, None)
+            started = time.perf_counter()
+            try:
+                await dp.feed_update(bot, make_update(bot, next(ids), user_id, text), **deps)
+            except Exception:
+                if not errors[command]:
+                    logger.exception("Ошибка при обработке %s", text)
+                errors[command] += 1
+            finished = time.perf_counter()
+            latencies[command].append(finished - started)
+            first[command].append(session.first_reply.get(user_id, finished) - started)
+            await asyncio.sleep(rnd.expovariate(1 / think) if think else 0)
+
+    monitor = LoopMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user(1000 + i) for i in range(users)))
+    wall = time.perf_counter() - started
+    loop_stats = await monitor.stop()
+
+    results = []
+    for command in COMMANDS:
+        if latencies[command]:
+            results.append(Result(f"{users}u {command}", latencies[command], wall, errors[command]))
+            results.append(Result(f"{users}u {command} first", first[command], wall))
+    return results, loop_stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description=__doc__)
+    parser.add_argument("--users", default="10,50,100", help="ступени числа пользователей через запятую")
+    parser.add_argument("--duration", type=float, default=20.0, help="длительность ступени, с")
+    parser.add_argument("--think", type=float, default=1.0, help="средняя пауза пользователя между командами, с")
+    parser.add_argument("--mix", default="0.7,0.2,0.1", help="доли /funding, /funding_spread_chart, /top_tokens_chart")
+    parser.add_argument("--slo", type=float, default=5.0, help="допустимое p95 полного ответа, с")
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка биржи, с")
+    parser.add_argument("--jitter", type=float, default=0.03)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tg-latency", type=float, default=0.05, help="задержка Bot API, с")
+    parser.add_argument("--ws", action="store_true", help="ставки из WebSocket-потоков мок-сервера")
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    market = Market(args.symbols)
+    server = MockServerProcess(args.symbols, FaultInjection(args.latency, args.jitter, args.error_rate)).start()
+    http = HttpClientManager(rate_limit=False, transport_factory=server.transport)
+    session = FakeSession(args.tg_latency)
+    bot = Bot(token="42:LOAD-TEST", session=session)
+    dp = Dispatcher()
+    register_handlers(dp)
+
+    snapshot = FundingSnapshot()
+    refresher = SnapshotRefresher(snapshot, http, BULK_FETCHERS)
+    index = SymbolIndex(path="")
+    streams = StreamIngestor(snapshot, index, url_override=server.ws_url) if args.ws else None
+    store = HistoryStore(path=":memory:", index=index)
+    renderer = ChartRenderer()
+    deps = dict(
+        http=http, snapshot=snapshot, index=index, store=store, renderer=renderer, chart_cache=ChartCache()
+    )
+    mix = dict(zip(COMMANDS, (float(x) for x in args.mix.split(","))))
+    workload = Workload(market, mix)
+
+    stages = []
+    try:
+        await asyncio.gather(*(refresher.refresh(e, f) for e, f in BULK_FETCHERS.items()))
+        await index.refresh(http, INSTRUMENT_FETCHERS)
+        if streams is not None:
+            streams.start()
+            await asyncio.sleep(streams.warmup + 1)
+        await asyncio.gather(*(renderer.render(render_top_tokens_chart, "X", 1, []) for _ in range(2)))
+
+        for users in (int(u) for u in args.users.split(",")):
+            results, loop_stats = await run_stage(dp, bot, session, deps, workload, users, args.duration, args.think)
+            stages.append((users, results, loop_stats))
+            print(f"\n=== {users} пользователей ===")
+            print(report(results))
+            print(
+                f"event loop: max {loop_stats['max_ms']:.1f} мс, p99 {loop_stats['p99_ms']:.1f} мс, "
+                f"заблокирован (>50 мс) {loop_stats['blocked_s']:.2f} с"
+            )
+    finally:
+        if streams is not None:
+            await streams.stop()
+        await http.close()
+        store.close()
+        renderer.close()
+        server.stop()
+
+    capacity = 0
+    for users, results, _ in stages:
+        full = [r for r in results if not r.name.endswith("first")]
+        if all(r.percentile(95) <= args.slo * 1000 and not r.errors for r in full):
+            capacity = users
+    print(f"\nВызовы Bot API: {dict(session.calls)}")
+    print(f"Запросов к мок-серверу: {server.requests}")
+    print(f"Пользователей без нарушения SLO (p95 <= {args.slo} с): {capacity}")
+    return stages
+
+
+def main(argv=None) -> int:
+    asyncio.run(run(parse_args(argv)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Локальный мок-сервер бирж на aiohttp и транспорт httpx, который направляет
+на него все запросы бота.
+
+Запрос https://api.bybit.com/v5/market/tickers?... приходит на сервер как
+http://127.0.0.1:<port>/api.bybit.com/v5/market/tickers?...
+WebSocket-потоки бирж доступны по ws://127.0.0.1:<port>/ws/<биржа>
+(см. benchmarks.mock_stream и WS_URL_OVERRIDE).
+Сервер запускается в отдельном процессе (MockServerProcess), чтобы
+сериализация ответов не занимала event loop измеряемого клиента.
+"""
+import asyncio
+import functools
+import multiprocessing
+import random
+
+import httpx
+from aiohttp import web
+
+from benchmarks.fixtures import Market, respond
+from benchmarks.mock_stream import handle_stream
+
+
+class FaultInjection:
+    """
+    Задержка ответа latency ± jitter секунд, доля ответов 500 (error_rate)
+    и доля зависших запросов (timeout_rate), которые отвечают через hang секунд
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang: float = 30.0,
+        seed: int = 1,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.random = random.Random(seed)
+
+    def delay(self) -> float:
+        if self.timeout_rate and self.random.random() < self.timeout_rate:
+            return self.hang
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def fail(self) -> bool:
+        return bool(self.error_rate) and self.random.random() < self.error_rate
+
+
+class MockExchangeServer:
+    """
+    Сервер, отвечающий за все биржи из funding_fetcher и streaming.
+    Потоки рассылают ставки каждые stream_interval секунд и закрываются
+    сервером через stream_lifetime секунд (0 — не закрываются)
+    """
+
+    def __init__(
+        self,
+        market: Market = None,
+        faults: FaultInjection = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        stream_interval: float = 1.0,
+        stream_lifetime: float = 0.0,
+    ):
+        self.market = market or Market()
+        self.faults = faults or FaultInjection()
+        self.host = host
+        self.port = port
+        self.stream_interval = stream_interval
+        self.stream_lifetime = stream_lifetime
+        self.requests = 0
+        self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        host, _, path = request.match_info["target"].partition("/")
+        await asyncio.sleep(self.faults.delay())
+        if self.faults.fail():
+            return web.json_response({"error": "injected"}, status=500)
+        status, body = respond(self.market, host, f"/{path}", dict(request.query))
+        return web.json_response(body, status=status)
+
+    async def start(self):
+        app = web.Application()
+        stream = functools.partial(
+            handle_stream, market=self.market, interval=self.stream_interval, lifetime=self.stream_lifetime
+        )
+        app.router.add_get("/ws/{exchange}", stream)
+        app.router.add_get("/{target:.+}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def transport(self, limits: httpx.Limits = None) -> "RedirectTransport":
+        """
+        Транспорт для одного хоста с теми же лимитами пула, что и у настоящего клиента
+        """
+        return RedirectTransport(self.host, self.port, limits=limits or httpx.Limits())
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+
+def _serve(market_size: int, faults: FaultInjection, conn, stream_options: dict):
+    async def main():
+        server = await MockExchangeServer(Market(market_size), faults, **stream_options).start()
+        conn.send(server.port)
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        conn.send(server.requests)
+        await server.stop()
+
+    asyncio.run(main())
+
+
+class MockServerProcess:
+    """
+    MockExchangeServer в отдельном процессе
+    """
+
+    def __init__(
+        self, market_size: int = 500, faults: FaultInjection = None, host: str = "127.0.0.1", **stream_options
+    ):
+        self.market_size = market_size
+        self.faults = faults or FaultInjection()
+        self.host = host
+        self.stream_options = stream_options
+        self.port = None
+        self.requests = 0
+        self._process = None
+        self._conn = None
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child = context.Pipe()
+        self._process = context.Process(
+            target=_serve, args=(self.market_size, self.faults, child, self.stream_options), daemon=True
+        )
+        self._process.start()
+        self.port = self._conn.recv()
+        return self
+
+    def stop(self):
+        if self._process is None:
+            return
+        self._conn.send("stop")
+        self.requests = self._conn.recv()
+        self._process.join(5)
+        self._process = None
+
+    def transport(self, limits: httpx.Limits = None) -> "RedirectTransport":
+        return RedirectTransport(self.host, self.port, limits=limits or httpx.Limits())
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+
+class RedirectTransport(httpx.AsyncBaseTransport):
+    """
+    Транспорт httpx, переписывающий https://<биржа>/<путь> в http://<мок>/<биржа>/<путь>
+    """
+
+    def __init__(self, host: str, port: int, **kwargs):
+        self.host = host
+        self.port = port
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        original = request.url
+        request.url = original.copy_with(
+            scheme="http",
+            host=self.host,
+            port=self.port,
+            raw_path=f"/{original.host}{original.raw_path.decode()}".encode(),
+        )
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self):
+        await self._transport.aclose()
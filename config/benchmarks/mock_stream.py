@@ -0,0 +1,190 @@
+"""
+WebSocket-потоки бирж для мок-сервера: ws://<мок>/ws/<биржа>.
+
+Протокол подписки, пинги и формат сообщений те же, что разбирает streaming;
+ставки берутся из синтетического рынка и рассылаются каждые `interval` секунд.
+"""
+import asyncio
+import json
+import time
+
+from aiohttp import WSMsgType, web
+
+from benchmarks.fixtures import Market
+
+
+class MockStream:
+    """
+    Поток одной биржи: список подписок и сообщения для рассылки
+    """
+
+    exchange = ""
+
+    def __init__(self, market: Market):
+        self.market = market
+        self.subscribed = []
+
+    def on_message(self, data) -> list:
+        """
+        Ответы на сообщение клиента (подписка, пинг)
+        """
+        return []
+
+    def push(self) -> list:
+        raise NotImplementedError
+
+    def rate(self, native: str) -> str:
+        return str(self.market.rate(self.exchange, native))
+
+
+class BinanceMockStream(MockStream):
+    exchange = "BINANCE"
+
+    def __init__(self, market: Market):
+        super().__init__(market)
+        self.subscribed = market.natives(self.exchange)
+
+    def push(self) -> list:
+        now = int(time.time() * 1000)
+        return [[
+            {"e": "markPriceUpdate", "E": now, "s": s, "r": self.rate(s), "T": self.market.next_funding(now)}
+            for s in self.subscribed
+        ]]
+
+
+class BybitMockStream(MockStream):
+    exchange = "BYBIT"
+
+    def on_message(self, data) -> list:
+        if data.get("op") == "ping":
+            return [{"success": True, "op": "pong"}]
+        if data.get("op") == "subscribe":
+            self.subscribed += [arg.split(".", 1)[1] for arg in data.get("args", [])]
+            return [{"success": True, "op": "subscribe"}]
+        return []
+
+    def push(self) -> list:
+        next_funding = str(self.market.next_funding())
+        return [
+            {
+                "topic": f"tickers.{s}",
+                "type": "snapshot",
+                "data": {"symbol": s, "fundingRate": self.rate(s), "nextFundingTime": next_funding},
+            }
+            for s in self.subscribed
+        ]
+
+
+class OKXMockStream(MockStream):
+    exchange = "OKX"
+
+    def on_message(self, data) -> list:
+        if data.get("op") != "subscribe":
+            return []
+        args = data.get("args", [])
+        self.subscribed += [arg["instId"] for arg in args]
+        return [{"event": "subscribe", "arg": arg} for arg in args]
+
+    def push(self) -> list:
+        next_funding = str(self.market.next_funding())
+        return [
+            {
+                "arg": {"channel": "funding-rate", "instId": s},
+                "data": [{"instId": s, "fundingRate": self.rate(s), "fundingTime": next_funding}],
+            }
+            for s in self.subscribed
+        ]
+
+
+class BitgetMockStream(MockStream):
+    exchange = "BITGET"
+
+    def on_message(self, data) -> list:
+        if data.get("op") != "subscribe":
+            return []
+        args = data.get("args", [])
+        self.subscribed += [arg["instId"] for arg in args]
+        return [{"event": "subscribe", "arg": arg} for arg in args]
+
+    def push(self) -> list:
+        next_funding = str(self.market.next_funding())
+        return [
+            {
+                "action": "snapshot",
+                "arg": {"instType": "USDT-FUTURES", "channel": "ticker", "instId": s},
+                "data": [{"instId": s, "fundingRate": self.rate(s), "nextFundingTime": next_funding}],
+            }
+            for s in self.subscribed
+        ]
+
+
+class GateMockStream(MockStream):
+    exchange = "GATE"
+
+    def on_message(self, data) -> list:
+        if data.get("channel") == "futures.ping":
+            return [{"time": int(time.time()), "channel": "futures.pong"}]
+        if data.get("channel") == "futures.tickers" and data.get("event") == "subscribe":
+            self.subscribed += data.get("payload", [])
+            return [{"channel": "futures.tickers", "event": "subscribe", "result": {"status": "success"}}]
+        return []
+
+    def push(self) -> list:
+        if not self.subscribed:
+            return []
+        return [{
+            "time": int(time.time()),
+            "channel": "futures.tickers",
+            "event": "update",
+            "result": [{"contract": s, "funding_rate": self.rate(s)} for s in self.subscribed],
+        }]
+
+
+MOCK_STREAMS = {
+    stream.exchange: stream
+    for stream in (BinanceMockStream, BybitMockStream, OKXMockStream, BitgetMockStream, GateMockStream)
+}
+
+
+async def _push(ws: web.WebSocketResponse, stream: MockStream, interval: float):
+    while not ws.closed:
+        try:
+            for message in stream.push():
+                await ws.send_str(json.dumps(message))
+        except ConnectionResetError:
+            return
+        await asyncio.sleep(interval)
+
+
+async def _close_later(ws: web.WebSocketResponse, lifetime: float):
+    await asyncio.sleep(lifetime)
+    await ws.close()
+
+
+async def handle_stream(request: web.Request, market: Market, interval: float, lifetime: float):
+    """
+    Соединение с потоком биржи; через `lifetime` секунд (если задано) сервер
+    сам закрывает его, как биржи при плановых разрывах
+    """
+    stream_cls = MOCK_STREAMS.get(request.match_info["exchange"].upper())
+    if stream_cls is None:
+        raise web.HTTPNotFound()
+    stream = stream_cls(market)
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    pusher = asyncio.create_task(_push(ws, stream, interval))
+    closer = asyncio.create_task(_close_later(ws, lifetime)) if lifetime else None
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            if msg.data == "ping":
+                await ws.send_str("pong")
+                continue
+            for reply in stream.on_message(json.loads(msg.data)):
+                await ws.send_str(json.dumps(reply))
+    finally:
+        pusher.cancel()
+        if closer is not None:
+            closer.cancel()
+    return ws
@@ -0,0 +1,60 @@
+"""
+Запись реальных ответов бирж в benchmarks/fixtures для воспроизведения мок-сервером.
+
+python -m benchmarks.record [SYMBOL ...]
+
+Записываются общие эндпоинты (ставки по всему рынку, списки контрактов)
+и текущие ставки по заданным символам (по умолчанию BTCUSDT, ETHUSDT).
+"""
+import asyncio
+import json
+import sys
+from urllib.parse import parse_qsl, urlsplit
+
+from benchmarks.fixtures import fixture_path
+from funding_fetcher import BULK_FETCHERS, INSTRUMENT_FETCHERS, LIVE_FETCHERS
+from http_client import HttpClientManager
+from symbol_index import native_symbol
+
+
+class RecordingHttp(HttpClientManager):
+    """
+    HttpClientManager, сохраняющий каждый успешный ответ в файл фикстуры
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.saved = 0
+
+    async def get(self, url: str, **kwargs):
+        response = await super().get(url, **kwargs)
+        if response.status_code == 200:
+            parts = urlsplit(str(response.request.url))
+            query = dict(parse_qsl(parts.query))
+            path = fixture_path(parts.netloc, parts.path, query)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(response.json(), f)
+            self.saved += 1
+        return response
+
+
+async def record(symbols: list):
+    http = RecordingHttp()
+    try:
+        calls = [fetcher(http) for fetcher in BULK_FETCHERS.values()]
+        calls += [fetcher(http) for fetcher in INSTRUMENT_FETCHERS.values()]
+        calls += [
+            fetcher(native_symbol(exchange, symbol), http)
+            for symbol in symbols
+            for exchange, fetcher in LIVE_FETCHERS.items()
+        ]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        failed = sum(isinstance(res, Exception) for res in results)
+        print(f"Записано ответов: {http.saved}, ошибок: {failed}")
+    finally:
+        await http.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(record([s.upper() for s in sys.argv[1:]] or ["BTCUSDT", "ETHUSDT"]))
@@ -0,0 +1,109 @@
+"""
+Замеры: задержка каждого вызова и пропускная способность, отчет p50/p95/p99
+"""
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+class Result:
+    def __init__(self, name: str, latencies: list, wall: float, errors: int = 0):
+        self.name = name
+        self.latencies = np.asarray(latencies, dtype=np.float64)
+        self.wall = wall
+        self.errors = errors
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.wall if self.wall > 0 else 0.0
+
+    def percentile(self, q: float) -> float:
+        return float(np.percentile(self.latencies, q)) * 1000 if len(self.latencies) else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "n": len(self.latencies),
+            "errors": self.errors,
+            "throughput": self.throughput,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+        }
+
+
+async def bench_async(name: str, func, iterations: int, concurrency: int) -> Result:
+    """
+    func(i) вызывается iterations раз, не более concurrency одновременно
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await func(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    return Result(name, latencies, time.perf_counter() - started, errors)
+
+
+def bench_sync(name: str, func, iterations: int) -> Result:
+    """
+    func(i) вызывается iterations раз подряд
+    """
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - call_started)
+    return Result(name, latencies, time.perf_counter() - started)
+
+
+def report(results: list) -> str:
+    """
+    Таблица результатов
+    """
+    header = f"{'benchmark':<34}{'n':>7}{'err':>6}{'ops/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        d = r.to_dict()
+        lines.append(
+            f"{r.name:<34}{d['n']:>7}{d['errors']:>6}{d['throughput']:>11.1f}"
+            f"{d['p50_ms']:>10.2f}{d['p95_ms']:>10.2f}{d['p99_ms']:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def save(results: list, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({r.name: r.to_dict() for r in results}, f, indent=2)
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> list:
+    """
+    Регрессии относительно сохраненного прогона: p95 выросла или пропускная
+    способность упала больше чем на tolerance (доля)
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    for r in results:
+        base = baseline.get(r.name)
+        if base is None:
+            continue
+        current = r.to_dict()
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{r.name}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{r.name}: ops/s {base['throughput']:.1f} -> {current['throughput']:.1f}")
+    return regressions
@@ -0,0 +1,64 @@
+"""
+Синтетические обновления для бота в режиме webhook (BOT_MODE=webhook).
+
+python -m benchmarks.webhook [--url http://127.0.0.1:8080/webhook] [--secret S]
+                             [--count N] [--concurrency C] [TEXT ...]
+
+Каждое обновление отправляется POST-запросом так же, как это делает Telegram,
+с заголовком X-Telegram-Bot-Api-Secret-Token. Замеряется время, за которое
+бот подтверждает прием; ответы бота уходят в Bot API как обычно.
+"""
+import argparse
+import asyncio
+import itertools
+import sys
+
+import aiohttp
+
+from benchmarks.load import update_payload
+from benchmarks.runner import bench_async, report
+from constants import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.webhook", description=__doc__)
+    parser.add_argument("texts", nargs="*", default=["/funding BTCUSDT"], help="тексты сообщений по кругу")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--user-id", type=int, default=1000, help="chat id отправителя")
+    return parser.parse_args(argv)
+
+
+async def post_updates(args) -> tuple:
+    """
+    Отправка args.count обновлений: (результат замера, коды ответов)
+    """
+    texts = itertools.cycle(args.texts)
+    headers = {SECRET_HEADER: args.secret} if args.secret else {}
+    statuses = {}
+
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def post(i):
+            payload = update_payload(i + 1, args.user_id, next(texts))
+            async with session.post(args.url, json=payload) as response:
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+                if response.status != 200:
+                    raise RuntimeError(f"webhook ответил {response.status}")
+
+        result = await bench_async("webhook ack", post, args.count, args.concurrency)
+    return result, statuses
+
+
+def main(argv=None) -> int:
+    result, statuses = asyncio.run(post_updates(parse_args(argv)))
+    print(report([result]))
+    print(f"Коды ответов: {statuses}")
+    return 0 if not result.errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
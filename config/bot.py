@@ -1,22 +1,146 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from constants import BOT_TOKEN
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from chart_cache import ChartCache
+from charts import ChartRenderer
+from constants import (
+    BOT_MODE,
+    BOT_TOKEN,
+    METRICS_PORT,
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+    WS_ENABLED,
+)
+from funding_fetcher import (
+    BULK_FETCHERS,
+    INSTRUMENT_FETCHERS,
+    history_health,
+    history_probes,
+    live_health,
+    live_probes,
+)
 from handlers import register_handlers
+from history_store import HistoryStore
+from http_client import HttpClientManager
+from metrics import MetricsMiddleware, TelegramMetricsMiddleware, start_metrics_server
+from snapshot import FundingSnapshot, SnapshotRefresher
 from ssl_patch import patch_ssl_correctly
+from startup import StartupReport
+from streaming import StreamIngestor
+from subscriptions import AlertEngine, SubscriptionStore
+from symbol_index import SymbolIndex
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, reuse_port: bool = False, set_webhook: bool = True, **deps):
+    """
+    Прием обновлений через webhook: aiohttp-сервер отвечает Telegram сразу,
+    а обновление обрабатывается в фоне. Запросы без правильного
+    секретного токена отклоняются. reuse_port — порт делят несколько процессов
+    """
+    app = web.Application()
+    handler = SimpleRequestHandler(dp, bot, secret_token=WEBHOOK_SECRET or None, **deps)
+    handler.register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot, **deps)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=reuse_port).start()
+    if WEBHOOK_URL and set_webhook:
+        await bot.set_webhook(
+            WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    print(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def create_bot() -> tuple:
+    """
+    Bot и Dispatcher с хэндлерами и метриками
+    """
+    bot = Bot(token=BOT_TOKEN)
+    bot.session.middleware(TelegramMetricsMiddleware())
+    dp = Dispatcher()
+    dp.message.middleware(MetricsMiddleware())
+    register_handlers(dp)
+    return bot, dp
 
 
 async def main():
     """
     Запуск бота!
     """
+    startup = StartupReport()
+    startup.mark("imports")
     patch_ssl_correctly()
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
+    bot, dp = create_bot()
+    http = HttpClientManager()
+    snapshot = FundingSnapshot()
+    refresher = SnapshotRefresher(snapshot, http, BULK_FETCHERS)
+    index = SymbolIndex()
+    index.load()
+    streams = StreamIngestor(snapshot, index) if WS_ENABLED else None
+    store = HistoryStore(index=index)
+    renderer = ChartRenderer()
+    chart_cache = ChartCache()
+    subscriptions = SubscriptionStore()
+    alerts = AlertEngine(subscriptions, snapshot, bot)
 
-    register_handlers(dp)
+    refresher.start()
+    index.start(http, INSTRUMENT_FETCHERS)
+    if streams is not None:
+        streams.start()
+    live_health.start(live_probes(http))
+    history_health.start(history_probes(http))
+    alerts.start()
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
+
+    deps = dict(
+        http=http,
+        snapshot=snapshot,
+        index=index,
+        store=store,
+        renderer=renderer,
+        chart_cache=chart_cache,
+        subscriptions=subscriptions,
+    )
+
+    async def on_startup():
+        startup.report("updates")
 
+    # Прием обновлений начинается сразу, процессы отрисовки прогреваются в фоне
+    dp.startup.register(on_startup)
+    startup.mark("ready")
+    warm_up = asyncio.create_task(startup.warm_up(renderer))
     print("Бот запущен!")
-    await dp.start_polling(bot)
+    try:
+        if BOT_MODE == "webhook":
+            await run_webhook(bot, dp, **deps)
+        else:
+            await dp.start_polling(bot, **deps)
+    finally:
+        warm_up.cancel()
+        await alerts.stop()
+        if streams is not None:
+            await streams.stop()
+        await refresher.stop()
+        await index.stop()
+        await live_health.stop()
+        await history_health.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await http.close()
+        store.close()
+        subscriptions.close()
+        renderer.close()
 
 
 if __name__ == "__main__":
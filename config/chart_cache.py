@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+from constants import CHART_CACHE_SIZE
+from metrics import CACHE_REQUESTS
+
+
+class ChartCache:
+    """
+    LRU-кэш готовых графиков.
+
+    Ключ — (команда, биржа, символы, дни, время последней выплаты в данных),
+    поэтому график устаревает сам, как только появляется новая выплата.
+    Для каждого ключа хранятся PNG и file_id из Telegram после первой
+    отправки: повторный запрос отправляется по file_id без отрисовки и загрузки.
+    """
+
+    def __init__(self, max_items: int = CHART_CACHE_SIZE):
+        self.max_items = max_items
+        self._png = OrderedDict()
+        self._file_ids = OrderedDict()
+
+    @staticmethod
+    def _get(storage: OrderedDict, key, name: str):
+        value = storage.get(key)
+        if value is not None:
+            storage.move_to_end(key)
+        CACHE_REQUESTS.labels(name, "miss" if value is None else "hit").inc()
+        return value
+
+    def _put(self, storage: OrderedDict, key, value):
+        storage[key] = value
+        storage.move_to_end(key)
+        while len(storage) > self.max_items:
+            storage.popitem(last=False)
+
+    def get_png(self, key):
+        return self._get(self._png, key, "chart_png")
+
+    def put_png(self, key, png: bytes):
+        self._put(self._png, key, png)
+
+    def get_file_id(self, key):
+        return self._get(self._file_ids, key, "chart_file_id")
+
+    def put_file_id(self, key, file_id: str):
+        self._put(self._file_ids, key, file_id)
+
+    def drop_file_id(self, key):
+        self._file_ids.pop(key, None)
@@ -0,0 +1,147 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import CHART_QUEUE_SIZE, CHART_WORKERS
+from metrics import RENDER_PENDING, RENDER_QUEUE_SECONDS, RENDER_REJECTED, RENDER_SECONDS
+
+
+# matplotlib импортируется только в процессах отрисовки: основной процесс
+# начинает polling, не дожидаясь его импорта и кэша шрифтов
+def _to_png(fig) -> bytes:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    FigureCanvasAgg(fig)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def render_spread_chart(symbol, exchange, times, cum_rates, total, mean, max_rate, min_rate) -> bytes:
+    """
+    График кумулятивной ставки одного символа на одной бирже (PNG)
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+    ax.plot(times, cum_rates, label=f"Cumulative Funding Rate {exchange}")
+    ax.set_title(
+        f"Cumulative Funding Rate {symbol} ({exchange})\n"
+        f"Total: {total}% | Mean(average): {mean}% | Max: {max_rate}% | Min: {min_rate}%"
+    )
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Cumulative %")
+    ax.legend()
+    ax.grid(True)
+    return _to_png(fig)
+
+
+def render_top_tokens_chart(exchange, days, results) -> bytes:
+    """
+    Кумулятивные ставки нескольких токенов на одном графике (PNG).
+    results: [(symbol, total, mean, max_rate, min_rate, times, cum), ...]
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    for symbol, total, mean, max_rate, min_rate, times, cum in results:
+        label = (
+            f"{symbol} | Total:{total}% | Mean:{mean}% "
+            f"| Max:{max_rate}% | Min:{min_rate}%"
+        )
+        ax.plot(times, cum, label=label)
+
+    ax.set_title(f"TOP cumulative funding ({exchange}) - {days}d")
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Cumulative %")
+    ax.legend()
+    ax.grid(True)
+    return _to_png(fig)
+
+
+def warm_up():
+    """
+    Выполняется при старте процесса отрисовки: импорт matplotlib, загрузка
+    кэша шрифтов и пробный график, чтобы первый запрос не ждал их
+    """
+    import numpy as np
+
+    times = np.array([0, 3_600_000], dtype="datetime64[ms]")
+    render_spread_chart("WARMUP", "WARMUP", times, [0.0, 0.0], 0, 0, 0, 0)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _timed(func, *args):
+    """
+    Выполняется в процессе отрисовки: (начало, конец, результат) по часам системы
+    """
+    started = time.time()
+    result = func(*args)
+    return started, time.time(), result
+
+
+class RendererBusy(Exception):
+    """
+    Очередь отрисовки заполнена
+    """
+
+
+class ChartRenderer:
+    """
+    Отрисовка графиков в пуле процессов, чтобы не блокировать event loop.
+    Одновременно принимается не больше workers + max_queue задач,
+    сверх этого render() сразу бросает RendererBusy.
+    """
+
+    def __init__(self, workers: int = CHART_WORKERS, max_queue: int = CHART_QUEUE_SIZE):
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=warm_up,
+        )
+
+    async def start(self) -> float:
+        """
+        Запуск всех процессов отрисовки заранее, в фоне после старта бота.
+        Возвращает время до готовности последнего процесса (секунды)
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        # Пул запускает процессы по мере надобности: пока ни один не свободен,
+        # каждая задача добавляет процесс, и в каждом сначала выполняется warm_up
+        await asyncio.gather(*(loop.run_in_executor(self._executor, _ready) for _ in range(self.workers)))
+        return time.perf_counter() - started
+
+    async def render(self, func, *args) -> bytes:
+        """
+        Выполняет func(*args) в отдельном процессе и возвращает PNG
+        """
+        if self.pending >= self.max_pending:
+            RENDER_REJECTED.labels().inc()
+            raise RendererBusy()
+        self.pending += 1
+        RENDER_PENDING.labels().set(self.pending)
+        try:
+            loop = asyncio.get_running_loop()
+            submitted = time.time()
+            started, finished, png = await loop.run_in_executor(self._executor, _timed, func, *args)
+            RENDER_QUEUE_SECONDS.labels(func.__name__).observe(max(0.0, started - submitted))
+            RENDER_SECONDS.labels(func.__name__).observe(finished - started)
+            return png
+        finally:
+            self.pending -= 1
+            RENDER_PENDING.labels().set(self.pending)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,120 @@
-from decouple import config
+from decouple import Csv, config
 
 
 BOT_TOKEN = config("BOT_TOKEN")
+
+# Telegram id администраторов (через запятую), им доступен /health
+ADMIN_IDS = config("ADMIN_IDS", default="", cast=Csv(int))
+
+# Получение обновлений: polling или webhook. В режиме webhook бот слушает
+# WEBHOOK_HOST:WEBHOOK_PORT, Telegram присылает обновления на WEBHOOK_URL + WEBHOOK_PATH
+BOT_MODE = config("BOT_MODE", default="polling")
+WEBHOOK_URL = config("WEBHOOK_URL", default="")
+WEBHOOK_PATH = config("WEBHOOK_PATH", default="/webhook")
+WEBHOOK_HOST = config("WEBHOOK_HOST", default="0.0.0.0")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8080, cast=int)
+WEBHOOK_SECRET = config("WEBHOOK_SECRET", default="")
+
+# HTTP-клиент для запросов к биржам
+HTTP_MAX_CONNECTIONS = config("HTTP_MAX_CONNECTIONS", default=20, cast=int)
+HTTP_MAX_KEEPALIVE = config("HTTP_MAX_KEEPALIVE", default=10, cast=int)
+HTTP_KEEPALIVE_EXPIRY = config("HTTP_KEEPALIVE_EXPIRY", default=60.0, cast=float)
+HTTP_TIMEOUT = config("HTTP_TIMEOUT", default=10.0, cast=float)
+HTTP_CONNECT_TIMEOUT = config("HTTP_CONNECT_TIMEOUT", default=5.0, cast=float)
+HTTP2_ENABLED = config("HTTP2_ENABLED", default=True, cast=bool)
+
+# Ограничение частоты запросов к биржам
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_DEFAULT_RATE = config("RATE_LIMIT_DEFAULT_RATE", default=10.0, cast=float)
+RATE_LIMIT_DEFAULT_BURST = config("RATE_LIMIT_DEFAULT_BURST", default=20.0, cast=float)
+RATE_LIMIT_MIN_FACTOR = config("RATE_LIMIT_MIN_FACTOR", default=0.1, cast=float)
+RATE_LIMIT_MAX_RETRIES = config("RATE_LIMIT_MAX_RETRIES", default=2, cast=int)
+RATE_LIMIT_MAX_WAIT = config("RATE_LIMIT_MAX_WAIT", default=5.0, cast=float)
+
+# Снимок ставок по всему рынку (секунды)
+SNAPSHOT_REFRESH_INTERVAL = config("SNAPSHOT_REFRESH_INTERVAL", default=30.0, cast=float)
+SNAPSHOT_MAX_AGE = config("SNAPSHOT_MAX_AGE", default=120.0, cast=float)
+# Как часто биржа с живым WebSocket-потоком все равно перечитывается по REST
+SNAPSHOT_RECONCILE_INTERVAL = config("SNAPSHOT_RECONCILE_INTERVAL", default=300.0, cast=float)
+
+# Ограничения времени ответа для /funding (секунды)
+FUNDING_DEADLINE = config("FUNDING_DEADLINE", default=6.0, cast=float)
+FUNDING_EXCHANGE_TIMEOUT = config("FUNDING_EXCHANGE_TIMEOUT", default=5.0, cast=float)
+
+# Постепенный вывод /funding: сообщение редактируется по мере ответов бирж
+FUNDING_STREAMING = config("FUNDING_STREAMING", default=True, cast=bool)
+FUNDING_EDIT_INTERVAL = config("FUNDING_EDIT_INTERVAL", default=1.0, cast=float)
+
+# Локальное хранилище истории ставок
+HISTORY_DB_PATH = config("HISTORY_DB_PATH", default="funding_history.sqlite3")
+HISTORY_RECHECK_INTERVAL = config("HISTORY_RECHECK_INTERVAL", default=600, cast=int)
+
+# Пагинация истории ставок
+PAGINATION_CONCURRENCY = config("PAGINATION_CONCURRENCY", default=4, cast=int)
+HISTORY_MAX_PAGES = config("HISTORY_MAX_PAGES", default=50, cast=int)
+HISTORY_SYMBOLS_CONCURRENCY = config("HISTORY_SYMBOLS_CONCURRENCY", default=8, cast=int)
+
+# Сколько секунд хранить результат запроса к бирже для одинаковых запросов подряд
+FUNDING_RESULT_TTL = config("FUNDING_RESULT_TTL", default=3.0, cast=float)
+HISTORY_RESULT_TTL = config("HISTORY_RESULT_TTL", default=60.0, cast=float)
+
+# Отрисовка графиков: число процессов и длина очереди
+CHART_WORKERS = config("CHART_WORKERS", default=2, cast=int)
+CHART_QUEUE_SIZE = config("CHART_QUEUE_SIZE", default=8, cast=int)
+CHART_CACHE_SIZE = config("CHART_CACHE_SIZE", default=256, cast=int)
+
+# Планировщик команд: одновременно выполняемых команд всего и у одного пользователя,
+# из них графиков по одному и по нескольким токенам; длина общей и личной очереди
+# и ожидание (секунды), за которое команда поднимается на один класс приоритета
+SCHEDULER_CONCURRENCY = config("SCHEDULER_CONCURRENCY", default=16, cast=int)
+SCHEDULER_PER_USER = config("SCHEDULER_PER_USER", default=2, cast=int)
+SCHEDULER_CHART_SLOTS = config("SCHEDULER_CHART_SLOTS", default=6, cast=int)
+SCHEDULER_MULTI_CHART_SLOTS = config("SCHEDULER_MULTI_CHART_SLOTS", default=3, cast=int)
+SCHEDULER_QUEUE_SIZE = config("SCHEDULER_QUEUE_SIZE", default=32, cast=int)
+SCHEDULER_USER_QUEUE = config("SCHEDULER_USER_QUEUE", default=3, cast=int)
+SCHEDULER_AGING = config("SCHEDULER_AGING", default=10.0, cast=float)
+
+# Подписки на пороги ставок: база правил, интервал проверки после обновления снимка,
+# гистерезис (доля порога, но не меньше минимума в процентах) и пауза перед повторным
+# уведомлением (секунды); отправка: сообщений в секунду всего, пауза между сообщениями
+# в один чат (секунды), строк в одном сообщении; правил на чат
+SUBSCRIPTIONS_DB_PATH = config("SUBSCRIPTIONS_DB_PATH", default="subscriptions.sqlite3")
+SUBSCRIPTION_CHECK_INTERVAL = config("SUBSCRIPTION_CHECK_INTERVAL", default=1.0, cast=float)
+SUBSCRIPTION_HYSTERESIS = config("SUBSCRIPTION_HYSTERESIS", default=0.1, cast=float)
+SUBSCRIPTION_HYSTERESIS_MIN = config("SUBSCRIPTION_HYSTERESIS_MIN", default=0.005, cast=float)
+SUBSCRIPTION_COOLDOWN = config("SUBSCRIPTION_COOLDOWN", default=600.0, cast=float)
+SUBSCRIPTION_SEND_RATE = config("SUBSCRIPTION_SEND_RATE", default=25.0, cast=float)
+SUBSCRIPTION_CHAT_INTERVAL = config("SUBSCRIPTION_CHAT_INTERVAL", default=1.0, cast=float)
+SUBSCRIPTION_MAX_LINES = config("SUBSCRIPTION_MAX_LINES", default=20, cast=int)
+SUBSCRIPTION_MAX_PER_CHAT = config("SUBSCRIPTION_MAX_PER_CHAT", default=50, cast=int)
+
+# Индекс символов по спискам контрактов бирж
+SYMBOL_INDEX_PATH = config("SYMBOL_INDEX_PATH", default="symbol_index.json")
+SYMBOL_INDEX_REFRESH_INTERVAL = config("SYMBOL_INDEX_REFRESH_INTERVAL", default=3600.0, cast=float)
+
+# Здоровье бирж и автоматическое отключение недоступных (секунды)
+HEALTH_WINDOW = config("HEALTH_WINDOW", default=20, cast=int)
+HEALTH_FAILURE_THRESHOLD = config("HEALTH_FAILURE_THRESHOLD", default=5, cast=int)
+HEALTH_MIN_SUCCESS_RATE = config("HEALTH_MIN_SUCCESS_RATE", default=0.5, cast=float)
+HEALTH_OPEN_TIMEOUT = config("HEALTH_OPEN_TIMEOUT", default=30.0, cast=float)
+HEALTH_OPEN_MAX = config("HEALTH_OPEN_MAX", default=600.0, cast=float)
+HEALTH_PROBE_INTERVAL = config("HEALTH_PROBE_INTERVAL", default=5.0, cast=float)
+
+# Метрики в формате Prometheus (порт 0 — сервер /metrics не запускается)
+METRICS_HOST = config("METRICS_HOST", default="127.0.0.1")
+METRICS_PORT = config("METRICS_PORT", default=9100, cast=int)
+
+# WebSocket-потоки ставок: биржи, тишина до переподключения и максимальная пауза
+# между попытками (секунды). WS_URL_OVERRIDE — адрес мок-сервера вместо бирж
+WS_ENABLED = config("WS_ENABLED", default=True, cast=bool)
+WS_EXCHANGES = config("WS_EXCHANGES", default="BINANCE,BYBIT,OKX,BITGET,GATE", cast=Csv())
+WS_IDLE_TIMEOUT = config("WS_IDLE_TIMEOUT", default=30.0, cast=float)
+WS_RECONNECT_MAX = config("WS_RECONNECT_MAX", default=60.0, cast=float)
+WS_WARMUP = config("WS_WARMUP", default=3.0, cast=float)
+WS_URL_OVERRIDE = config("WS_URL_OVERRIDE", default="")
+
+# Многопроцессный режим (supervisor.py): процессы-обработчики, емкость общей
+# таблицы ставок (символов) и интервал ее публикации процессом сбора данных, секунды
+WORKERS = config("WORKERS", default=2, cast=int)
+SHARED_MAX_SYMBOLS = config("SHARED_MAX_SYMBOLS", default=4096, cast=int)
+SHARED_PUBLISH_INTERVAL = config("SHARED_PUBLISH_INTERVAL", default=0.5, cast=float)
@@ -0,0 +1,102 @@
+"""
+Разбор JSON-ответов бирж.
+
+loads() — самый быстрый из установленных парсеров: orjson, иначе json.
+BulkSchema описывает массовый эндпоинт (путь до списка контрактов и имена
+полей). С msgspec ответ декодируется по схеме сразу в записи снимка:
+остальные поля контрактов пропускаются без создания объектов Python.
+Без msgspec те же записи строятся из loads().
+"""
+import json
+from typing import Union
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+# Числа биржи отдают то строками, то числами, иногда null или ""
+_Value = Union[str, int, float, None]
+
+
+def _float(value) -> float:
+    return float(value or 0)
+
+
+def _int(value) -> int:
+    return int(value or 0)
+
+
+class BulkSchema:
+    """
+    Ответ массового эндпоинта: список контрактов по пути `path` от корня,
+    у каждого — символ, ставка и (если есть) время следующей выплаты
+    """
+
+    def __init__(self, exchange: str, path: tuple, symbol: str, rate: str, next_time: str = None):
+        self.exchange = exchange
+        self.path = path
+        self.symbol = symbol
+        self.rate = rate
+        self.next_time = next_time
+        self._decoder = self._build_decoder() if MSGSPEC_AVAILABLE else None
+
+    def _build_decoder(self):
+        fields = [("symbol", str), ("rate", _Value, None)]
+        rename = {"symbol": self.symbol, "rate": self.rate}
+        if self.next_time is not None:
+            fields.append(("next_time", _Value, None))
+            rename["next_time"] = self.next_time
+        item = msgspec.defstruct(f"{self.exchange.title()}Item", fields, rename=rename)
+
+        # Уровень, которого нет в ответе (или null), декодируется в None
+        decoded = list[item]
+        for i, key in enumerate(reversed(self.path)):
+            name = f"{self.exchange.title()}Envelope{i}"
+            decoded = msgspec.defstruct(name, [("value", Union[decoded, None], None)], rename={"value": key})
+        return msgspec.json.Decoder(decoded)
+
+    def decode(self, content: bytes) -> list:
+        """
+        Записи снимка {"exchange", "symbol", "funding_rate", "next_funding_time"}
+        """
+        if self._decoder is not None:
+            data = self._decoder.decode(content)
+            for _ in self.path:
+                if data is None:
+                    return []
+                data = data.value
+            return [
+                {
+                    "exchange": self.exchange,
+                    "symbol": item.symbol,
+                    "funding_rate": _float(item.rate),
+                    "next_funding_time": _int(item.next_time) if self.next_time is not None else 0,
+                }
+                for item in data or []
+            ]
+
+        return self.from_python(loads(content))
+
+    def from_python(self, data) -> list:
+        """
+        Те же записи из уже разобранного ответа
+        """
+        for key in self.path:
+            data = data.get(key) or {}
+        return [
+            {
+                "exchange": self.exchange,
+                "symbol": item[self.symbol],
+                "funding_rate": _float(item.get(self.rate)),
+                "next_funding_time": _int(item.get(self.next_time)) if self.next_time is not None else 0,
+            }
+            for item in data or []
+        ]
@@ -1,510 +1,936 @@
-import httpx
 import asyncio
+import logging
 import time
-from datetime import datetime, timedelta
+
+from constants import (
+    FUNDING_DEADLINE,
+    FUNDING_EXCHANGE_TIMEOUT,
+    FUNDING_RESULT_TTL,
+    HISTORY_RESULT_TTL,
+)
+from decoding import BulkSchema, loads
+from health import ExchangeUnavailable, HealthRegistry
+from http_client import HttpClientManager
+from metrics import EXCHANGE_TIMED_OUT
+from pagination import paginate_cursor, paginate_pages, paginate_time_windows
+from series import FundingFrame
+from singleflight import SingleFlight
+from snapshot import FundingSnapshot
+from symbol_index import SymbolIndex, native_symbol
+
+logger = logging.getLogger(__name__)
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+# Одинаковые одновременные запросы к биржам выполняются один раз
+funding_flights = SingleFlight(ttl=FUNDING_RESULT_TTL, name="funding")
+history_flights = SingleFlight(ttl=HISTORY_RESULT_TTL, name="history")
+
+# Здоровье бирж отдельно для текущих ставок и для истории: это разные эндпоинты
+live_health = HealthRegistry("Текущие ставки")
+history_health = HealthRegistry("История")
+
+
+def _listed(r, not_listed=None) -> bool:
+    """
+    Листит ли биржа символ по ответу на запрос текущей ставки.
+    5xx и 429 — сбой биржи: исключение, чтобы он учитывался в ее здоровье.
+    404 и ответ, для тела которого not_listed(тело) истинно, — символа на бирже нет;
+    прочие 4xx — ошибка самого запроса, она логируется и в здоровье не учитывается
+    """
+    if r.status_code >= 500 or r.status_code == 429:
+        r.raise_for_status()
+    if r.status_code < 400:
+        return True
+    if r.status_code == 404:
+        return False
+    if not_listed is not None:
+        try:
+            if not_listed(loads(r.content)):
+                return False
+        except ValueError:
+            pass
+    logger.warning("Неожиданный ответ %s на %s: %.200s", r.status_code, r.request.url, r.text)
+    return False
+
+
+def _binance_not_listed(body) -> bool:
+    """
+    Binance отвечает на неизвестный символ 400 с кодом -1121 (Invalid symbol)
+    """
+    return isinstance(body, dict) and body.get("code") == -1121
+
+
+def _gate_not_listed(body) -> bool:
+    """
+    Gate отвечает на неизвестный контракт 400 с label CONTRACT_NOT_FOUND
+    """
+    return isinstance(body, dict) and body.get("label") == "CONTRACT_NOT_FOUND"
 
 
-async def fetch_mexc(symbol: str):
+async def fetch_mexc(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования MEXC
     """
-    symbol_usdt = symbol.replace("USDT", "_USDT")
-    url = f"https://contract.mexc.com/api/v1/contract/funding_rate/{symbol_usdt}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("data")
-        if not data:
-            return None
-        return {
-            "exchange": "MEXC",
-            "symbol": symbol_usdt,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("nextSettleTime", 0))
-        }
+    url = f"https://contract.mexc.com/api/v1/contract/funding_rate/{symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("data")
+    if not data:
+        return None
+    return {
+        "exchange": "MEXC",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("nextSettleTime", 0))
+    }
 
 
-async def fetch_binance(symbol: str):
+async def fetch_binance(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования Binance
     """
     url = f"https://fapi.binance.com/fapi/v1/premiumIndex?symbol={symbol}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json()
-        return {
-            "exchange": "BINANCE",
-            "symbol": symbol,
-            "funding_rate": float(data.get("lastFundingRate", 0)),
-            "next_funding_time": int(data.get("nextFundingTime", 0))
-        }
+    r = await http.get(url)
+    if not _listed(r, _binance_not_listed):
+        return None
+    data = loads(r.content)
+    return {
+        "exchange": "BINANCE",
+        "symbol": symbol,
+        "funding_rate": float(data.get("lastFundingRate", 0)),
+        "next_funding_time": int(data.get("nextFundingTime", 0))
+    }
 
 
-async def fetch_bingx(symbol: str):
+async def fetch_bingx(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования BINGX
     """
-    symbol_bingx = symbol.replace("USDT", "-USDT")
-    url = f"https://open-api.bingx.com/openApi/swap/v2/quote/premiumIndex?symbol={symbol_bingx}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("data", {})
-        return {
-            "exchange": "BINGX",
-            "symbol": symbol_bingx,
-            "funding_rate": float(data.get("lastFundingRate", 0)),
-            "next_funding_time": int(data.get("nextFundingTime", 0))
-        }
+    url = f"https://open-api.bingx.com/openApi/swap/v2/quote/premiumIndex?symbol={symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("data", {})
+    if not data:
+        return None
+    return {
+        "exchange": "BINGX",
+        "symbol": symbol,
+        "funding_rate": float(data.get("lastFundingRate", 0)),
+        "next_funding_time": int(data.get("nextFundingTime", 0))
+    }
 
 
-async def fetch_bitget(symbol: str):
+async def fetch_bitget(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования BITGET
     """
     url = f"https://api.bitget.com/api/v2/mix/market/current-fund-rate?symbol={symbol}&productType=usdt-futures"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data_list = r.json().get("data", [])
-        if not data_list:
-            return None
-        data = data_list[0]
-        return {
-            "exchange": "BITGET",
-            "symbol": symbol,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("nextUpdate", 0))
-        }
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data_list = loads(r.content).get("data", [])
+    if not data_list:
+        return None
+    data = data_list[0]
+    return {
+        "exchange": "BITGET",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("nextUpdate", 0))
+    }
 
 
-async def fetch_bitmart(symbol: str):
+async def fetch_bitmart(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования BITMART
     """
     url = f"https://api-cloud-v2.bitmart.com/contract/public/details?symbol={symbol}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data_list = r.json().get("data", {}).get("symbols", [])
-        if not data_list:
-            return None
-        data = data_list[0]
-        return {
-            "exchange": "BITMART",
-            "symbol": symbol,
-            "funding_rate": float(data.get("funding_rate", 0)),
-            "next_funding_time": int(data.get("funding_time", 0))
-        }
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data_list = loads(r.content).get("data", {}).get("symbols", [])
+    if not data_list:
+        return None
+    data = data_list[0]
+    return {
+        "exchange": "BITMART",
+        "symbol": symbol,
+        "funding_rate": float(data.get("funding_rate", 0)),
+        "next_funding_time": int(data.get("funding_time", 0))
+    }
 
 
-async def fetch_bybit(symbol: str):
+async def fetch_bybit(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования BYBIT
     """
     url = f"https://api.bybit.com/v5/market/tickers?category=inverse&symbol={symbol}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        lst = r.json().get("result", {}).get("list", [])
-        if not lst:
-            return None
-        data = lst[0]
-        return {
-            "exchange": "BYBIT",
-            "symbol": symbol,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("nextFundingTime", 0))
-        }
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    lst = loads(r.content).get("result", {}).get("list", [])
+    if not lst:
+        return None
+    data = lst[0]
+    return {
+        "exchange": "BYBIT",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("nextFundingTime", 0))
+    }
 
 
-async def fetch_coinex(symbol: str):
+async def fetch_coinex(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования COINEX
     """
     url = f"https://api.coinex.com/v2/futures/funding-rate?market={symbol}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        lst = r.json().get("data", [])
-        if not lst:
-            return None
-        data = lst[0]
-        return {
-            "exchange": "COINEX",
-            "symbol": symbol,
-            "funding_rate": float(data.get("latest_funding_rate", 0)),
-            "next_funding_time": int(data.get("latest_funding_time", 0))
-        }
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    lst = loads(r.content).get("data", [])
+    if not lst:
+        return None
+    data = lst[0]
+    return {
+        "exchange": "COINEX",
+        "symbol": symbol,
+        "funding_rate": float(data.get("latest_funding_rate", 0)),
+        "next_funding_time": int(data.get("latest_funding_time", 0))
+    }
 
 
-async def fetch_gate(symbol: str):
+async def fetch_gate(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования GATE
     """
-    symbol_gate = symbol.replace("USDT", "_USDT")
-    url = f"https://api.gateio.ws/api/v4/futures/usdt/contracts/{symbol_gate}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json()
-        return {
-            "exchange": "GATE",
-            "symbol": symbol_gate,
-            "funding_rate": float(data.get("funding_rate", 0)),
-            "next_funding_time": int(data.get("funding_next_apply", 0))
-        }
+    url = f"https://api.gateio.ws/api/v4/futures/usdt/contracts/{symbol}"
+    r = await http.get(url)
+    if not _listed(r, _gate_not_listed):
+        return None
+    data = loads(r.content)
+    return {
+        "exchange": "GATE",
+        "symbol": symbol,
+        "funding_rate": float(data.get("funding_rate", 0)),
+        "next_funding_time": int(data.get("funding_next_apply", 0))
+    }
 
 
-async def fetch_htx(symbol: str):
+async def fetch_htx(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования HTX (Huobi)
     """
-    symbol_htx = symbol.replace("USDT", "-USDT")
-    url = f"https://api.hbdm.com/linear-swap-api/v1/swap_funding_rate?contract_code={symbol_htx}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("data", {})
-        if not data:
-            return None
-        return {
-            "exchange": "HTX",
-            "symbol": symbol_htx,
-            "funding_rate": float(data.get("funding_rate", 0)),
-            "next_funding_time": int(data.get("funding_time", 0))
-        }
+    url = f"https://api.hbdm.com/linear-swap-api/v1/swap_funding_rate?contract_code={symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("data", {})
+    if not data:
+        return None
+    return {
+        "exchange": "HTX",
+        "symbol": symbol,
+        "funding_rate": float(data.get("funding_rate", 0)),
+        "next_funding_time": int(data.get("funding_time", 0))
+    }
 
 
-async def fetch_kucoin(symbol: str):
+async def fetch_kucoin(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования KUCOIN
     """
-    symbol_kc = f"{symbol}M"
-    url = f"https://api-futures.kucoin.com/api/v1/contracts/{symbol_kc}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("data", {})
-        if not data:
-            return None
-        return {
-            "exchange": "KUCOIN",
-            "symbol": symbol_kc,
-            "funding_rate": float(data.get("fundingFeeRate", 0)),
-            "next_funding_time": int(data.get("nextFundingRateTime", 0))
-        }
+    url = f"https://api-futures.kucoin.com/api/v1/contracts/{symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("data", {})
+    if not data:
+        return None
+    return {
+        "exchange": "KUCOIN",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingFeeRate", 0)),
+        "next_funding_time": int(data.get("nextFundingRateTime", 0))
+    }
 
 
-async def fetch_okx(symbol: str):
+async def fetch_okx(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования OKX
     """
-    symbol_okx = symbol.replace("USDT", "-USDT-SWAP")
-    url = f"https://www.okx.com/api/v5/public/funding-rate?instId={symbol_okx}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data_list = r.json().get("data", [])
-        if not data_list:
-            return None
-        data = data_list[0]
-        return {
-            "exchange": "OKX",
-            "symbol": symbol_okx,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("fundingTime", 0))
-        }
+    url = f"https://www.okx.com/api/v5/public/funding-rate?instId={symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data_list = loads(r.content).get("data", [])
+    if not data_list:
+        return None
+    data = data_list[0]
+    return {
+        "exchange": "OKX",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("fundingTime", 0))
+    }
 
 
-async def fetch_weex(symbol: str):
+async def fetch_weex(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования WEEX (как у MEXC)
     """
-    symbol_usdt = symbol.replace("USDT", "_USDT")
-    url = f"https://contract.mexc.com/api/v1/contract/funding_rate/{symbol_usdt}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("data")
-        if not data:
-            return None
-        return {
-            "exchange": "WEEX",
-            "symbol": symbol_usdt,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("nextSettleTime", 0))
-        }
+    url = f"https://contract.mexc.com/api/v1/contract/funding_rate/{symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("data")
+    if not data:
+        return None
+    return {
+        "exchange": "WEEX",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("nextSettleTime", 0))
+    }
 
 
-async def fetch_blofin(symbol: str):
+async def fetch_blofin(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования BLOFIN
     """
-    symbol_blofin = symbol.replace("USDT", "-USDT")
-    url = f"https://openapi.blofin.com/api/v1/market/funding-rate?instId={symbol_blofin}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        lst = r.json().get("data", [])
-        if not lst:
-            return None
-        data = lst[0]
-        return {
-            "exchange": "BLOFIN",
-            "symbol": symbol_blofin,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("fundingTime", 0))
-        }
+    url = f"https://openapi.blofin.com/api/v1/market/funding-rate?instId={symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    lst = loads(r.content).get("data", [])
+    if not lst:
+        return None
+    data = lst[0]
+    return {
+        "exchange": "BLOFIN",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("fundingTime", 0))
+    }
 
 
-async def fetch_ourbit(symbol: str):
+async def fetch_ourbit(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования OURBIT
     """
-    symbol_ourbit = symbol.replace("USDT", "_USDT")
-    url = f"https://futures.ourbit.com/api/v1/contract/funding_rate/{symbol_ourbit}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("data", {})
-        if not data:
-            return None
-        return {
-            "exchange": "OURBIT",
-            "symbol": symbol_ourbit,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("timestamp", 0))
-        }
+    url = f"https://futures.ourbit.com/api/v1/contract/funding_rate/{symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("data", {})
+    if not data:
+        return None
+    return {
+        "exchange": "OURBIT",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("timestamp", 0))
+    }
 
 
-async def fetch_xt(symbol: str):
+async def fetch_xt(symbol: str, http: HttpClientManager):
     """
     Вывод ставок финансирования XT
     """
-    symbol_xt = symbol.lower() + "_usdt"
-    url = f"https://fapi.xt.com/future/market/v1/public/q/funding-rate?symbol={symbol_xt}"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        if r.status_code != 200:
-            return None
-        data = r.json().get("result", {})
-        if not data:
-            return None
-        return {
-            "exchange": "XT",
-            "symbol": symbol_xt,
-            "funding_rate": float(data.get("fundingRate", 0)),
-            "next_funding_time": int(data.get("nextCollectionTime", 0))
-        }
+    url = f"https://fapi.xt.com/future/market/v1/public/q/funding-rate?symbol={symbol}"
+    r = await http.get(url)
+    if not _listed(r):
+        return None
+    data = loads(r.content).get("result", {})
+    if not data:
+        return None
+    return {
+        "exchange": "XT",
+        "symbol": symbol,
+        "funding_rate": float(data.get("fundingRate", 0)),
+        "next_funding_time": int(data.get("nextCollectionTime", 0))
+    }
+
+
+# Форматы ответов массовых эндпоинтов: путь до списка контрактов и имена полей
+BULK_SCHEMAS = {
+    "BINANCE": BulkSchema("BINANCE", (), "symbol", "lastFundingRate", "nextFundingTime"),
+    "BYBIT": BulkSchema("BYBIT", ("result", "list"), "symbol", "fundingRate", "nextFundingTime"),
+    "GATE": BulkSchema("GATE", (), "name", "funding_rate", "funding_next_apply"),
+    "BITGET": BulkSchema("BITGET", ("data",), "symbol", "fundingRate", "nextUpdate"),
+    "BITMART": BulkSchema("BITMART", ("data", "symbols"), "symbol", "funding_rate", "funding_time"),
+    "MEXC": BulkSchema("MEXC", ("data",), "symbol", "fundingRate", "nextSettleTime"),
+    "BINGX": BulkSchema("BINGX", ("data",), "symbol", "lastFundingRate", "nextFundingTime"),
+    "HTX": BulkSchema("HTX", ("data",), "contract_code", "funding_rate", "funding_time"),
+    "KUCOIN": BulkSchema("KUCOIN", ("data",), "symbol", "fundingFeeRate", "nextFundingRateTime"),
+    "BLOFIN": BulkSchema("BLOFIN", ("data",), "instId", "fundingRate", "fundingTime"),
+}
+
+
+async def fetch_binance_all(http: HttpClientManager):
+    """
+    Ставки финансирования Binance по всем символам одним запросом
+    """
+    r = await http.get("https://fapi.binance.com/fapi/v1/premiumIndex")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["BINANCE"].decode(r.content)
+
+
+async def fetch_bybit_all(http: HttpClientManager):
+    """
+    Ставки финансирования BYBIT по всем линейным контрактам
+    """
+    r = await http.get("https://api.bybit.com/v5/market/tickers?category=linear")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["BYBIT"].decode(r.content)
+
+
+async def fetch_gate_all(http: HttpClientManager):
+    """
+    Ставки финансирования GATE по всем USDT контрактам
+    """
+    r = await http.get("https://api.gateio.ws/api/v4/futures/usdt/contracts")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["GATE"].decode(r.content)
+
+
+async def fetch_bitget_all(http: HttpClientManager):
+    """
+    Ставки финансирования BITGET по всем USDT контрактам (без symbol — по всем сразу)
+    """
+    r = await http.get("https://api.bitget.com/api/v2/mix/market/current-fund-rate?productType=usdt-futures")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["BITGET"].decode(r.content)
+
+
+async def fetch_bitmart_all(http: HttpClientManager):
+    """
+    Ставки финансирования BITMART по всем контрактам
+    """
+    r = await http.get("https://api-cloud-v2.bitmart.com/contract/public/details")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["BITMART"].decode(r.content)
+
+
+async def fetch_mexc_all(http: HttpClientManager):
+    """
+    Ставки финансирования MEXC по всем контрактам
+    """
+    r = await http.get("https://contract.mexc.com/api/v1/contract/funding_rate")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["MEXC"].decode(r.content)
+
+
+async def fetch_bingx_all(http: HttpClientManager):
+    """
+    Ставки финансирования BINGX по всем контрактам
+    """
+    r = await http.get("https://open-api.bingx.com/openApi/swap/v2/quote/premiumIndex")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["BINGX"].decode(r.content)
+
+
+async def fetch_htx_all(http: HttpClientManager):
+    """
+    Ставки финансирования HTX по всем линейным свопам
+    """
+    r = await http.get("https://api.hbdm.com/linear-swap-api/v1/swap_batch_funding_rate")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["HTX"].decode(r.content)
+
+
+async def fetch_kucoin_all(http: HttpClientManager):
+    """
+    Ставки финансирования KUCOIN по всем активным контрактам
+    """
+    r = await http.get("https://api-futures.kucoin.com/api/v1/contracts/active")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["KUCOIN"].decode(r.content)
 
 
-async def get_all_funding(symbol: str):
-    """
-    Вывод ставок финансирования со всех бирж
-    """
-    exchanges_funcs = [
-        fetch_mexc,
-        fetch_binance,
-        fetch_bingx,
-        fetch_bitget,
-        fetch_bitmart,
-        fetch_bybit,
-        fetch_coinex,
-        fetch_gate,
-        fetch_htx,
-        fetch_kucoin,
-        fetch_okx,
-        fetch_weex,
-        fetch_blofin,
-        fetch_ourbit,
-        fetch_xt,
+async def fetch_blofin_all(http: HttpClientManager):
+    """
+    Ставки финансирования BLOFIN по всем контрактам
+    """
+    r = await http.get("https://openapi.blofin.com/api/v1/market/funding-rate")
+    if r.status_code != 200:
+        return []
+    return BULK_SCHEMAS["BLOFIN"].decode(r.content)
+
+
+async def fetch_binance_instruments(http: HttpClientManager):
+    """
+    Список бессрочных USDT контрактов Binance
+    """
+    r = await http.get("https://fapi.binance.com/fapi/v1/exchangeInfo")
+    if r.status_code != 200:
+        return []
+    return [
+        item["symbol"] for item in loads(r.content).get("symbols", [])
+        if item.get("contractType") == "PERPETUAL" and item.get("status") == "TRADING"
     ]
 
-    tasks = [func(symbol) for func in exchanges_funcs]
 
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+async def fetch_bybit_instruments(http: HttpClientManager):
+    """
+    Список линейных контрактов BYBIT; при ошибке любой страницы — пустой список,
+    чтобы индекс не заменился неполным
+    """
+    url = "https://api.bybit.com/v5/market/instruments-info"
+    symbols = []
+    params = {"category": "linear", "limit": 1000}
+    while True:
+        r = await http.get(url, params=params)
+        if r.status_code != 200:
+            return []
+        result = loads(r.content).get("result", {})
+        symbols.extend(item["symbol"] for item in result.get("list", []) if item.get("status") == "Trading")
+        params["cursor"] = result.get("nextPageCursor")
+        if not params["cursor"]:
+            return symbols
 
-    funding_data = []
-    for res in results:
-        if isinstance(res, dict) and res:
-            funding_data.append(res)
 
-    return funding_data
+async def fetch_okx_instruments(http: HttpClientManager):
+    """
+    Список бессрочных свопов OKX
+    """
+    r = await http.get("https://www.okx.com/api/v5/public/instruments?instType=SWAP")
+    if r.status_code != 200:
+        return []
+    return [item["instId"] for item in loads(r.content).get("data", []) if item.get("state") == "live"]
 
 
-async def fetch_binance_history(symbol: str, days: int = 7, limit: int = 500):
+async def fetch_gate_instruments(http: HttpClientManager):
     """
-    Получает историю ставок финансирования Binance за последние `days` дней.
+    Список USDT контрактов GATE
     """
-    end = int(datetime.utcnow().timestamp() * 1000)
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
-    url = "https://fapi.binance.com/fapi/v1/fundingRate"
-    params = {
-        "symbol": symbol,
-        "startTime": start,
-        "endTime": end,
-        "limit": limit
+    r = await http.get("https://api.gateio.ws/api/v4/futures/usdt/contracts")
+    if r.status_code != 200:
+        return []
+    return [item["name"] for item in loads(r.content) if not item.get("in_delisting")]
+
+
+async def fetch_bitget_instruments(http: HttpClientManager):
+    """
+    Список USDT контрактов BITGET
+    """
+    r = await http.get("https://api.bitget.com/api/v2/mix/market/contracts?productType=usdt-futures")
+    if r.status_code != 200:
+        return []
+    return [item["symbol"] for item in loads(r.content).get("data", [])]
+
+
+async def fetch_bitmart_instruments(http: HttpClientManager):
+    """
+    Список контрактов BITMART
+    """
+    r = await http.get("https://api-cloud-v2.bitmart.com/contract/public/details")
+    if r.status_code != 200:
+        return []
+    return [item["symbol"] for item in loads(r.content).get("data", {}).get("symbols", [])]
+
+
+async def fetch_mexc_instruments(http: HttpClientManager):
+    """
+    Список контрактов MEXC
+    """
+    r = await http.get("https://contract.mexc.com/api/v1/contract/detail")
+    if r.status_code != 200:
+        return []
+    return [item["symbol"] for item in loads(r.content).get("data", []) if item.get("state") == 0]
+
+
+async def fetch_bingx_instruments(http: HttpClientManager):
+    """
+    Список контрактов BINGX
+    """
+    r = await http.get("https://open-api.bingx.com/openApi/swap/v2/quote/contracts")
+    if r.status_code != 200:
+        return []
+    return [item["symbol"] for item in loads(r.content).get("data", [])]
+
+
+async def fetch_htx_instruments(http: HttpClientManager):
+    """
+    Список линейных свопов HTX
+    """
+    r = await http.get("https://api.hbdm.com/linear-swap-api/v1/swap_contract_info")
+    if r.status_code != 200:
+        return []
+    return [item["contract_code"] for item in loads(r.content).get("data", []) if item.get("contract_status") == 1]
+
+
+async def fetch_kucoin_instruments(http: HttpClientManager):
+    """
+    Список активных контрактов KUCOIN
+    """
+    r = await http.get("https://api-futures.kucoin.com/api/v1/contracts/active")
+    if r.status_code != 200:
+        return []
+    return [item["symbol"] for item in loads(r.content).get("data", [])]
+
+
+async def fetch_blofin_instruments(http: HttpClientManager):
+    """
+    Список контрактов BLOFIN
+    """
+    r = await http.get("https://openapi.blofin.com/api/v1/market/instruments")
+    if r.status_code != 200:
+        return []
+    return [item["instId"] for item in loads(r.content).get("data", [])]
+
+
+async def fetch_coinex_instruments(http: HttpClientManager):
+    """
+    Список фьючерсных рынков COINEX
+    """
+    r = await http.get("https://api.coinex.com/v2/futures/market")
+    if r.status_code != 200:
+        return []
+    return [item["market"] for item in loads(r.content).get("data", [])]
+
+
+LIVE_FETCHERS = {
+    "MEXC": fetch_mexc,
+    "BINANCE": fetch_binance,
+    "BINGX": fetch_bingx,
+    "BITGET": fetch_bitget,
+    "BITMART": fetch_bitmart,
+    "BYBIT": fetch_bybit,
+    "COINEX": fetch_coinex,
+    "GATE": fetch_gate,
+    "HTX": fetch_htx,
+    "KUCOIN": fetch_kucoin,
+    "OKX": fetch_okx,
+    # "WEEX": fetch_weex, ходит в API MEXC и дублирует его ставки
+    "BLOFIN": fetch_blofin,
+    "OURBIT": fetch_ourbit,
+    "XT": fetch_xt,
+}
+
+# Биржи, для которых известен список контрактов (для индекса символов);
+# остальные опрашиваются по правилам преобразования символа
+INSTRUMENT_FETCHERS = {
+    "BINANCE": fetch_binance_instruments,
+    "BYBIT": fetch_bybit_instruments,
+    "OKX": fetch_okx_instruments,
+    "GATE": fetch_gate_instruments,
+    "BITGET": fetch_bitget_instruments,
+    "BITMART": fetch_bitmart_instruments,
+    "MEXC": fetch_mexc_instruments,
+    "BINGX": fetch_bingx_instruments,
+    "HTX": fetch_htx_instruments,
+    "KUCOIN": fetch_kucoin_instruments,
+    "BLOFIN": fetch_blofin_instruments,
+    "COINEX": fetch_coinex_instruments,
+}
+
+# Индивидуальные таймауты для бирж, которые часто зависают (секунды)
+EXCHANGE_TIMEOUTS = {
+    "HTX": 3.0,
+    "BITMART": 3.0,
+}
+
+# Биржи, которые отдают ставки по всему рынку одним запросом
+BULK_FETCHERS = {
+    "BINANCE": fetch_binance_all,
+    "BYBIT": fetch_bybit_all,
+    "GATE": fetch_gate_all,
+    "BITGET": fetch_bitget_all,
+    "BITMART": fetch_bitmart_all,
+    "MEXC": fetch_mexc_all,
+    "BINGX": fetch_bingx_all,
+    "HTX": fetch_htx_all,
+    "KUCOIN": fetch_kucoin_all,
+    "BLOFIN": fetch_blofin_all,
+}
+
+
+async def _fetch_live(exchange: str, func, symbol: str, http: HttpClientManager, timeout: float):
+    """
+    Запрос к одной бирже с таймаутом: (биржа, ставка или None, ошибка или None)
+    """
+    try:
+        request = funding_flights.do(
+            ("funding", exchange, symbol), lambda: live_health.call(exchange, lambda: func(symbol, http), timeout)
+        )
+        row = await asyncio.wait_for(request, timeout)
+        return exchange, row, None
+    except asyncio.TimeoutError as e:
+        EXCHANGE_TIMED_OUT.labels(exchange).inc()
+        return exchange, None, e
+    except Exception as e:
+        return exchange, None, e
+
+
+async def iter_all_funding(
+    symbol: str,
+    http: HttpClientManager,
+    snapshot: FundingSnapshot = None,
+    index: SymbolIndex = None,
+    deadline: float = FUNDING_DEADLINE,
+    timeout: float = FUNDING_EXCHANGE_TIMEOUT,
+):
+    """
+    Ставки финансирования со всех бирж по мере поступления.
+    Отдает (биржа, ставка, ok): сначала свежие ставки из snapshot,
+    затем ответы бирж в порядке прихода. ok=False — биржа упала
+    с ошибкой (в том числе ответила не 200) или не успела к общему дедлайну;
+    ставка None при ok=True — биржа символ не листит.
+    Символ переводится в формат каждой биржи по index (или по NATIVE_RULES).
+    Отключенные автоматом биржи не опрашиваются и сразу отдаются с ok=False.
+    """
+    exchanges_funcs = LIVE_FETCHERS
+    if snapshot is not None:
+        fresh = snapshot.fresh_exchanges()
+        for row in snapshot.get(symbol):
+            yield row["exchange"], row, True
+        exchanges_funcs = {
+            exchange: func for exchange, func in LIVE_FETCHERS.items() if exchange not in fresh
+        }
+
+    # Биржи, которые символ не листят, не опрашиваются
+    natives = {exchange: native_symbol(exchange, symbol, index) for exchange in exchanges_funcs}
+    exchanges_funcs = {
+        exchange: func for exchange, func in exchanges_funcs.items() if natives[exchange] is not None
     }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-    history = []
-    for item in resp_json:
-        history.append({
-            "exchange": "BINANCE",
-            "symbol": symbol,
-            "funding_rate": float(item.get("fundingRate", 0)),
-            "funding_time": int(item.get("fundingTime", 0))
-        })
-    return history
 
+    for exchange in [exchange for exchange in exchanges_funcs if not live_health.allow(exchange)]:
+        del exchanges_funcs[exchange]
+        yield exchange, None, False
 
-async def fetch_bybit_history(symbol: str, days: int = 100):
-    end = int(time.time()) * 1000
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp()) * 1000
-    url = f"https://api.bybit.com/v5/market/funding/history?symbol={symbol}&startTime={start}&endTime={end}&category=linear"
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url)
-        resp_json = r.json()
+    tasks = [
+        asyncio.create_task(
+            _fetch_live(exchange, func, natives[exchange], http, EXCHANGE_TIMEOUTS.get(exchange, timeout))
+        )
+        for exchange, func in exchanges_funcs.items()
+    ]
+    pending = list(exchanges_funcs)
+    try:
+        for future in asyncio.as_completed(tasks, timeout=deadline):
+            try:
+                exchange, row, error = await future
+            except asyncio.TimeoutError:
+                break
+            pending.remove(exchange)
+            yield exchange, row, error is None
+        for exchange in pending:
+            EXCHANGE_TIMED_OUT.labels(exchange).inc()
+            yield exchange, None, False
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def get_all_funding(
+    symbol: str,
+    http: HttpClientManager,
+    snapshot: FundingSnapshot = None,
+    index: SymbolIndex = None,
+    deadline: float = FUNDING_DEADLINE,
+    timeout: float = FUNDING_EXCHANGE_TIMEOUT,
+):
+    """
+    Вывод ставок финансирования со всех бирж.
+    Если передан snapshot, свежие ставки берутся из памяти,
+    а по сети опрашиваются только биржи, которых в снимке нет.
+
+    Каждая биржа ограничена своим таймаутом, весь запрос — общим дедлайном.
+    Возвращает (ставки, биржи которые не ответили вовремя или упали с ошибкой).
+    """
+    funding_data = []
+    missing = []
+    async for exchange, row, ok in iter_all_funding(symbol, http, snapshot, index, deadline, timeout):
+        if not ok:
+            missing.append(exchange)
+        elif row:
+            funding_data.append(row)
+
+    return funding_data, missing
 
-    history = []
 
-    for item in resp_json.get("result", {}).get("list", []):
-        history.append({
-            "exchange": "BYBIT",
+def _history_window(days: int, until: int = None):
+    """
+    Интервал истории [start, end] (мс): последние `days` дней, только записи раньше until
+    """
+    now = int(time.time() * 1000)
+    end = now if until is None else min(now, until - 1)
+    return now - days * DAY_MS, end
+
+
+async def fetch_binance_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 7,
+    limit: int = 1000,
+    until: int = None,
+):
+    """
+    Получает историю ставок финансирования Binance за последние `days` дней.
+    Интервал режется на окна по `limit` часов, окна запрашиваются параллельно.
+    """
+    start, end = _history_window(days, until)
+    url = "https://fapi.binance.com/fapi/v1/fundingRate"
+
+    async def fetch_window(window_start, window_end):
+        params = {
+            "symbol": symbol,
+            "startTime": window_start,
+            "endTime": window_end,
+            "limit": limit
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content)
+        return (
+            [float(item.get("fundingRate", 0)) for item in items],
+            [int(item.get("fundingTime", 0)) for item in items],
+        )
+
+    return await paginate_time_windows("BINANCE", symbol, fetch_window, start, end, limit * HOUR_MS)
+
+
+async def fetch_bybit_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 100,
+    limit: int = 200,
+    until: int = None,
+):
+    start, end = _history_window(days, until)
+    url = "https://api.bybit.com/v5/market/funding/history"
+
+    async def fetch_window(window_start, window_end):
+        params = {
+            "category": "linear",
             "symbol": symbol,
-            "funding_rate": float(item["fundingRate"]),
-            "funding_time": int(item["fundingRateTimestamp"])
-        })
+            "startTime": window_start,
+            "endTime": window_end,
+            "limit": limit
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content).get("result", {}).get("list", [])
+        return (
+            [float(item["fundingRate"]) for item in items],
+            [int(item["fundingRateTimestamp"]) for item in items],
+        )
 
-    return history
+    return await paginate_time_windows("BYBIT", symbol, fetch_window, start, end, limit * HOUR_MS)
 
 
-async def fetch_kucoin_history(symbol: str, days: int):
+async def fetch_kucoin_history(symbol: str, http: HttpClientManager, days: int, limit: int = 100, until: int = None):
     """
-    История funding rate KuCoin (публичная история), за интервал времени [start, end] (unix seconds).
+    История funding rate KuCoin (публичная история), за интервал времени [start, end] (unix ms).
     """
-    end = int(time.time()) * 1000
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp()) * 1000
+    start, end = _history_window(days, until)
     url = "https://api-futures.kucoin.com/api/v1/contract/funding-rates"
-    if symbol == "BTCUSDT":
-        symbol = "XBTUSDTM"
-    elif symbol:
-        symbol = f"{symbol}M"
 
-    params = {
-        "symbol": f"{symbol}",
-        "from": start,
-        "to": end,
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    history = []
-    data_list = resp_json.get("data", [])
-    for item in data_list:
-        history.append({
-            "exchange": "KUCOIN",
+    async def fetch_window(window_start, window_end):
+        params = {
             "symbol": f"{symbol}",
-            "funding_rate": float(item.get("fundingRate", 0)),
-            "funding_time": int(item.get("timepoint", 0))
-        })
-    return history
+            "from": window_start,
+            "to": window_end,
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content).get("data", [])
+        return (
+            [float(item.get("fundingRate", 0)) for item in items],
+            [int(item.get("timepoint", 0)) for item in items],
+        )
+
+    return await paginate_time_windows("KUCOIN", symbol, fetch_window, start, end, limit * HOUR_MS)
 
 
-async def fetch_okx_history(instId: str, days: int = 7):
+async def fetch_okx_history(instId: str, http: HttpClientManager, days: int = 7, limit: int = 100, until: int = None):
     """
     История funding rate OKX за последние `days` дней.
     instId формат: e.g. "BTC-USDT-SWAP"
     """
-    end = int(datetime.utcnow().timestamp() * 1000)
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+    cutoff, _ = _history_window(days)
     url = "https://www.okx.com/api/v5/public/funding-rate-history"
-    if 'USDT' in instId:
-        instId = instId.replace('USDT', '-USDT-SWAP')
 
-    params = {
-        "instId": instId,
-        "limit": days * 4,
-        "before": None,
-        "after": None,
-        "startTime": start,
-        "endTime": end
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    history = []
+    async def fetch_page(after):
+        params = {
+            "instId": instId,
+            "limit": limit,
+        }
+        if after is not None:
+            params["after"] = after
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content).get("data", [])
+        rates = [float(item.get("fundingRate", 0)) for item in items]
+        times = [int(item.get("fundingTime", 0)) for item in items]
+        next_cursor = min(times) if len(times) >= limit else None
+        return rates, times, next_cursor
+
+    frame = await paginate_cursor("OKX", instId, fetch_page, cutoff, until)
+
+    keep = []
     last_time = 0
     eight_hours = 8 * 60 * 60 * 1000
 
-    for item in sorted(resp_json.get("data", []), key=lambda x: int(x["fundingTime"])):
-        t = int(item.get("fundingTime", 0))
-        if t - last_time >= eight_hours or not history:
-            history.append({
-                "exchange": "OKX",
-                "symbol": instId,
-                "funding_rate": float(item.get("fundingRate", 0)),
-                "funding_time": t
-            })
+    for i, t in enumerate(frame.time.tolist()):
+        if t - last_time >= eight_hours or not keep:
+            keep.append(i)
             last_time = t
 
-    return history
+    return frame.take(keep)
 
 
-async def fetch_mexc_history(symbol: str, days: int = 100):
+async def fetch_mexc_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 100,
+    page_size: int = 100,
+    until: int = None,
+):
     url = "https://contract.mexc.com/api/v1/contract/funding_rate/history"
-    cutoff = int((time.time() - days * 24 * 60 * 60) * 1000)
+    cutoff, _ = _history_window(days)
 
-    if 'USDT' in symbol:
-        symbol = symbol.replace('USDT', '_USDT')
-
-    params = {
-        "symbol": symbol,
-        "page_num": 1,
-        "page_size": 50,
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    all_data = []
-    filtered = [item for item in resp_json['data']['resultList'] if int(item["settleTime"]) >= cutoff]
-    all_data.extend(filtered)
-    history = []
-
-    for item in all_data:
-        history.append({
-            "exchange": "MEXC",
+    async def fetch_page(page):
+        params = {
             "symbol": symbol,
-            "funding_rate": float(item["fundingRate"]),
-            "funding_time": int(item["settleTime"])
-        })
-
-    return history
-
-
-async def fetch_bitget_history(symbol: str, days: int = 100):
+            "page_num": page,
+            "page_size": page_size,
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        data = loads(r.content)['data']
+        items = data['resultList']
+        return (
+            [float(item["fundingRate"]) for item in items],
+            [int(item["settleTime"]) for item in items],
+            data.get("totalPage"),
+        )
+
+    return await paginate_pages("MEXC", symbol, fetch_page, cutoff, until)
+
+
+async def fetch_bitget_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 100,
+    page_size: int = 100,
+    until: int = None,
+):
     url = "https://api.bitget.com/api/v2/mix/market/history-fund-rate"
-    cutoff = int((time.time() - days * 24 * 60 * 60) * 1000)
+    cutoff, _ = _history_window(days)
 
     if 'USDT' in symbol:
         product_type = 'USDT-FUTURES'
@@ -513,232 +939,211 @@ async def fetch_bitget_history(symbol: str, days: int = 100):
     elif 'USDC' in symbol:
         product_type = 'USDC-FUTURES'
 
-    params = {
-        "symbol": symbol,
-        "productType": product_type,
-        "pageSize": 100,
-        "pageNo": 1,
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    all_data = []
-    filtered = [item for item in resp_json['data'] if int(item["fundingTime"]) >= cutoff]
-    all_data.extend(filtered)
-    history = []
-
-    for item in all_data:
-        history.append({
-            "exchange": "BITGET",
+    async def fetch_page(page):
+        params = {
             "symbol": symbol,
-            "funding_rate": float(item["fundingRate"]),
-            "funding_time": int(item["fundingTime"])
-        })
+            "productType": product_type,
+            "pageSize": page_size,
+            "pageNo": page,
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content)['data']
+        rates = [float(item["fundingRate"]) for item in items]
+        times = [int(item["fundingTime"]) for item in items]
+        return rates, times, None if len(times) >= page_size else page
 
-    return history
+    return await paginate_pages("BITGET", symbol, fetch_page, cutoff, until)
 
 
-async def fetch_bitmart_history(symbol: str, days: int = 100):
+async def fetch_bitmart_history(symbol: str, http: HttpClientManager, days: int = 100, until: int = None):
+    """
+    BitMart не поддерживает пагинацию — отдает не больше 100 последних выплат
+    """
     url = "https://api-cloud-v2.bitmart.com/contract/public/funding-rate-history"
-    cutoff = int((time.time() - days * 24 * 60 * 60) * 1000)
+    cutoff, _ = _history_window(days)
 
     params = {
         "symbol": symbol,
+        "limit": 100,
     }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    all_data = []
-    filtered = [item for item in resp_json['data']['list'] if int(item["funding_time"]) >= cutoff]
-    all_data.extend(filtered)
-    history = []
-
-    for item in all_data:
-        history.append({
-            "exchange": "BITMART",
-            "symbol": symbol,
-            "funding_rate": float(item["funding_rate"]),
-            "funding_time": int(item["funding_time"])
-        })
-
-    return history
-
-
-async def fetch_weex_history(symbol: str, days: int = 100):
+    r = await http.get(url, params=params)
+    r.raise_for_status()
+    resp_json = loads(r.content)
+
+    items = resp_json['data']['list']
+    frame = FundingFrame.from_columns(
+        "BITMART",
+        symbol,
+        [float(item["funding_rate"]) for item in items],
+        [int(item["funding_time"]) for item in items],
+    )
+    return frame.filter(since=cutoff, until=until).sort()
+
+
+async def fetch_weex_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 100,
+    page_size: int = 100,
+    until: int = None,
+):
     url = "https://contract.mexc.com/api/v1/contract/funding_rate/history"
-    cutoff = int((time.time() - days * 24 * 60 * 60) * 1000)
-
-    if 'USDT' in symbol:
-        symbol = symbol.replace('USDT', '_USDT')
+    cutoff, _ = _history_window(days)
 
-    params = {
-        "symbol": symbol,
-        "page_num": 1,
-        "page_size": 50,
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    all_data = []
-    filtered = [item for item in resp_json['data']['resultList'] if int(item["settleTime"]) >= cutoff]
-    all_data.extend(filtered)
-    history = []
-
-    for item in all_data:
-        history.append({
-            "exchange": "WEEX",
+    async def fetch_page(page):
+        params = {
             "symbol": symbol,
-            "funding_rate": float(item["fundingRate"]),
-            "funding_time": int(item["settleTime"])
-        })
-
-    return history
-
-
-async def fetch_blofin_history(symbol: str, days: int = 7, limit: int = 100):
+            "page_num": page,
+            "page_size": page_size,
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        data = loads(r.content)['data']
+        items = data['resultList']
+        return (
+            [float(item["fundingRate"]) for item in items],
+            [int(item["settleTime"]) for item in items],
+            data.get("totalPage"),
+        )
+
+    return await paginate_pages("WEEX", symbol, fetch_page, cutoff, until)
+
+
+async def fetch_blofin_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 7,
+    limit: int = 100,
+    until: int = None,
+):
     """
     История funding rate Blofin за последние `days` дней.
-    instId формат: e.g. "BTC-USDT-SWAP"
+    instId формат: e.g. "BTC-USDT"
     """
-    end = int(datetime.utcnow().timestamp() * 1000)
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+    cutoff, _ = _history_window(days)
     url = "https://openapi.blofin.com/api/v1/market/funding-rate-history"
 
-    if 'USDT' in symbol:
-        symbol = symbol.replace('USDT', '-USDT')
-
-    params = {
-        "instId": symbol,
-        "limit": limit,
-        "before": start,
-        "after": end,
-        "startTime": None,
-        "endTime": None
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    history = []
-    for item in resp_json.get("data", []):
-        history.append({
-            "exchange": "BLOFIN",
-            "symbol": symbol,
-            "funding_rate": float(item.get("fundingRate", 0)),
-            "funding_time": int(item.get("fundingTime", 0))
-        })
-    return history
-
-
-async def fetch_coinex_history(symbol: str, days: int = 7):
+    async def fetch_page(after):
+        params = {
+            "instId": symbol,
+            "limit": limit,
+        }
+        if after is not None:
+            params["after"] = after
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content).get("data", [])
+        rates = [float(item.get("fundingRate", 0)) for item in items]
+        times = [int(item.get("fundingTime", 0)) for item in items]
+        next_cursor = min(times) if len(times) >= limit else None
+        return rates, times, next_cursor
+
+    return await paginate_cursor("BLOFIN", symbol, fetch_page, cutoff, until)
+
+
+async def fetch_coinex_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 7,
+    limit: int = 100,
+    until: int = None,
+):
     """
     История funding rate Coinex за последние `days` дней.
     """
-    end = int(datetime.utcnow().timestamp() * 1000)
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+    start, end = _history_window(days, until)
     url = "https://api.coinex.com/v2/futures/funding-rate-history"
 
-    params = {
-        "market": symbol,
-        "limit": 30,
-        "start_time": start,
-        "end_time": end
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    history = []
-    for item in resp_json.get("data", []):
-        history.append({
-            "exchange": "COINEX",
-            "symbol": symbol,
-            "funding_rate": float(item.get("actual_funding_rate", 0)),
-            "funding_time": int(item.get("funding_time", 0))
-        })
-
-    return history
-
-
-async def fetch_bingx_history(symbol: str, days: int = 7):
+    async def fetch_page(page):
+        params = {
+            "market": symbol,
+            "limit": limit,
+            "page": page,
+            "start_time": start,
+            "end_time": end
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        resp_json = loads(r.content)
+        items = resp_json.get("data", [])
+        has_next = resp_json.get("pagination", {}).get("has_next")
+        return (
+            [float(item.get("actual_funding_rate", 0)) for item in items],
+            [int(item.get("funding_time", 0)) for item in items],
+            None if has_next else page,
+        )
+
+    return await paginate_pages("COINEX", symbol, fetch_page, start)
+
+
+async def fetch_bingx_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 7,
+    limit: int = 1000,
+    until: int = None,
+):
     """
     История funding rate Bingx за последние `days` дней.
     """
-    end = int(datetime.utcnow().timestamp() * 1000)
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
+    start, end = _history_window(days, until)
     url = "https://open-api.bingx.com/openApi/swap/v2/quote/fundingRate"
 
-    if 'USDT' in symbol:
-        symbol = symbol.replace('USDT', '-USDT')
-
-    params = {
-        "symbol": symbol,
-        "startTime": start,
-        "endTime": end,
-        'timestamp': int(time.time()) * 1000,
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    history = []
-    for item in resp_json.get("data", []):
-        history.append({
-            "exchange": "BINGX",
+    async def fetch_window(window_start, window_end):
+        params = {
             "symbol": symbol,
-            "funding_rate": float(item.get("fundingRate", 0)),
-            "funding_time": int(item.get("fundingTime", 0))
-        })
-
-    return history
-
-
-async def fetch_htx_history(symbol: str, days: int = 100):
+            "startTime": window_start,
+            "endTime": window_end,
+            "limit": limit,
+            'timestamp': int(time.time()) * 1000,
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        items = loads(r.content).get("data", [])
+        return (
+            [float(item.get("fundingRate", 0)) for item in items],
+            [int(item.get("fundingTime", 0)) for item in items],
+        )
+
+    return await paginate_time_windows("BINGX", symbol, fetch_window, start, end, limit * HOUR_MS)
+
+
+async def fetch_htx_history(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 100,
+    page_size: int = 50,
+    until: int = None,
+):
     url = "https://api.hbdm.com/linear-swap-api/v1/swap_historical_funding_rate"
-    cutoff = int((time.time() - days * 24 * 60 * 60) * 1000)
-
-    if 'USDT' in symbol:
-        symbol = symbol.replace('USDT', '-USDT')
+    cutoff, _ = _history_window(days)
 
-    params = {
-        "contract_code": symbol,
-        "page_index": 1,
-        "page_size": 50,
-    }
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, params=params)
-        resp_json = r.json()
-
-    all_data = []
-    filtered = [item for item in resp_json['data']['data'] if int(item["funding_time"]) >= cutoff]
-    all_data.extend(filtered)
-
-    history = []
-
-    for item in all_data:
-        history.append({
-            "exchange": "HTX",
-            "symbol": symbol,
-            "funding_rate": float(item["funding_rate"]),
-            "funding_time": int(item["funding_time"])
-        })
+    async def fetch_page(page):
+        params = {
+            "contract_code": symbol,
+            "page_index": page,
+            "page_size": page_size,
+        }
+        r = await http.get(url, params=params)
+        r.raise_for_status()
+        data = loads(r.content)['data']
+        items = data['data']
+        return (
+            [float(item["funding_rate"]) for item in items],
+            [int(item["funding_time"]) for item in items],
+            data.get("total_page"),
+        )
 
-    return history
+    return await paginate_pages("HTX", symbol, fetch_page, cutoff, until)
 
 
-async def fetch_Gate_history(symbol: str, days: int = 7, limit: int = 100):
+async def fetch_Gate_history(symbol: str, http: HttpClientManager, days: int = 7, limit: int = 100, until: int = None):
     """
     История funding rate Gate за последние `days` дней.
     instId формат: e.g. ""
     """
-    end = int(datetime.utcnow().timestamp() * 1000)
-    start = int((datetime.utcnow() - timedelta(days=days)).timestamp() * 1000)
-    if 'USDT' in symbol:
-        symbol = symbol.replace('USDT', '_USDT')
-
+    start, end = _history_window(days, until)
     url = f"https://api.gateio.ws/api/v4/futures/{symbol}/funding_rate?contract={symbol}&from={start}&to={end}"
 
     headers = {
@@ -747,41 +1152,95 @@ async def fetch_Gate_history(symbol: str, days: int = 7, limit: int = 100):
         'Content-Type': 'application/json'
     }
 
-    async with httpx.AsyncClient(verify=False) as client:
-        r = await client.get(url, headers=headers)
-        resp_json = r.json()
+    r = await http.get(url, headers=headers)
+    r.raise_for_status()
+    items = loads(r.content).get("data", [])
+    return FundingFrame.from_columns(
+        "GATE",
+        symbol,
+        [float(item.get("r", 0)) for item in items],
+        [int(item.get("t", 0)) for item in items],
+    )
+
+
+HISTORY_FETCHERS = {
+    # "GATE": fetch_Gate_history, {'label': 'MISSING_REQUIRED_HEADER', 'message': 'Missing required header: KEY'}
+    "BINANCE": fetch_binance_history,
+    "BYBIT": fetch_bybit_history,
+    "OKX": fetch_okx_history,
+    "KUCOIN": fetch_kucoin_history,
+    "HTX": fetch_htx_history,
+    "BLOFIN": fetch_blofin_history,
+    "MEXC": fetch_mexc_history,
+    # "WEEX": fetch_weex_history, ходит в API MEXC и дублирует его историю
+    "COINEX": fetch_coinex_history,
+    "BINGX": fetch_bingx_history,
+    "BITMART": fetch_bitmart_history,
+    "BITGET": fetch_bitget_history,
+}
+
+
+async def fetch_history(
+    exchange: str,
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 7,
+    index: SymbolIndex = None,
+    until: int = None,
+):
+    """
+    История одной биржи за последние `days` дней (только записи раньше until, если задан);
+    одинаковые одновременные запросы объединяются.
+    Если биржа отключена автоматом, вызывается ExchangeUnavailable.
+    """
+    native = native_symbol(exchange, symbol, index)
+    if native is None:
+        return FundingFrame.empty()
+    if not history_health.allow(exchange):
+        raise ExchangeUnavailable(exchange)
+    func = HISTORY_FETCHERS[exchange]
+    return await history_flights.do(
+        ("history", exchange, native, days, until),
+        lambda: history_health.call(exchange, lambda: func(native, http, days, until=until)),
+    )
+
+
+async def get_history_all(
+    symbol: str,
+    http: HttpClientManager,
+    days: int = 7,
+    exchanges: list = None,
+    index: SymbolIndex = None,
+):
+    """
+    История ставок по символу со всех бирж (или только с `exchanges`) одним FundingFrame
+    """
+    if exchanges is None:
+        exchanges = list(HISTORY_FETCHERS)
+    tasks = [
+        fetch_history(exchange, symbol, http, days, index)
+        for exchange in exchanges
+        if exchange in HISTORY_FETCHERS and history_health.allow(exchange)
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    return FundingFrame.concat([res for res in results if isinstance(res, FundingFrame)])
 
-    history = []
-    for item in resp_json.get("data", []):
-        history.append({
-            "exchange": "GATE",
-            "symbol": symbol,
-            "funding_rate": float(item.get("r", 0)),
-            "funding_time": int(item.get("t", 0))
-        })
-    return history
 
+def live_probes(http: HttpClientManager, symbol: str = "BTCUSDT") -> dict:
+    """
+    Пробные запросы текущей ставки для фоновой проверки отключенных бирж
+    """
+    return {
+        exchange: (lambda func=func, native=native_symbol(exchange, symbol): func(native, http))
+        for exchange, func in LIVE_FETCHERS.items()
+    }
 
-async def get_history_all(symbol: str, days: int = 7):
 
-    tasks = [
-        # fetch_Gate_history(symbol, days), {'label': 'MISSING_REQUIRED_HEADER', 'message': 'Missing required header: KEY'}
-        fetch_binance_history(symbol, days),
-        fetch_bybit_history(symbol, days),
-        fetch_okx_history(symbol, days),
-        fetch_kucoin_history(symbol, days),
-        fetch_htx_history(symbol, days),
-        fetch_blofin_history(symbol, days),
-        fetch_mexc_history(symbol, days),
-        fetch_weex_history(symbol, days),
-        fetch_coinex_history(symbol, days),
-        fetch_bingx_history(symbol, days),
-        fetch_bitmart_history(symbol, days),
-        fetch_bitget_history(symbol, days)
-    ]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    history = []
-    for res in results:
-        if isinstance(res, list):
-            history.extend(res)
-    return history
+def history_probes(http: HttpClientManager, symbol: str = "BTCUSDT") -> dict:
+    """
+    Пробные запросы истории за сутки для фоновой проверки отключенных бирж
+    """
+    return {
+        exchange: (lambda func=func, native=native_symbol(exchange, symbol): func(native, http, 1))
+        for exchange, func in HISTORY_FETCHERS.items()
+    }
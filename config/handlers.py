@@ -1,16 +1,35 @@
-import io
-import tempfile
-from datetime import datetime
+import asyncio
+import time
 
-import numpy as np
-import matplotlib.pyplot as plt
-from aiogram.types import FSInputFile
+from aiogram.types import BufferedInputFile
 from aiogram import types
 from aiogram import Dispatcher, types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.filters import Command
 
-from funding_fetcher import get_all_funding, get_history_all
-from utils import calc_max_spread, normalize_funding_data
+from chart_cache import ChartCache
+from charts import ChartRenderer, RendererBusy, render_spread_chart, render_top_tokens_chart
+from constants import ADMIN_IDS, FUNDING_EDIT_INTERVAL, FUNDING_STREAMING, SUBSCRIPTION_MAX_PER_CHAT
+from funding_fetcher import LIVE_FETCHERS, get_all_funding, history_health, iter_all_funding, live_health
+from history_store import HistoryStore
+from http_client import HttpClientManager
+from scheduler import CHART, LOOKUP, MULTI_CHART, SchedulerMiddleware
+from snapshot import FundingSnapshot
+from subscriptions import ANY_SYMBOL, SubscriptionStore, parse_condition
+from symbol_index import SymbolIndex
+from utils import (
+    RATE_SCALE,
+    SpreadTracker,
+    calc_max_spread,
+    calc_top_spreads,
+    canonical_symbol,
+    normalize_funding_data,
+)
+
+TOP_SPREADS_DEFAULT = 10
+TOP_SPREADS_MAX = 50
+
+BUSY_TEXT = "⏳ Сейчас строится слишком много графиков, попробуйте через минуту"
 
 
 async def start_cmd(message: types.Message):
@@ -34,6 +53,14 @@ async def start_cmd(message: types.Message):
         "   — Для заданного списка токенов строит кумулятивные графики funding rate (каждый токен) и сортирует их по итоговой кумулятивной разнице.\n"
         "   — Возвращает PNG с графиком и текстовый ТОП (символы + итоговые значения).\n"
         "   Пример: /top_tokens_chart BYBIT 3 BTCUSDT,ETHUSDT,SOLUSDT\n\n"
+        "4) /top_spreads [N]\n"
+        "   — ТОП-N символов (по умолчанию 10) с максимальным спредом ставок между биржами по всему рынку.\n"
+        "   Пример: /top_spreads 20\n\n"
+        "5) /subscribe <symbol|*> <rate|spread><'>'|'<'><value>\n"
+        "   — Уведомление, когда ставка (на любой бирже) или спред между биржами\n"
+        "     пересекает порог (в %, как в /funding).\n"
+        "   — /subscriptions — список подписок, /unsubscribe <номер|all> — удалить.\n"
+        "   Примеры: /subscribe BTCUSDT spread>0.05, /subscribe * rate<-0.1\n\n"
         "ВАЖНЫЕ МЕЛОЧИ / подсказки:\n"
         "- Указывай символы в привычном виде, например: BTCUSDT, ETHUSDT, SOLUSDT.\n"
         "- Для некоторых бирж (BYBIT, BINANCE и др.) бот автоматически преобразует формат символа (например, в BTC-USDT или BTC-USDT-SWAP) — обычно достаточно передать 'BTCUSDT'.\n"
@@ -43,7 +70,89 @@ async def start_cmd(message: types.Message):
     )
 
 
-async def funding_cmd(message: types.Message):
+def funding_text(symbol, data, spread, pair, missing, in_progress=False):
+    """
+    Текст ответа /funding по уже нормализованным ставкам
+    """
+    text = f"📊 Ставки финансирования по {symbol}:\n\n"
+    for row in data:
+        text += f"{row['exchange']}: {(row['funding_rate'] * 100):.2f}% (время {row['next_funding_time']})\n"
+
+    text += f"\n🔥 Максимальный спред: {(spread * 100):.3f}% ({pair[0]} ↔ {pair[1]})"
+    if missing:
+        text += f"\n\n⚠️ Нет ответа от: {', '.join(missing)}"
+    if in_progress:
+        text += "\n\n⏳ Ждем ответа остальных бирж..."
+    return text
+
+
+def no_funding_text(missing):
+    """
+    Ответ /funding, когда ни одна биржа не вернула ставку
+    """
+    text = "❌ Не удалось получить данные"
+    if missing:
+        text += f"\n\n⚠️ Нет ответа от: {', '.join(missing)}"
+    return text
+
+
+async def edit_text(message: types.Message, text: str, wait: bool = False):
+    """
+    Редактирование сообщения с учетом лимитов Telegram:
+    промежуточные правки при флуд-контроле пропускаются, финальная дожидается
+    """
+    try:
+        await message.edit_text(text)
+    except TelegramRetryAfter as e:
+        if not wait:
+            return
+        await asyncio.sleep(e.retry_after)
+        await message.edit_text(text)
+
+
+async def stream_funding(
+    status: types.Message,
+    symbol: str,
+    http: HttpClientManager,
+    snapshot: FundingSnapshot,
+    index: SymbolIndex = None,
+):
+    """
+    Постепенный ответ /funding: сообщение status редактируется
+    по мере ответов бирж, не чаще FUNDING_EDIT_INTERVAL
+    """
+    data = []
+    missing = []
+    tracker = SpreadTracker()
+    last_edit = 0.0
+    last_text = None
+
+    async for exchange, row, ok in iter_all_funding(symbol, http, snapshot, index):
+        if not ok:
+            missing.append(exchange)
+            continue
+        if not row:
+            continue
+        row = normalize_funding_data([row])[0]
+        data.append(row)
+        tracker.add(row)
+
+        if time.monotonic() - last_edit >= FUNDING_EDIT_INTERVAL:
+            text = funding_text(symbol, data, *tracker.result(), missing, in_progress=True)
+            if text != last_text:
+                await edit_text(status, text)
+                last_text = text
+            last_edit = time.monotonic()
+
+    if not data:
+        return await edit_text(status, no_funding_text(missing), wait=True)
+
+    await edit_text(status, funding_text(symbol, data, *tracker.result(), missing), wait=True)
+
+
+async def funding_cmd(
+    message: types.Message, http: HttpClientManager, snapshot: FundingSnapshot, index: SymbolIndex
+):
     """
     Хэндлер команды /funding
     """
@@ -51,26 +160,76 @@ async def funding_cmd(message: types.Message):
     if len(args) < 2 or len(args) > 2:
         return await message.answer("⚠️ Укажи символ, например: /funding BTCUSDT")
 
-    await message.answer('Идет обработка запроса, это займет некоторое время...')
-
     symbol = args[1].upper()
-    data = await get_all_funding(symbol)
+    if not index.is_known(symbol, LIVE_FETCHERS):
+        return await message.answer(f"❌ Символ {symbol} не торгуется ни на одной из бирж")
+
+    status = await message.answer('Идет обработка запроса, это займет некоторое время...')
+
+    if FUNDING_STREAMING:
+        return await stream_funding(status, symbol, http, snapshot, index)
+
+    data, missing = await get_all_funding(symbol, http, snapshot, index)
     data = normalize_funding_data(data)
 
     if not data:
-        return await message.answer("❌ Не удалось получить данные")
-
-    text = f"📊 Ставки финансирования по {symbol}:\n\n"
-    for row in data:
-        text += f"{row['exchange']}: {(row['funding_rate'] * 100):.2f}% (время {row['next_funding_time']})\n"
+        return await message.answer(no_funding_text(missing))
 
     spread, pair = calc_max_spread(data)
-    text += f"\n🔥 Максимальный спред: {(spread * 100):.3f}% ({pair[0]} ↔ {pair[1]})"
+    await message.answer(funding_text(symbol, data, spread, pair, missing))
+
+
+async def send_chart(message: types.Message, chart_cache: ChartCache, key, render):
+    """
+    Отправка графика: по file_id, если он уже загружался в Telegram,
+    иначе из кэша PNG или после отрисовки render()
+    """
+    file_id = chart_cache.get_file_id(key)
+    if file_id is not None:
+        try:
+            return await message.answer_photo(file_id)
+        except TelegramBadRequest:
+            chart_cache.drop_file_id(key)
+
+    png = chart_cache.get_png(key)
+    if png is None:
+        png = await render()
+        chart_cache.put_png(key, png)
+
+    sent = await message.answer_photo(BufferedInputFile(png, filename="chart.png"))
+    chart_cache.put_file_id(key, sent.photo[-1].file_id)
+    return sent
+
+
+async def top_spreads_cmd(message: types.Message, snapshot: FundingSnapshot):
+    """
+    /top_spreads [N]
+    Пример: /top_spreads 20
+    """
+    args = message.text.split()
+    if len(args) > 2 or (len(args) == 2 and not args[1].isdigit()):
+        return await message.answer("⚠️ Пример: /top_spreads 20")
+
+    n = min(int(args[1]) if len(args) == 2 else TOP_SPREADS_DEFAULT, TOP_SPREADS_MAX)
+    top = calc_top_spreads(*snapshot.matrix(), n)
+    if not top:
+        return await message.answer("❌ Снимок рынка еще не загружен, попробуйте позже")
+
+    text = f"🔥 ТОП-{len(top)} спредов ставок финансирования:\n\n"
+    for i, (symbol, spread, high, low) in enumerate(top, 1):
+        text += f"{i}. {symbol}: {(spread * RATE_SCALE):.3f}% ({high} ↔ {low})\n"
 
     await message.answer(text)
 
 
-async def funding_spread_chart_cmd(message: types.Message):
+async def funding_spread_chart_cmd(
+    message: types.Message,
+    http: HttpClientManager,
+    store: HistoryStore,
+    renderer: ChartRenderer,
+    chart_cache: ChartCache,
+    index: SymbolIndex,
+):
     """
     /funding_spread_chart <exchange> <days> <symbol>
     Пример: /funding_spread_chart OKX 7 BTCUSDT
@@ -79,52 +238,43 @@ async def funding_spread_chart_cmd(message: types.Message):
     if len(args) < 4 or len(args) > 4:
         return await message.answer("⚠️ Пример: /funding_spread_chart OKX 7 BTCUSDT")
     
-    await message.answer('Идет обработка запроса, это займет некоторое время...')
-
     exchange = args[1].upper()
     days = int(args[2])
-    symbol = args[3].upper()
-
-    history = await get_history_all(symbol, days)
-    if not history:
-        return await message.answer("❌ История не найдена")
-
-    rates = [h for h in history if h["exchange"] == exchange]
-    rates.sort(key=lambda x: x["funding_time"])
-
-    times = [datetime.utcfromtimestamp(h["funding_time"]/1000) for h in rates]
-    funding_rates = [(h["funding_rate"] * 100) * 100 for h in rates]  # в процентах
-    cum_rates = np.cumsum(funding_rates)
+    symbol = canonical_symbol(args[3])
+    if index.native(exchange, symbol) is None:
+        return await message.answer(f"❌ Символ {symbol} не торгуется на {exchange}")
 
-    total = round(np.sum(funding_rates), 2)
-    mean = round(np.mean(funding_rates), 2)
-    max_rate = round(np.max(funding_rates), 2)
-    min_rate = round(np.min(funding_rates), 2)
-
-    plt.figure(figsize=(10, 5))
-    plt.plot(times, cum_rates, label=f"Cumulative Funding Rate {exchange}")
-    plt.title(
-        f"Cumulative Funding Rate {symbol} ({exchange})\n"
-        f"Total: {total}% | Mean(average): {mean}% | Max: {max_rate}% | Min: {min_rate}%"
-    )
-    plt.xlabel("Time")
-    plt.ylabel("Cumulative %")
-    plt.legend()
-    plt.grid(True)
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    buf.seek(0)
-    plt.close()
-
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(buf.getbuffer())
-        tmp_path = tmp.name
-
-    await message.answer_photo(FSInputFile(tmp_path))
+    await message.answer('Идет обработка запроса, это займет некоторое время...')
 
+    history = await store.get_history(symbol, http, days, exchanges=[exchange])
+    rates = history.filter(exchange=exchange).sort()
+    if not len(rates):
+        return await message.answer("❌ История не найдена")
 
-async def top_tokens_chart_cmd(message: types.Message):
+    times = rates.datetimes()
+    cum_rates = rates.cumsum(RATE_SCALE)
+    total, mean, max_rate, min_rate = (round(v, 2) for v in rates.stats(RATE_SCALE))
+
+    key = ("funding_spread_chart", exchange, (symbol,), days, rates.last_time)
+    try:
+        await send_chart(
+            message, chart_cache, key,
+            lambda: renderer.render(
+                render_spread_chart, symbol, exchange, times, cum_rates, total, mean, max_rate, min_rate
+            ),
+        )
+    except RendererBusy:
+        return await message.answer(BUSY_TEXT)
+
+
+async def top_tokens_chart_cmd(
+    message: types.Message,
+    http: HttpClientManager,
+    store: HistoryStore,
+    renderer: ChartRenderer,
+    chart_cache: ChartCache,
+    index: SymbolIndex,
+):
     """
     /top_tokens_chart  <exchange> <days> <tokens>
     Пример:
@@ -141,72 +291,113 @@ async def top_tokens_chart_cmd(message: types.Message):
     exchange = args[1].upper()
     days = int(args[2])
     raw_tokens = args[3].replace(', ', ',')
-    tokens = [t.strip().upper() for t in raw_tokens.split(",") if t.strip()]
+    tokens = [canonical_symbol(t.strip()) for t in raw_tokens.split(",") if t.strip()]
 
     if not tokens:
         return await message.answer("❌ Укажите хотя бы один токен")
 
+    tokens = [t for t in tokens if index.native(exchange, t) is not None]
+    if not tokens:
+        return await message.answer("❌ Нет данных по заданным токенам")
+
     results = []  # (symbol, times[], cumsum[])
+    last_time = 0
 
-    # Обходим все токены
+    # История всех токенов только с нужной биржи, параллельно
+    histories = await store.get_history_many(tokens, http, days, exchanges=[exchange])
     for symbol in tokens:
-        history = await get_history_all(symbol, days)
-        if not history:
-            continue
-
         # фильтруем по бирже
-        rates = [h for h in history if h["exchange"].upper() == exchange.upper()]
-        rates.sort(key=lambda x: x["funding_time"])
-        if not rates:
+        rates = histories[symbol].filter(exchange=exchange).sort()
+        if not len(rates):
             continue
 
-        times = [datetime.utcfromtimestamp(h["funding_time"]/1000) for h in rates]
-        funding_rates = [(h["funding_rate"] * 100) * 100 for h in rates]
-        cum = np.cumsum(funding_rates)
+        cum = rates.cumsum(RATE_SCALE)
+        total, mean, max_rate, min_rate = (round(v, 2) for v in rates.stats(RATE_SCALE))
 
-        total = round(cum[-1], 2)
-        mean = round(np.mean(funding_rates), 2)
-        max_rate = round(np.max(funding_rates), 2)
-        min_rate = round(np.min(funding_rates), 2)
-
-        results.append((symbol, total, mean, max_rate, min_rate, times, cum))
+        results.append((symbol, total, mean, max_rate, min_rate, rates.datetimes(), cum))
+        last_time = max(last_time, rates.last_time)
 
     if not results:
         return await message.answer("❌ Нет данных по заданным токенам")
 
     results.sort(key=lambda x: abs(x[1]), reverse=True)
 
-    plt.figure(figsize=(12, 6))
-    for symbol, total, mean, max_rate, min_rate, times, cum in results:
-        label = (
-            f"{symbol} | Total:{total}% | Mean:{mean}% "
-            f"| Max:{max_rate}% | Min:{min_rate}%"
+    key = ("top_tokens_chart", exchange, tuple(tokens), days, last_time)
+    try:
+        await send_chart(
+            message, chart_cache, key,
+            lambda: renderer.render(render_top_tokens_chart, exchange, days, results),
         )
-        plt.plot(times, cum, label=label)
+    except RendererBusy:
+        return await message.answer(BUSY_TEXT)
 
-    plt.title(f"TOP cumulative funding ({exchange}) - {days}d")
-    plt.xlabel("Time")
-    plt.ylabel("Cumulative %")
-    plt.legend()
-    plt.grid(True)
 
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    buf.seek(0)
-    plt.close()
+async def subscribe_cmd(message: types.Message, subscriptions: SubscriptionStore, index: SymbolIndex):
+    """
+    /subscribe <symbol|*> <rate|spread><'>'|'<'><value>
+    Пример: /subscribe BTCUSDT spread>0.05
+    """
+    args = message.text.split(maxsplit=2)
+    condition = parse_condition(args[2]) if len(args) == 3 else None
+    if condition is None:
+        return await message.answer("⚠️ Пример: /subscribe BTCUSDT spread>0.05 или /subscribe * rate<-0.1")
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        tmp.write(buf.getbuffer())
-        tmp_path = tmp.name
+    symbol = args[1] if args[1] == ANY_SYMBOL else canonical_symbol(args[1])
+    if symbol != ANY_SYMBOL and not index.is_known(symbol, LIVE_FETCHERS):
+        return await message.answer(f"❌ Символ {symbol} не торгуется ни на одной из бирж")
+    if len(subscriptions.list(message.chat.id)) >= SUBSCRIPTION_MAX_PER_CHAT:
+        return await message.answer(f"❌ Не больше {SUBSCRIPTION_MAX_PER_CHAT} подписок, удалите лишние: /unsubscribe")
+
+    rule = subscriptions.add(message.chat.id, symbol, *condition)
+    await message.answer(f"✅ Подписка {rule} добавлена")
+
+
+async def subscriptions_cmd(message: types.Message, subscriptions: SubscriptionStore):
+    """
+    /subscriptions — подписки чата
+    """
+    rules = subscriptions.list(message.chat.id)
+    if not rules:
+        return await message.answer("Подписок нет. Пример: /subscribe BTCUSDT spread>0.05")
+    await message.answer("🔔 Подписки:\n\n" + "\n".join(str(rule) for rule in rules))
+
+
+async def unsubscribe_cmd(message: types.Message, subscriptions: SubscriptionStore):
+    """
+    /unsubscribe <номер|all>
+    """
+    args = message.text.split()
+    if len(args) != 2 or not (args[1].lstrip("#").isdigit() or args[1].lower() == "all"):
+        return await message.answer("⚠️ Пример: /unsubscribe 12 или /unsubscribe all")
+
+    rule_id = None if args[1].lower() == "all" else int(args[1].lstrip("#"))
+    if not subscriptions.remove(message.chat.id, rule_id):
+        return await message.answer("❌ Подписка не найдена")
+    await message.answer("✅ Подписки удалены" if rule_id is None else f"✅ Подписка #{rule_id} удалена")
+
+
+async def health_cmd(message: types.Message):
+    """
+    /health — состояние бирж (только для администраторов)
+    """
+    if message.from_user is None or message.from_user.id not in ADMIN_IDS:
+        return
 
-    await message.answer_photo(FSInputFile(tmp_path))
+    await message.answer(f"{live_health.report()}\n\n{history_health.report()}")
 
 
 def register_handlers(dp: Dispatcher):
     """
-    Регистрация хэндлеров к командам
+    Регистрация хэндлеров к командам.
+    Флаг job — класс команды в планировщике (scheduler)
     """
+    dp.message.middleware(SchedulerMiddleware())
     dp.message.register(start_cmd, Command(commands=["start"]))
-    dp.message.register(funding_cmd, Command(commands=["funding"]))
-    dp.message.register(top_tokens_chart_cmd, Command(commands=["top_tokens_chart"]))
-    dp.message.register(funding_spread_chart_cmd, Command(commands=["funding_spread_chart"]))
+    dp.message.register(funding_cmd, Command(commands=["funding"]), flags={"job": LOOKUP})
+    dp.message.register(top_spreads_cmd, Command(commands=["top_spreads"]), flags={"job": LOOKUP})
+    dp.message.register(top_tokens_chart_cmd, Command(commands=["top_tokens_chart"]), flags={"job": MULTI_CHART})
+    dp.message.register(funding_spread_chart_cmd, Command(commands=["funding_spread_chart"]), flags={"job": CHART})
+    dp.message.register(subscribe_cmd, Command(commands=["subscribe"]), flags={"job": LOOKUP})
+    dp.message.register(subscriptions_cmd, Command(commands=["subscriptions"]), flags={"job": LOOKUP})
+    dp.message.register(unsubscribe_cmd, Command(commands=["unsubscribe"]), flags={"job": LOOKUP})
+    dp.message.register(health_cmd, Command(commands=["health"]))
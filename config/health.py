@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from constants import (
+    HEALTH_FAILURE_THRESHOLD,
+    HEALTH_MIN_SUCCESS_RATE,
+    HEALTH_OPEN_MAX,
+    HEALTH_OPEN_TIMEOUT,
+    HEALTH_PROBE_INTERVAL,
+    HEALTH_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ExchangeUnavailable(Exception):
+    """
+    Биржа временно отключена автоматом (circuit breaker)
+    """
+
+
+class ExchangeHealth:
+    """
+    Состояние одной биржи: успешность последних `window` запросов,
+    скользящее среднее задержки и число ошибок подряд
+    """
+
+    def __init__(self, window: int = HEALTH_WINDOW, alpha: float = 0.2):
+        self.results = deque(maxlen=window)
+        self.alpha = alpha
+        self.latency = None
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_timeout = HEALTH_OPEN_TIMEOUT
+
+    @property
+    def success_rate(self) -> float:
+        return sum(self.results) / len(self.results) if self.results else 1.0
+
+    def _latency(self, seconds: float):
+        self.latency = seconds if self.latency is None else self.alpha * seconds + (1 - self.alpha) * self.latency
+
+    def record_success(self, seconds: float):
+        self.results.append(True)
+        self._latency(seconds)
+        self.consecutive_failures = 0
+
+    def record_failure(self, seconds: float, error: Exception):
+        self.results.append(False)
+        self._latency(seconds)
+        self.consecutive_failures += 1
+        self.last_error = repr(error)
+
+
+class HealthRegistry:
+    """
+    Здоровье бирж и автоматы отключения (circuit breaker).
+
+    Биржа отключается (open), если подряд упало `failure_threshold` запросов
+    или успешность в окне ниже `min_success_rate`. Отключенную биржу не
+    опрашивают: после `open_timeout` фоновая проверка (half-open) делает
+    пробный запрос. Успех включает биржу обратно, ошибка отключает ее снова
+    на вдвое больший срок (не больше open_max).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = HEALTH_FAILURE_THRESHOLD,
+        min_success_rate: float = HEALTH_MIN_SUCCESS_RATE,
+        open_timeout: float = HEALTH_OPEN_TIMEOUT,
+        open_max: float = HEALTH_OPEN_MAX,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_success_rate = min_success_rate
+        self.open_timeout = open_timeout
+        self.open_max = open_max
+        self._exchanges = {}
+        self._task = None
+
+    def get(self, exchange: str) -> ExchangeHealth:
+        health = self._exchanges.get(exchange)
+        if health is None:
+            health = ExchangeHealth()
+            health.open_timeout = self.open_timeout
+            self._exchanges[exchange] = health
+        return health
+
+    def items(self):
+        return sorted(self._exchanges.items())
+
+    def allow(self, exchange: str) -> bool:
+        """
+        Можно ли сейчас опрашивать биржу
+        """
+        health = self._exchanges.get(exchange)
+        return health is None or health.state == CLOSED
+
+    def _open(self, exchange: str, health: ExchangeHealth):
+        if health.state == HALF_OPEN:
+            health.open_timeout = min(health.open_timeout * 2, self.open_max)
+        health.state = OPEN
+        health.opened_at = time.monotonic()
+        logger.warning(
+            "%s: биржа %s отключена на %.0f с (%s)", self.name, exchange, health.open_timeout, health.last_error
+        )
+
+    def _close(self, exchange: str, health: ExchangeHealth):
+        if health.state != CLOSED:
+            logger.info("%s: биржа %s снова доступна", self.name, exchange)
+        health.state = CLOSED
+        health.open_timeout = self.open_timeout
+
+    async def call(self, exchange: str, func, timeout: float = None):
+        """
+        Выполнение запроса func() к бирже с учетом результата в ее здоровье
+        """
+        health = self.get(exchange)
+        started = time.monotonic()
+        try:
+            if timeout is None:
+                result = await func()
+            else:
+                result = await asyncio.wait_for(func(), timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            health.record_failure(time.monotonic() - started, e)
+            if health.state == HALF_OPEN or (
+                health.state == CLOSED
+                and (
+                    health.consecutive_failures >= self.failure_threshold
+                    or (
+                        len(health.results) == health.results.maxlen
+                        and health.success_rate < self.min_success_rate
+                    )
+                )
+            ):
+                self._open(exchange, health)
+            raise
+        health.record_success(time.monotonic() - started)
+        self._close(exchange, health)
+        return result
+
+    async def probe(self, exchange: str, func):
+        """
+        Пробный запрос к отключенной бирже
+        """
+        health = self.get(exchange)
+        health.state = HALF_OPEN
+        try:
+            await self.call(exchange, func)
+        except Exception:
+            pass
+
+    def start(self, probes: dict, interval: float = HEALTH_PROBE_INTERVAL):
+        """
+        Фоновые проверки отключенных бирж. probes — {биржа: функция пробного запроса}.
+        """
+        self._task = asyncio.create_task(self._run(probes, interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, probes: dict, interval: float):
+        while True:
+            now = time.monotonic()
+            due = [
+                exchange
+                for exchange, health in self._exchanges.items()
+                if health.state == OPEN and now - health.opened_at >= health.open_timeout and exchange in probes
+            ]
+            await asyncio.gather(*(self.probe(exchange, probes[exchange]) for exchange in due))
+            await asyncio.sleep(interval)
+
+    def report(self) -> str:
+        """
+        Текстовый отчет для /health
+        """
+        lines = [f"{self.name}:"]
+        if not self._exchanges:
+            lines.append("нет данных")
+        icons = {CLOSED: "🟢", HALF_OPEN: "🟡", OPEN: "🔴"}
+        for exchange, health in self.items():
+            latency = f"{health.latency * 1000:.0f} мс" if health.latency is not None else "—"
+            line = (
+                f"{icons[health.state]} {exchange}: {health.success_rate * 100:.0f}% успешных, "
+                f"{latency}, ошибок подряд {health.consecutive_failures}"
+            )
+            if health.state != CLOSED and health.last_error:
+                line += f"\n    {health.last_error[:100]}"
+            lines.append(line)
+        return "\n".join(lines)
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+from itertools import repeat
+
+import numpy as np
+
+from constants import HISTORY_DB_PATH, HISTORY_RECHECK_INTERVAL, HISTORY_SYMBOLS_CONCURRENCY
+from funding_fetcher import DAY_MS, HISTORY_FETCHERS, HOUR_MS, fetch_history, history_health
+from http_client import HttpClientManager
+from series import FundingFrame
+from symbol_index import SymbolIndex
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS funding_history (
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    funding_time INTEGER NOT NULL,
+    funding_rate REAL NOT NULL,
+    PRIMARY KEY (exchange, symbol, funding_time)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS series (
+    exchange TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    covered_from INTEGER NOT NULL,
+    last_time INTEGER,
+    checked_at INTEGER NOT NULL,
+    requested_from INTEGER,
+    PRIMARY KEY (exchange, symbol)
+) WITHOUT ROWID;
+"""
+
+
+def _payment_interval(frame: FundingFrame) -> int:
+    """
+    Типичный интервал между выплатами серии (мс), по умолчанию 8 часов
+    """
+    if len(frame) < 2:
+        return 8 * HOUR_MS
+    return int(np.median(np.diff(np.sort(frame.time))))
+
+
+class HistoryStore:
+    """
+    Локальное хранилище истории ставок финансирования (SQLite).
+
+    История после выплаты не меняется, поэтому для каждой серии
+    (биржа, символ) запоминается, с какого момента она загружена
+    (covered_from), с какого момента ее запрашивали (requested_from),
+    время последней выплаты (last_time) и последней проверки (checked_at).
+    С биржи докачиваются только недостающие старые записи и новый хвост,
+    не чаще recheck_interval (кроме запроса глубже, чем запрашивали раньше).
+    """
+
+    def __init__(
+        self,
+        path: str = HISTORY_DB_PATH,
+        recheck_interval: int = HISTORY_RECHECK_INTERVAL,
+        index: SymbolIndex = None,
+    ):
+        self.recheck_interval = recheck_interval
+        self.index = index
+        self._lock = threading.Lock()
+        # Базу могут делить несколько процессов (supervisor.py): WAL не блокирует
+        # чтение на время записи, а занятая база ожидается, а не дает ошибку сразу
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(series)")}
+        if "requested_from" not in columns:
+            # База прошлой версии: серии запрашивались с того же момента, с которого покрыты
+            try:
+                with self._conn:
+                    self._conn.execute("ALTER TABLE series ADD COLUMN requested_from INTEGER")
+                    self._conn.execute("UPDATE series SET requested_from = covered_from")
+            except sqlite3.OperationalError:
+                # Колонку уже добавил другой процесс
+                pass
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _series(self, exchange: str, symbol: str):
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT covered_from, last_time, checked_at, COALESCE(requested_from, covered_from) FROM series
+                WHERE exchange = ? AND symbol = ?
+                """,
+                (exchange, symbol),
+            ).fetchone()
+
+    def _save(
+        self,
+        exchange: str,
+        symbol: str,
+        frame: FundingFrame,
+        covered_from: int,
+        requested_from: int,
+        checked_at: int,
+    ):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO funding_history VALUES (?, ?, ?, ?)",
+                zip(repeat(exchange), repeat(symbol), frame.time.tolist(), frame.rate.tolist()),
+            )
+            self._conn.execute(
+                """
+                INSERT INTO series (exchange, symbol, covered_from, last_time, checked_at, requested_from)
+                VALUES (?, ?, ?, (
+                    SELECT MAX(funding_time) FROM funding_history WHERE exchange = ? AND symbol = ?
+                ), ?, ?)
+                ON CONFLICT (exchange, symbol) DO UPDATE SET
+                    covered_from = MIN(covered_from, excluded.covered_from),
+                    requested_from = MIN(COALESCE(requested_from, covered_from), excluded.requested_from),
+                    last_time = excluded.last_time,
+                    checked_at = excluded.checked_at
+                """,
+                (exchange, symbol, covered_from, exchange, symbol, checked_at, requested_from),
+            )
+
+    def _load(self, symbol: str, exchanges: list, start: int) -> FundingFrame:
+        placeholders = ", ".join("?" * len(exchanges))
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT exchange, funding_rate, funding_time FROM funding_history
+                WHERE symbol = ? AND funding_time >= ? AND exchange IN ({placeholders})
+                ORDER BY exchange, funding_time
+                """,
+                (symbol, start, *exchanges),
+            ).fetchall()
+        if not rows:
+            return FundingFrame.empty()
+        exchange_column, rate_column, time_column = zip(*rows)
+        return FundingFrame.from_columns(exchange_column, symbol, rate_column, time_column)
+
+    async def _sync(self, exchange: str, symbol: str, http: HttpClientManager, days: int, now: int):
+        """
+        Докачивает серию (биржа, символ) так, чтобы она покрывала последние `days` дней:
+        старые записи — только интервал [start, covered_from), новые — хвост после last_time
+        """
+        start = now - days * DAY_MS
+        series = await asyncio.to_thread(self._series, exchange, symbol)
+
+        if series is None:
+            covered_from = requested_from = None
+            backfill, tail_from = True, None
+        else:
+            covered_from, last_time, checked_at, requested_from = series
+            due = now - checked_at >= self.recheck_interval * 1000
+            # Глубже, чем запрашивали раньше, — сразу; дыру, которую уже пытались
+            # закрыть (урезанный ответ), — не чаще recheck_interval
+            backfill = start < covered_from and (start < requested_from or due)
+            # Без записей серия проверена до checked_at
+            tail_from = (last_time or checked_at) if due else None
+        if not backfill and tail_from is None:
+            return
+
+        requests = []
+        if backfill:
+            requests.append(fetch_history(exchange, symbol, http, days, self.index, until=covered_from))
+        if tail_from is not None:
+            tail_days = max(1, math.ceil((now - tail_from) / DAY_MS))
+            requests.append(fetch_history(exchange, symbol, http, tail_days, self.index))
+        frames = await asyncio.gather(*requests)
+
+        if backfill:
+            older = frames[0]
+            if len(older) and older.first_time - start > _payment_interval(older):
+                # Ответ не дошел до start (новый листинг или урезанный ответ):
+                # покрытие — с самой старой полученной записи, остальное докачается позже
+                oldest = older.first_time
+            else:
+                # Успешный пустой ответ — раньше covered_from записей у биржи нет
+                oldest = start
+            covered_from = oldest if covered_from is None else min(covered_from, oldest)
+            requested_from = start if requested_from is None else min(requested_from, start)
+        frame = FundingFrame.concat(frames)
+        await asyncio.to_thread(self._save, exchange, symbol, frame, covered_from, requested_from, now)
+
+    async def get_history(self, symbol: str, http: HttpClientManager, days: int = 7, exchanges: list = None):
+        """
+        История ставок по символу за последние `days` дней (FundingFrame).
+        Недостающие данные подгружаются с бирж, остальное читается с диска.
+        """
+        if exchanges is None:
+            exchanges = list(HISTORY_FETCHERS)
+        exchanges = [exchange for exchange in exchanges if exchange in HISTORY_FETCHERS]
+        if not exchanges:
+            return FundingFrame.empty()
+
+        # Отключенные автоматом биржи не докачиваются, отдается то, что уже есть на диске
+        now = int(time.time() * 1000)
+        available = [exchange for exchange in exchanges if history_health.allow(exchange)]
+        results = await asyncio.gather(
+            *(self._sync(exchange, symbol, http, days, now) for exchange in available),
+            return_exceptions=True,
+        )
+        for exchange, res in zip(available, results):
+            if isinstance(res, Exception):
+                logger.warning("Не удалось обновить историю %s %s: %r", exchange, symbol, res)
+
+        return await asyncio.to_thread(self._load, symbol, exchanges, now - days * DAY_MS)
+
+    async def get_history_many(
+        self,
+        symbols: list,
+        http: HttpClientManager,
+        days: int = 7,
+        exchanges: list = None,
+        concurrency: int = HISTORY_SYMBOLS_CONCURRENCY,
+    ):
+        """
+        История по списку символов: символы обрабатываются параллельно,
+        не более `concurrency` одновременно. Возвращает {символ: FundingFrame}.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(symbol):
+            async with semaphore:
+                return await self.get_history(symbol, http, days, exchanges)
+
+        results = await asyncio.gather(*(bounded(symbol) for symbol in symbols))
+        return dict(zip(symbols, results))
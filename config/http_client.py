@@ -0,0 +1,135 @@
+import logging
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from constants import (
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_TIMEOUT,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_MAX_WAIT,
+)
+from metrics import (
+    EXCHANGE_ERRORS,
+    EXCHANGE_REQUEST_SECONDS,
+    EXCHANGE_RESPONSE_BYTES,
+    EXCHANGE_RESPONSES,
+    RATE_LIMIT_WAIT_SECONDS,
+)
+from rate_limit import RateLimiter
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClientManager:
+    """
+    Общий на весь процесс пул HTTP-соединений к биржам.
+
+    Для каждого хоста создается свой httpx.AsyncClient с keep-alive пулом,
+    поэтому медленная биржа не занимает соединения остальных.
+    HTTP/2 включается, если установлен h2 — сервер сам выберет
+    протокол через ALPN, биржи без HTTP/2 остаются на HTTP/1.1.
+    Перед каждым запросом учитывается лимит биржи (RateLimiter),
+    ответ 429 повторяется после паузы, если она не слишком долгая.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        http2: bool = HTTP2_ENABLED,
+        rate_limit: bool = RATE_LIMIT_ENABLED,
+        max_retries: int = RATE_LIMIT_MAX_RETRIES,
+        max_wait: float = RATE_LIMIT_MAX_WAIT,
+        transport_factory=None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limiter = RateLimiter() if rate_limit else None
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        # transport_factory(limits) -> транспорт httpx для каждого хоста (мок-сервер в бенчмарках)
+        self.transport_factory = transport_factory
+        self._clients = {}
+
+    def client(self, url: str) -> httpx.AsyncClient:
+        """
+        Клиент (пул соединений) для хоста из url
+        """
+        host = urlsplit(url).netloc
+        client = self._clients.get(host)
+        if client is None:
+            client = httpx.AsyncClient(
+                verify=False,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self.transport_factory(self.limits) if self.transport_factory else None,
+            )
+            self._clients[host] = client
+        return client
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        GET-запрос через пул соединений хоста с учетом лимитов биржи
+        """
+        if self.limiter is None:
+            return await self._get(url, **kwargs)
+
+        host = urlsplit(url).netloc
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            await self.limiter.acquire(url, kwargs.get("params"))
+            RATE_LIMIT_WAIT_SECONDS.labels(host).observe(time.perf_counter() - started)
+            response = await self._get(url, **kwargs)
+            wait = self.limiter.observe(url, response, attempt)
+            if wait is None or wait > self.max_wait:
+                return response
+            logger.info("Повтор запроса %s через %.1f с", url, wait)
+        return response
+
+    async def _get(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Запрос с записью длительности, кода ответа и объема в метрики
+        """
+        host = urlsplit(url).netloc
+        started = time.perf_counter()
+        try:
+            response = await self.client(url).get(url, **kwargs)
+        except httpx.HTTPError as e:
+            EXCHANGE_ERRORS.labels(host, type(e).__name__).inc()
+            raise
+        finally:
+            EXCHANGE_REQUEST_SECONDS.labels(host).observe(time.perf_counter() - started)
+        EXCHANGE_RESPONSES.labels(host, response.status_code).inc()
+        EXCHANGE_RESPONSE_BYTES.labels(host).inc(len(response.content))
+        return response
+
+    async def close(self):
+        """
+        Закрытие всех соединений
+        """
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            await client.aclose()
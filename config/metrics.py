@@ -0,0 +1,264 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.methods import GetUpdates
+from aiogram.types import Message
+from aiohttp import web
+
+from constants import METRICS_HOST, METRICS_PORT
+
+# Границы корзин гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+
+def _labels_text(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric(ABC):
+    """
+    Метрика с метками; значения для каждого набора меток хранятся в дочерних объектах
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def _child(self):
+        """
+        Новый объект значения для одного набора меток
+        """
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            child = self._child()
+            self._children[values] = child
+        return child
+
+    @abstractmethod
+    def _samples(self, values: tuple, child) -> list:
+        """
+        Строки экспозиции для одного набора меток
+        """
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._samples(values, child))
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def _samples(self, values, child):
+        return [f"{self.name}{_labels_text(self.labelnames, values)} {child.value}"]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def _samples(self, values, child):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            total += count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, values, le)} {total}")
+        labels = _labels_text(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {child.sum}")
+        lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+
+def render_metrics() -> str:
+    """
+    Все метрики в текстовом формате Prometheus
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# Запросы к биржам
+EXCHANGE_REQUEST_SECONDS = Histogram(
+    "exchange_request_seconds", "Длительность HTTP-запроса к бирже", ("host",)
+)
+EXCHANGE_RESPONSES = Counter(
+    "exchange_responses_total", "Ответы бирж по коду статуса", ("host", "status")
+)
+EXCHANGE_RESPONSE_BYTES = Counter(
+    "exchange_response_bytes_total", "Объем ответов бирж в байтах", ("host",)
+)
+EXCHANGE_ERRORS = Counter(
+    "exchange_errors_total", "Сетевые ошибки запросов к биржам", ("host", "error")
+)
+EXCHANGE_TIMED_OUT = Counter(
+    "exchange_timeouts_total", "Биржа не ответила за отведенное время", ("exchange",)
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "rate_limit_wait_seconds", "Ожидание разрешения лимитера перед запросом", ("host",)
+)
+
+# Команды бота
+COMMAND_SECONDS = Histogram(
+    "command_seconds", "Время обработки команды от получения до ответа", ("command",)
+)
+COMMANDS = Counter("commands_total", "Обработанные команды", ("command", "result"))
+TELEGRAM_SEND_SECONDS = Histogram(
+    "telegram_send_seconds", "Длительность отправки сообщения в Telegram", ("method",)
+)
+
+# Графики
+RENDER_QUEUE_SECONDS = Histogram(
+    "chart_render_queue_seconds", "Ожидание свободного процесса отрисовки", ("chart",)
+)
+RENDER_SECONDS = Histogram("chart_render_seconds", "Время отрисовки графика", ("chart",))
+RENDER_PENDING = Gauge("chart_render_pending", "Графики в очереди и в отрисовке")
+RENDER_REJECTED = Counter("chart_render_rejected_total", "Отклоненные из-за переполнения очереди графики")
+
+# Планировщик команд
+SCHEDULER_QUEUE_SECONDS = Histogram(
+    "scheduler_queue_seconds", "Ожидание места в планировщике команд", ("job",)
+)
+SCHEDULER_RUNNING = Gauge("scheduler_running", "Выполняемые команды по классам", ("job",))
+SCHEDULER_WAITING = Gauge("scheduler_waiting", "Команды в очереди по классам", ("job",))
+SCHEDULER_REJECTED = Counter("scheduler_rejected_total", "Отклоненные планировщиком команды", ("job", "reason"))
+
+# Подписки
+ALERT_RULES = Gauge("alert_rules", "Правила подписок в индексе")
+ALERT_EVALUATE_SECONDS = Histogram(
+    "alert_evaluate_seconds",
+    "Проверка подписок после обновления снимка",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+ALERTS_FIRED = Counter("alerts_fired_total", "Сработавшие правила подписок", ("metric",))
+ALERTS_PENDING = Gauge("alerts_pending", "Уведомления в очереди отправки")
+ALERTS_SENT = Counter("alerts_sent_total", "Отправка уведомлений", ("result",))
+
+# Запуск
+STARTUP_SECONDS = Gauge("startup_seconds", "Время от старта процесса до этапа запуска", ("stage",))
+
+# WebSocket-потоки
+WS_MESSAGES = Counter("ws_messages_total", "Сообщения WebSocket-потоков со ставками", ("exchange",))
+WS_RECONNECTS = Counter("ws_reconnects_total", "Переподключения WebSocket-потоков", ("exchange",))
+WS_CONNECTED = Gauge("ws_connected", "WebSocket-поток биржи подключен", ("exchange",))
+
+# Кэши
+CACHE_REQUESTS = Counter("cache_requests_total", "Обращения к кэшам", ("cache", "result"))
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Время обработки и результат каждой команды бота.
+    Регистрируется как внутренний middleware (dp.message.middleware),
+    поэтому видит только команды, для которых нашелся хэндлер.
+    """
+
+    async def __call__(self, handler, event, data):
+        if not isinstance(event, Message) or not event.text or not event.text.startswith("/"):
+            return await handler(event, data)
+
+        command = event.text.split()[0][1:].split("@")[0].lower()
+        started = time.perf_counter()
+        result = "ok"
+        try:
+            return await handler(event, data)
+        except Exception:
+            result = "error"
+            raise
+        finally:
+            COMMAND_SECONDS.labels(command).observe(time.perf_counter() - started)
+            COMMANDS.labels(command, result).inc()
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Длительность запросов к Bot API (кроме long polling getUpdates)
+    """
+
+    async def __call__(self, make_request, bot, method):
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            TELEGRAM_SEND_SECONDS.labels(type(method).__name__).observe(time.perf_counter() - started)
+
+
+async def _metrics_view(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """
+    HTTP-сервер с /metrics в том же event loop, что и бот. Возвращает runner для остановки.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_view)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,124 @@
+import asyncio
+import math
+
+from constants import HISTORY_MAX_PAGES, PAGINATION_CONCURRENCY
+from series import FundingFrame
+
+_semaphores = {}
+
+
+def exchange_semaphore(exchange: str) -> asyncio.Semaphore:
+    """
+    Ограничение числа одновременных запросов страниц к одной бирже
+    """
+    semaphore = _semaphores.get(exchange)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PAGINATION_CONCURRENCY)
+        _semaphores[exchange] = semaphore
+    return semaphore
+
+
+def _since(exchange: str, symbol: str, rates: list, times: list, cutoff: int, until: int = None) -> FundingFrame:
+    """
+    Столбцы ставок и времени в FundingFrame: записи с cutoff до until без дублей, по возрастанию времени
+    """
+    frame = FundingFrame.from_columns(exchange, symbol, rates, times)
+    return frame.filter(since=cutoff, until=until).sort().unique()
+
+
+def _pages_needed(times: list, cutoff: int) -> int:
+    """
+    Оценка числа страниц до cutoff по интервалу между выплатами на первой странице
+    """
+    if len(times) < 2:
+        return 1
+    newest = max(times)
+    span = (newest - min(times)) * len(times) / (len(times) - 1)
+    if span <= 0:
+        return 1
+    return math.ceil((newest - cutoff) / span)
+
+
+async def paginate_pages(
+    exchange: str, symbol: str, fetch_page, cutoff: int, until: int = None, max_pages: int = HISTORY_MAX_PAGES
+) -> FundingFrame:
+    """
+    Постраничная загрузка (page_num / pageNo), страницы — от новых записей к старым;
+    записи не раньше until отбрасываются.
+    fetch_page(page) -> (ставки, время, всего страниц или None если неизвестно);
+    при ответе не 200 fetch_page бросает исключение, пустая страница — конец данных.
+    После первой страницы оценивается, сколько страниц нужно до cutoff,
+    и они запрашиваются параллельно пачками.
+    """
+    semaphore = exchange_semaphore(exchange)
+
+    async def bounded(page):
+        async with semaphore:
+            return await fetch_page(page)
+
+    rates, times, total = await bounded(1)
+    if not times or min(times) < cutoff:
+        return _since(exchange, symbol, rates, times, cutoff, until)
+
+    last_page = min(total or max_pages, max_pages)
+    batch = max(_pages_needed(times, cutoff) - 1, PAGINATION_CONCURRENCY)
+    page = 2
+    while page <= last_page:
+        pages = range(page, min(page + batch, last_page + 1))
+        results = await asyncio.gather(*(bounded(p) for p in pages))
+        page = pages[-1] + 1
+        batch = PAGINATION_CONCURRENCY
+
+        reached = False
+        for page_rates, page_times, _ in results:
+            rates.extend(page_rates)
+            times.extend(page_times)
+            if not page_times or min(page_times) < cutoff:
+                reached = True
+        if reached:
+            break
+
+    return _since(exchange, symbol, rates, times, cutoff, until)
+
+
+async def paginate_cursor(
+    exchange: str, symbol: str, fetch_page, cutoff: int, until: int = None, max_pages: int = HISTORY_MAX_PAGES
+) -> FundingFrame:
+    """
+    Загрузка по курсору (after = время самой старой записи), начиная с записей раньше until.
+    fetch_page(cursor) -> (ставки, время, следующий курсор или None);
+    при ответе не 200 fetch_page бросает исключение, пустая страница — конец данных.
+    Каждая страница зависит от предыдущей, поэтому запросы идут последовательно.
+    """
+    semaphore = exchange_semaphore(exchange)
+    rates = []
+    times = []
+    cursor = until
+    for _ in range(max_pages):
+        async with semaphore:
+            page_rates, page_times, cursor = await fetch_page(cursor)
+        rates.extend(page_rates)
+        times.extend(page_times)
+        if not page_times or cursor is None or min(page_times) < cutoff:
+            break
+    return _since(exchange, symbol, rates, times, cutoff, until)
+
+
+async def paginate_time_windows(
+    exchange: str, symbol: str, fetch_window, start: int, end: int, window: int
+) -> FundingFrame:
+    """
+    Загрузка интервала [start, end] окнами по `window` мс.
+    fetch_window(window_start, window_end) -> (ставки, время); окна независимы и запрашиваются параллельно.
+    """
+    semaphore = exchange_semaphore(exchange)
+
+    async def bounded(window_start, window_end):
+        async with semaphore:
+            return await fetch_window(window_start, window_end)
+
+    windows = [(s, min(s + window - 1, end)) for s in range(start, end + 1, window)][-HISTORY_MAX_PAGES:]
+    results = await asyncio.gather(*(bounded(s, e) for s, e in windows))
+    rates = [r for window_rates, _ in results for r in window_rates]
+    times = [t for _, window_times in results for t in window_times]
+    return _since(exchange, symbol, rates, times, start)
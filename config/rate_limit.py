@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+from constants import RATE_LIMIT_DEFAULT_BURST, RATE_LIMIT_DEFAULT_RATE, RATE_LIMIT_MIN_FACTOR
+
+logger = logging.getLogger(__name__)
+
+# Лимиты хостов: (запросов/вес в секунду, размер пачки). Берутся с запасом от опубликованных
+HOST_LIMITS = {
+    "fapi.binance.com": (30.0, 60),  # 2400 веса в минуту на IP
+    "api.bybit.com": (20.0, 40),
+    "www.okx.com": (20.0, 40),
+    "api.gateio.ws": (15.0, 30),
+    "api.bitget.com": (15.0, 20),
+    "api-cloud-v2.bitmart.com": (5.0, 10),
+    "contract.mexc.com": (8.0, 16),
+    "open-api.bingx.com": (5.0, 10),
+    "api.hbdm.com": (10.0, 20),
+    "api-futures.kucoin.com": (10.0, 20),
+    "openapi.blofin.com": (8.0, 16),
+    "api.coinex.com": (10.0, 20),
+}
+
+# Эндпоинты с собственным лимитом поверх лимита хоста
+ENDPOINT_LIMITS = {
+    ("fapi.binance.com", "/fapi/v1/fundingRate"): (1.5, 20),  # 500 запросов за 5 минут
+    ("www.okx.com", "/api/v5/public/funding-rate"): (10.0, 20),  # 20 запросов за 2 секунды
+    ("www.okx.com", "/api/v5/public/funding-rate-history"): (5.0, 10),  # 10 запросов за 2 секунды
+    ("www.okx.com", "/api/v5/public/instruments"): (10.0, 20),
+    ("api-cloud-v2.bitmart.com", "/contract/public/funding-rate-history"): (2.0, 4),
+}
+
+# Вес запроса, если он отличается от 1: число или функция от параметров запроса
+ENDPOINT_WEIGHTS = {
+    ("fapi.binance.com", "/fapi/v1/premiumIndex"): lambda params: 1 if "symbol" in params else 10,
+    ("fapi.binance.com", "/fapi/v1/exchangeInfo"): 1,
+}
+
+BINANCE_WEIGHT_LIMIT = 2400
+
+
+class TokenBucket:
+    """
+    Корзина токенов: `rate` токенов в секунду, не больше `capacity`.
+
+    При троттлинге скорость уменьшается вдвое (не ниже min_factor от
+    исходной), после каждого успешного ответа понемногу восстанавливается.
+    """
+
+    def __init__(self, rate: float, capacity: float, min_factor: float = RATE_LIMIT_MIN_FACTOR):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = rate * min_factor
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight: float = 1):
+        """
+        Ожидание `weight` токенов; ожидающие обслуживаются по очереди
+        """
+        weight = min(weight, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                await asyncio.sleep((weight - self.tokens) / self.rate)
+
+    def block(self, seconds: float):
+        """
+        Запрет запросов на `seconds` секунд (Retry-After, сброс окна лимита)
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def throttled(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.05)
+
+
+def _retry_after(response: httpx.Response):
+    """
+    Значение Retry-After в секундах (число или HTTP-дата)
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _until_reset(reset_ms: str) -> float:
+    return max(0.0, int(reset_ms) / 1000 - time.time())
+
+
+def _observe_binance(bucket: TokenBucket, headers: httpx.Headers):
+    """
+    Binance: израсходованный за минуту вес. При подходе к лимиту ждем следующую минуту.
+    """
+    used = headers.get("X-MBX-USED-WEIGHT-1M")
+    if used and int(used) >= BINANCE_WEIGHT_LIMIT * 0.9:
+        bucket.block(60 - time.time() % 60)
+
+
+def _observe_bybit(bucket: TokenBucket, headers: httpx.Headers):
+    """
+    Bybit: остаток запросов в окне и время сброса окна (мс)
+    """
+    remaining = headers.get("X-Bapi-Limit-Status")
+    reset = headers.get("X-Bapi-Limit-Reset-Timestamp")
+    if remaining and reset and int(remaining) <= 1:
+        bucket.block(_until_reset(reset))
+
+
+def _observe_gate(bucket: TokenBucket, headers: httpx.Headers):
+    """
+    Gate: остаток запросов в окне и время сброса окна (мс)
+    """
+    remaining = headers.get("X-Gate-RateLimit-Requests-Remain")
+    reset = headers.get("X-Gate-RateLimit-Reset-Timestamp")
+    if remaining and reset and int(remaining) <= 1:
+        bucket.block(_until_reset(reset))
+
+
+HEADER_OBSERVERS = {
+    "fapi.binance.com": _observe_binance,
+    "api.bybit.com": _observe_bybit,
+    "api.gateio.ws": _observe_gate,
+}
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов к биржам.
+
+    Для каждого хоста (и для эндпоинтов с отдельным лимитом) своя корзина
+    токенов, запрос забирает из нее свой вес. Ответы 429/418 блокируют
+    корзину на Retry-After и снижают скорость; заголовки с остатком лимита
+    (Binance, Bybit, Gate) притормаживают запросы еще до ответа 429.
+    """
+
+    def __init__(
+        self,
+        host_limits: dict = None,
+        endpoint_limits: dict = None,
+        default_rate: float = RATE_LIMIT_DEFAULT_RATE,
+        default_burst: float = RATE_LIMIT_DEFAULT_BURST,
+    ):
+        self.host_limits = HOST_LIMITS if host_limits is None else host_limits
+        self.endpoint_limits = ENDPOINT_LIMITS if endpoint_limits is None else endpoint_limits
+        self.default = (default_rate, default_burst)
+        self._buckets = {}
+
+    def _bucket(self, key, limit) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(*limit)
+            self._buckets[key] = bucket
+        return bucket
+
+    def buckets(self, url: str) -> list:
+        """
+        Корзины запроса: корзина хоста и, если есть, корзина эндпоинта
+        """
+        parts = urlsplit(url)
+        buckets = [self._bucket(parts.netloc, self.host_limits.get(parts.netloc, self.default))]
+        endpoint = (parts.netloc, parts.path)
+        if endpoint in self.endpoint_limits:
+            buckets.append(self._bucket(endpoint, self.endpoint_limits[endpoint]))
+        return buckets
+
+    @staticmethod
+    def weight(url: str, params: dict = None) -> float:
+        parts = urlsplit(url)
+        weight = ENDPOINT_WEIGHTS.get((parts.netloc, parts.path), 1)
+        if callable(weight):
+            query = dict(parse_qsl(parts.query))
+            query.update(params or {})
+            weight = weight(query)
+        return weight
+
+    async def acquire(self, url: str, params: dict = None):
+        """
+        Ожидание разрешения на запрос
+        """
+        weight = self.weight(url, params)
+        for bucket in self.buckets(url):
+            await bucket.acquire(weight)
+
+    def observe(self, url: str, response: httpx.Response, attempt: int = 0):
+        """
+        Учет ответа биржи. Возвращает паузу в секундах, если запрос отклонен из-за лимита, иначе None.
+        """
+        buckets = self.buckets(url)
+        bucket = buckets[-1]
+        host = urlsplit(url).netloc
+
+        if response.status_code in (418, 429):
+            wait = _retry_after(response)
+            if wait is None:
+                wait = 2 ** attempt
+            for b in buckets:
+                b.throttled()
+            # 418 — бан IP на всю биржу, 429 — превышен лимит конкретной корзины
+            for b in (buckets if response.status_code == 418 else [bucket]):
+                b.block(wait)
+            logger.warning("Лимит запросов %s (%s), пауза %.1f с", host, response.status_code, wait)
+            return wait
+
+        observer = HEADER_OBSERVERS.get(host)
+        if observer is not None:
+            try:
+                observer(buckets[0], response.headers)
+            except ValueError:
+                pass
+        for b in buckets:
+            b.succeeded()
+        return None
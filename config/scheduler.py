@@ -0,0 +1,232 @@
+"""
+Планировщик команд между хэндлерами aiogram и запросами к биржам / отрисовкой.
+
+Каждая команда относится к классу (JobClass): поиск по снимку, один график,
+график по нескольким токенам. Класс задается флагом хэндлера job при регистрации,
+SchedulerMiddleware ждет свободного места и только потом вызывает хэндлер.
+
+- Всего одновременно выполняется не больше concurrency команд, у одного
+  пользователя — не больше per_user.
+- У тяжелых классов свой предел (slots), поэтому графики не занимают все места
+  и не задерживают быстрые команды.
+- Из очереди первым берется самый приоритетный класс; ожидание повышает приоритет
+  (на один класс за aging секунд), так что графики тоже не ждут бесконечно.
+  Внутри класса пользователи обслуживаются по кругу.
+- Команда, перед которой в очереди уже queue_size команд не ниже ее приоритета,
+  или пользователь с полной личной очередью получают отказ (SchedulerBusy).
+"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import Message
+
+from constants import (
+    SCHEDULER_AGING,
+    SCHEDULER_CHART_SLOTS,
+    SCHEDULER_CONCURRENCY,
+    SCHEDULER_MULTI_CHART_SLOTS,
+    SCHEDULER_PER_USER,
+    SCHEDULER_QUEUE_SIZE,
+    SCHEDULER_USER_QUEUE,
+)
+from metrics import SCHEDULER_QUEUE_SECONDS, SCHEDULER_REJECTED, SCHEDULER_RUNNING, SCHEDULER_WAITING
+
+BUSY_TEXT = "⏳ Бот сейчас перегружен, попробуйте через минуту"
+USER_BUSY_TEXT = "⏳ Дождитесь ответа на предыдущие запросы"
+
+
+class JobClass:
+    """
+    Класс команд: приоритет (меньше — важнее) и предел одновременных команд класса
+    """
+
+    def __init__(self, name: str, priority: int, slots: int = None):
+        self.name = name
+        self.priority = priority
+        self.slots = slots
+
+
+LOOKUP = JobClass("lookup", 0)
+CHART = JobClass("chart", 1, SCHEDULER_CHART_SLOTS)
+MULTI_CHART = JobClass("multi_chart", 2, SCHEDULER_MULTI_CHART_SLOTS)
+
+
+class SchedulerBusy(Exception):
+    """
+    Команда не поставлена в очередь; reason — "queue" или "user"
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Waiter:
+    def __init__(self, job_class: JobClass, user, future: asyncio.Future):
+        self.job_class = job_class
+        self.user = user
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class Scheduler:
+    """
+    Очередь команд с классами приоритета, пределами на пользователя и общим пределом
+    """
+
+    def __init__(
+        self,
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        per_user: int = SCHEDULER_PER_USER,
+        queue_size: int = SCHEDULER_QUEUE_SIZE,
+        user_queue: int = SCHEDULER_USER_QUEUE,
+        aging: float = SCHEDULER_AGING,
+    ):
+        self.concurrency = concurrency
+        self.per_user = per_user
+        self.queue_size = queue_size
+        self.user_queue = user_queue
+        self.aging = aging
+        self.running = 0
+        self._running = {}
+        self._user_running = {}
+        self._user_waiting = {}
+        # класс -> {пользователь: очередь}; порядок пользователей — очередь по кругу
+        self._queues = {}
+
+    def _count(self, counter: dict, key, delta: int):
+        value = counter.get(key, 0) + delta
+        if value:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    def _waiting(self, job_class: JobClass) -> int:
+        return sum(len(q) for q in self._queues.get(job_class, {}).values())
+
+    def _start(self, job_class: JobClass, user):
+        self.running += 1
+        self._count(self._running, job_class, 1)
+        self._count(self._user_running, user, 1)
+        SCHEDULER_RUNNING.labels(job_class.name).set(self._running.get(job_class, 0))
+
+    def release(self, job_class: JobClass, user):
+        """
+        Команда завершилась: место отдается следующей в очереди
+        """
+        self.running -= 1
+        self._count(self._running, job_class, -1)
+        self._count(self._user_running, user, -1)
+        SCHEDULER_RUNNING.labels(job_class.name).set(self._running.get(job_class, 0))
+        self._dispatch()
+
+    def _enqueue(self, waiter: _Waiter):
+        users = self._queues.setdefault(waiter.job_class, OrderedDict())
+        users.setdefault(waiter.user, deque()).append(waiter)
+        self._count(self._user_waiting, waiter.user, 1)
+        SCHEDULER_WAITING.labels(waiter.job_class.name).set(self._waiting(waiter.job_class))
+
+    def _remove(self, waiter: _Waiter):
+        users = self._queues[waiter.job_class]
+        queue = users[waiter.user]
+        queue.remove(waiter)
+        if not queue:
+            del users[waiter.user]
+        else:
+            # Следующая команда пользователя — в конец круга
+            users.move_to_end(waiter.user)
+        self._count(self._user_waiting, waiter.user, -1)
+        SCHEDULER_WAITING.labels(waiter.job_class.name).set(self._waiting(waiter.job_class))
+
+    def _next(self):
+        """
+        Первая команда, которую можно запустить: наименьший приоритет с учетом
+        ожидания, внутри класса — следующий по кругу пользователь без превышения предела
+        """
+        now = time.monotonic()
+        best, best_score = None, None
+        for job_class, users in self._queues.items():
+            if job_class.slots is not None and self._running.get(job_class, 0) >= job_class.slots:
+                continue
+            for user, queue in users.items():
+                if self._user_running.get(user, 0) >= self.per_user:
+                    continue
+                waiter = queue[0]
+                score = job_class.priority - (now - waiter.enqueued) / self.aging
+                if best_score is None or score < best_score:
+                    best, best_score = waiter, score
+                break
+        return best
+
+    def _dispatch(self):
+        while self.running < self.concurrency:
+            waiter = self._next()
+            if waiter is None:
+                return
+            self._remove(waiter)
+            self._start(waiter.job_class, waiter.user)
+            waiter.future.set_result(None)
+
+    def _check_limits(self, waiter: _Waiter):
+        if self._user_waiting.get(waiter.user, 0) > self.user_queue:
+            raise SchedulerBusy("user")
+        # Команда ждет только тех, у кого приоритет не ниже
+        ahead = sum(
+            self._waiting(job_class) for job_class in self._queues if job_class.priority <= waiter.job_class.priority
+        )
+        if ahead > self.queue_size:
+            raise SchedulerBusy("queue")
+
+    async def acquire(self, job_class: JobClass, user):
+        """
+        Ждет места для команды; SchedulerBusy, если очередь переполнена
+        """
+        waiter = _Waiter(job_class, user, asyncio.get_running_loop().create_future())
+        self._enqueue(waiter)
+        self._dispatch()
+        if not waiter.future.done():
+            try:
+                self._check_limits(waiter)
+            except SchedulerBusy as e:
+                self._remove(waiter)
+                SCHEDULER_REJECTED.labels(job_class.name, e.reason).inc()
+                raise
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Место уже выдано, но команда отменена
+                self.release(job_class, user)
+            else:
+                self._remove(waiter)
+                self._dispatch()
+            raise
+        SCHEDULER_QUEUE_SECONDS.labels(job_class.name).observe(time.monotonic() - waiter.enqueued)
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """
+    Выполнение хэндлеров с флагом job через Scheduler.
+    Регистрируется как внутренний middleware (dp.message.middleware)
+    """
+
+    def __init__(self, scheduler: Scheduler = None):
+        self.scheduler = scheduler or Scheduler()
+
+    async def __call__(self, handler, event, data):
+        job_class = get_flag(data, "job")
+        if job_class is None or not isinstance(event, Message):
+            return await handler(event, data)
+
+        user = event.from_user.id if event.from_user is not None else event.chat.id
+        try:
+            await self.scheduler.acquire(job_class, user)
+        except SchedulerBusy as e:
+            return await event.answer(USER_BUSY_TEXT if e.reason == "user" else BUSY_TEXT)
+        try:
+            return await handler(event, data)
+        finally:
+            self.scheduler.release(job_class, user)
@@ -0,0 +1,162 @@
+import numpy as np
+
+
+def _factorize(values, n: int):
+    """
+    Категории и коды для столбца строк; строка вместо столбца — одна категория на все n строк
+    """
+    if isinstance(values, str):
+        return (values,), np.zeros(n, dtype=np.int32)
+    if n == 0:
+        return (), np.zeros(0, dtype=np.int32)
+    categories, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return tuple(categories.tolist()), codes.astype(np.int32)
+
+
+class FundingFrame:
+    """
+    История ставок финансирования в колоночном виде.
+
+    time — int64 (мс), rate — float64, биржа и символ хранятся как
+    коды int32 в списки категорий exchanges / symbols. Все операции
+    векторные и возвращают новый FundingFrame.
+    """
+
+    __slots__ = ("time", "rate", "exchange_codes", "symbol_codes", "exchanges", "symbols")
+
+    def __init__(self, time, rate, exchange_codes, symbol_codes, exchanges, symbols):
+        self.time = np.asarray(time, dtype=np.int64)
+        self.rate = np.asarray(rate, dtype=np.float64)
+        self.exchange_codes = np.asarray(exchange_codes, dtype=np.int32)
+        self.symbol_codes = np.asarray(symbol_codes, dtype=np.int32)
+        self.exchanges = tuple(exchanges)
+        self.symbols = tuple(symbols)
+
+    @classmethod
+    def empty(cls):
+        return cls((), (), (), (), (), ())
+
+    @classmethod
+    def from_columns(cls, exchange, symbol, rate, time):
+        """
+        Из столбцов; exchange и symbol могут быть одной строкой для всех записей
+        """
+        time = np.asarray(time, dtype=np.int64)
+        exchanges, exchange_codes = _factorize(exchange, len(time))
+        symbols, symbol_codes = _factorize(symbol, len(time))
+        return cls(time, rate, exchange_codes, symbol_codes, exchanges, symbols)
+
+    @classmethod
+    def concat(cls, frames: list):
+        """
+        Объединение нескольких FundingFrame с объединением категорий
+        """
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return cls.empty()
+        if len(frames) == 1:
+            return frames[0]
+
+        exchanges = tuple(dict.fromkeys(e for f in frames for e in f.exchanges))
+        symbols = tuple(dict.fromkeys(s for f in frames for s in f.symbols))
+        exchange_index = {e: i for i, e in enumerate(exchanges)}
+        symbol_index = {s: i for i, s in enumerate(symbols)}
+
+        exchange_codes = []
+        symbol_codes = []
+        for f in frames:
+            exchange_map = np.array([exchange_index[e] for e in f.exchanges], dtype=np.int32)
+            symbol_map = np.array([symbol_index[s] for s in f.symbols], dtype=np.int32)
+            exchange_codes.append(exchange_map[f.exchange_codes])
+            symbol_codes.append(symbol_map[f.symbol_codes])
+
+        return cls(
+            np.concatenate([f.time for f in frames]),
+            np.concatenate([f.rate for f in frames]),
+            np.concatenate(exchange_codes),
+            np.concatenate(symbol_codes),
+            exchanges,
+            symbols,
+        )
+
+    def __len__(self):
+        return len(self.time)
+
+    def take(self, index):
+        """
+        Строки по индексу или булевой маске
+        """
+        return FundingFrame(
+            self.time[index],
+            self.rate[index],
+            self.exchange_codes[index],
+            self.symbol_codes[index],
+            self.exchanges,
+            self.symbols,
+        )
+
+    def filter(self, exchange: str = None, symbol: str = None, since: int = None, until: int = None):
+        """
+        Отбор по бирже, символу и времени (не раньше since и раньше until, мс)
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if exchange is not None:
+            if exchange not in self.exchanges:
+                return self.take(np.zeros(len(self), dtype=bool))
+            mask &= self.exchange_codes == self.exchanges.index(exchange)
+        if symbol is not None:
+            if symbol not in self.symbols:
+                return self.take(np.zeros(len(self), dtype=bool))
+            mask &= self.symbol_codes == self.symbols.index(symbol)
+        if since is not None:
+            mask &= self.time >= since
+        if until is not None:
+            mask &= self.time < until
+        return self.take(mask)
+
+    def sort(self):
+        """
+        Сортировка по символу, бирже и времени
+        """
+        return self.take(np.lexsort((self.time, self.exchange_codes, self.symbol_codes)))
+
+    def unique(self):
+        """
+        Без повторов (символ, биржа, время); ожидает отсортированный frame
+        """
+        if len(self) < 2:
+            return self
+        keep = np.ones(len(self), dtype=bool)
+        keep[1:] = (
+            (self.time[1:] != self.time[:-1])
+            | (self.exchange_codes[1:] != self.exchange_codes[:-1])
+            | (self.symbol_codes[1:] != self.symbol_codes[:-1])
+        )
+        return self.take(keep)
+
+    @property
+    def first_time(self) -> int:
+        return int(self.time.min()) if len(self) else 0
+
+    @property
+    def last_time(self) -> int:
+        return int(self.time.max()) if len(self) else 0
+
+    def datetimes(self):
+        """
+        Время в datetime64[ms]
+        """
+        return self.time.astype("datetime64[ms]")
+
+    def cumsum(self, scale: float = 1.0):
+        """
+        Кумулятивная ставка (для одного ряда, отсортированного по времени)
+        """
+        return np.cumsum(self.rate * scale)
+
+    def stats(self, scale: float = 1.0):
+        """
+        (сумма, среднее, максимум, минимум) ставки
+        """
+        rate = self.rate * scale
+        return float(rate.sum()), float(rate.mean()), float(rate.max()), float(rate.min())
@@ -0,0 +1,360 @@
+"""
+Таблица ставок и индекс символов в общей памяти для многопроцессного режима.
+
+Процесс сбора данных (supervisor.py) держит обычные FundingSnapshot и SymbolIndex
+и периодически публикует их в блок multiprocessing.shared_memory с фиксированной
+раскладкой массивов. Обработчики читают блок без копирования всей таблицы
+через SharedFundingSnapshot и SharedSymbolIndex — те же методы, что у
+FundingSnapshot и SymbolIndex, которые нужны хэндлерам.
+
+Согласованность — seqlock: писатель делает счетчик нечетным, пишет массивы
+и делает его четным; читатель повторяет чтение, если счетчик был нечетным
+или изменился, пока он копировал свою строку.
+"""
+import logging
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from constants import SHARED_MAX_SYMBOLS, SNAPSHOT_MAX_AGE
+from snapshot import FundingSnapshot
+from symbol_index import SymbolIndex, native_symbol
+from utils import canonical_symbol
+
+logger = logging.getLogger(__name__)
+
+# Ширина строковых полей (байты)
+SYMBOL_WIDTH = 24
+NATIVE_WIDTH = 32
+
+# Заголовок: счетчик seqlock, число символов, версия списка символов
+_SEQ, _COUNT, _SYMBOLS_VERSION = range(3)
+_HEADER_SIZE = 4
+
+
+class SharedTable:
+    """
+    Раскладка блока общей памяти: заголовок и массивы (символы x биржи)
+    """
+
+    def __init__(self, exchanges: list, capacity: int = SHARED_MAX_SYMBOLS, name: str = None, create: bool = False):
+        self.exchanges = list(exchanges)
+        self.capacity = capacity
+        width = len(self.exchanges)
+        layout = [
+            ("header", np.int64, (_HEADER_SIZE,)),
+            # время обновления снимка биржи, 0 — данных нет
+            ("updated_at", np.float64, (width,)),
+            # список контрактов биржи загружен в индекс
+            ("indexed", np.uint8, (width,)),
+            ("symbols", f"S{SYMBOL_WIDTH}", (capacity,)),
+            # ставки снимка, NaN — записи нет
+            ("rates", np.float64, (capacity, width)),
+            ("next_time", np.int64, (capacity, width)),
+            ("row_symbols", f"S{NATIVE_WIDTH}", (capacity, width)),
+            # контракты из индекса, b"" — биржа символ не листит
+            ("natives", f"S{NATIVE_WIDTH}", (capacity, width)),
+        ]
+        size = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in layout)
+        # Обработчики запускаются supervisor и делят с ним resource_tracker:
+        # блок удаляется один раз, в Supervisor.stop
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+
+        offset = 0
+        for field, dtype, shape in layout:
+            array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            setattr(self, field, array)
+            offset += array.nbytes
+        if create:
+            self.rates.fill(np.nan)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        for field in ("header", "updated_at", "indexed", "symbols", "rates", "next_time", "row_symbols", "natives"):
+            setattr(self, field, None)
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    def read(self, func, on_retry=None):
+        """
+        Согласованное чтение: func() копирует нужные данные, при записи
+        в это время чтение повторяется (перед повтором вызывается on_retry)
+        """
+        header = self.header
+        while True:
+            seq = int(header[_SEQ])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            result = func()
+            if int(header[_SEQ]) == seq:
+                return result
+            if on_retry is not None:
+                on_retry()
+
+
+class SharedSnapshotWriter:
+    """
+    Публикация FundingSnapshot и SymbolIndex процесса сбора данных в SharedTable
+    """
+
+    def __init__(self, table: SharedTable):
+        self.table = table
+        self._symbols = []
+        self._published = None
+        self._warned = set()
+
+    def _warn(self, key, message: str, *args):
+        """
+        Предупреждение о том, что часть данных не поместилась в таблицу (один раз на причину)
+        """
+        if key not in self._warned:
+            self._warned.add(key)
+            logger.warning(message, *args)
+
+    def _fits(self, value: str, width: int) -> bool:
+        """
+        Строка помещается в поле ширины width; обрезанный идентификатор не публикуется
+        """
+        if len(value.encode()) <= width:
+            return True
+        self._warn(("width", value), "Идентификатор %r длиннее %d байт и не публикуется", value, width)
+        return False
+
+    def publish(self, snapshot: FundingSnapshot, index: SymbolIndex = None, force: bool = False) -> bool:
+        """
+        Запись текущего состояния, если оно изменилось с прошлой публикации
+        """
+        state = (snapshot.version, tuple(sorted(index.updated_at.items())) if index is not None else ())
+        if state == self._published and not force:
+            return False
+
+        table = self.table
+        column = {exchange: i for i, exchange in enumerate(table.exchanges)}
+        symbols = set(snapshot.symbols())
+        if index is not None:
+            symbols.update(symbol for _, mapping in index.items() for symbol in mapping)
+        symbols = sorted(symbol for symbol in symbols if self._fits(symbol, SYMBOL_WIDTH))
+        if len(symbols) > table.capacity:
+            self._warn(
+                "capacity",
+                "Символов %d, в общей памяти помещается %d (SHARED_MAX_SYMBOLS): остальные недоступны обработчикам",
+                len(symbols),
+                table.capacity,
+            )
+            symbols = symbols[:table.capacity]
+        row = {symbol: i for i, symbol in enumerate(symbols)}
+        n = len(symbols)
+
+        # Сначала все собирается в локальных массивах, в общую память — одним копированием
+        rates = np.full((n, len(column)), np.nan)
+        next_time = np.zeros((n, len(column)), dtype=np.int64)
+        row_symbols = np.zeros((n, len(column)), dtype=f"S{NATIVE_WIDTH}")
+        natives = np.zeros((n, len(column)), dtype=f"S{NATIVE_WIDTH}")
+        for symbol, exchange, record in snapshot.items():
+            i, j = row.get(symbol), column.get(exchange)
+            if i is None or j is None or not self._fits(record["symbol"], NATIVE_WIDTH):
+                continue
+            rates[i, j] = record["funding_rate"]
+            next_time[i, j] = record["next_funding_time"] or 0
+            row_symbols[i, j] = record["symbol"].encode()
+        indexed = np.zeros(len(column), dtype=np.uint8)
+        if index is not None:
+            for exchange, mapping in index.items():
+                j = column.get(exchange)
+                if j is None:
+                    continue
+                indexed[j] = 1
+                for symbol, native in mapping.items():
+                    i = row.get(symbol)
+                    if i is not None and self._fits(native, NATIVE_WIDTH):
+                        natives[i, j] = native.encode()
+        updated_at = np.array([snapshot.updated_at.get(exchange, 0.0) for exchange in table.exchanges])
+
+        header = table.header
+        header[_SEQ] += 1
+        try:
+            if symbols != self._symbols:
+                table.symbols[:n] = [symbol.encode() for symbol in symbols]
+                header[_SYMBOLS_VERSION] += 1
+                self._symbols = symbols
+            table.rates[:n] = rates
+            table.next_time[:n] = next_time
+            table.row_symbols[:n] = row_symbols
+            table.natives[:n] = natives
+            table.indexed[:] = indexed
+            table.updated_at[:] = updated_at
+            header[_COUNT] = n
+        finally:
+            header[_SEQ] += 1
+        self._published = state
+        return True
+
+
+class _SharedReader:
+    def __init__(self, table: SharedTable):
+        self.table = table
+        self._symbols_version = None
+        self._positions = {}
+        self._symbol_list = []
+
+    def _refresh_symbols(self):
+        """
+        Перечитывает список символов, если он менялся; вызывается внутри SharedTable.read
+        """
+        table = self.table
+        version = int(table.header[_SYMBOLS_VERSION])
+        if version != self._symbols_version:
+            n = int(table.header[_COUNT])
+            self._symbol_list = [s.decode() for s in table.symbols[:n]]
+            self._positions = {s: i for i, s in enumerate(self._symbol_list)}
+            self._symbols_version = version
+
+    def _row(self, symbol: str):
+        self._refresh_symbols()
+        return self._positions.get(canonical_symbol(symbol))
+
+    def _read(self, func):
+        return self.table.read(func, on_retry=self._invalidate)
+
+    def _invalidate(self):
+        # Список символов мог быть прочитан во время записи
+        self._symbols_version = None
+
+
+class SharedFundingSnapshot(_SharedReader):
+    """
+    FundingSnapshot только для чтения поверх SharedTable
+    """
+
+    def __init__(self, table: SharedTable, max_age: float = SNAPSHOT_MAX_AGE):
+        super().__init__(table)
+        self.max_age = max_age
+        self._matrix = None
+
+    @property
+    def version(self) -> int:
+        return int(self.table.header[_SEQ])
+
+    @property
+    def updated_at(self) -> dict:
+        values = self._read(self.table.updated_at.copy)
+        return {e: float(t) for e, t in zip(self.table.exchanges, values) if t}
+
+    def age(self, exchange: str) -> float:
+        updated_at = self.updated_at.get(exchange)
+        if updated_at is None:
+            return float("inf")
+        return time.time() - updated_at
+
+    def fresh_exchanges(self) -> set:
+        now = time.time()
+        return {exchange for exchange, t in self.updated_at.items() if now - t <= self.max_age}
+
+    def get(self, symbol: str) -> list:
+        table = self.table
+
+        def read():
+            i = self._row(symbol)
+            if i is None:
+                return None
+            return (
+                table.updated_at.copy(), table.rates[i].copy(), table.next_time[i].copy(), table.row_symbols[i].copy()
+            )
+
+        data = self._read(read)
+        if data is None:
+            return []
+        updated_at, rates, next_time, row_symbols = data
+        now = time.time()
+        return [
+            {
+                "exchange": exchange,
+                "symbol": row_symbols[j].decode(),
+                "funding_rate": float(rates[j]),
+                "next_funding_time": int(next_time[j]),
+            }
+            for j, exchange in enumerate(table.exchanges)
+            if not np.isnan(rates[j]) and updated_at[j] and now - updated_at[j] <= self.max_age
+        ]
+
+    def matrix(self):
+        """
+        Все свежие ставки матрицей (символы x биржи), как FundingSnapshot.matrix
+        """
+        table = self.table
+        fresh = tuple(sorted(self.fresh_exchanges()))
+        version = self.version
+        if self._matrix is not None and self._matrix[0] == (version, fresh):
+            return self._matrix[1]
+
+        columns = [table.exchanges.index(exchange) for exchange in fresh]
+
+        def read():
+            self._refresh_symbols()
+            return self._symbol_list, table.rates[:len(self._symbol_list)][:, columns]
+
+        symbols, rates = self._read(read)
+        listed = ~np.isnan(rates).all(axis=1)
+        result = ([s for s, keep in zip(symbols, listed) if keep], list(fresh), rates[listed])
+        self._matrix = ((version, fresh), result)
+        return result
+
+
+class SharedSymbolIndex(_SharedReader):
+    """
+    SymbolIndex только для чтения поверх SharedTable
+    """
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.table.indexed.any())
+
+    def native(self, exchange: str, symbol: str):
+        table = self.table
+        if exchange not in table.exchanges:
+            return native_symbol(exchange, canonical_symbol(symbol))
+        j = table.exchanges.index(exchange)
+
+        def read():
+            if not table.indexed[j]:
+                return False, None
+            i = self._row(symbol)
+            return True, table.natives[i, j].decode() if i is not None else ""
+
+        indexed, native = self._read(read)
+        if not indexed:
+            return native_symbol(exchange, canonical_symbol(symbol))
+        return native or None
+
+    def natives(self, exchange: str) -> list:
+        table = self.table
+        if exchange not in table.exchanges:
+            return []
+        j = table.exchanges.index(exchange)
+
+        def read():
+            n = int(table.header[_COUNT])
+            return table.natives[:n, j].copy()
+
+        return [native.decode() for native in self._read(read) if native]
+
+    def is_known(self, symbol: str, exchanges=()) -> bool:
+        if not self.ready:
+            return True
+        table = self.table
+        columns = [table.exchanges.index(e) if e in table.exchanges else None for e in exchanges]
+
+        def read():
+            if any(j is None or not table.indexed[j] for j in columns):
+                return True
+            i = self._row(symbol)
+            return i is not None and bool((table.natives[i] != b"").any())
+
+        return self._read(read)
@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from metrics import CACHE_REQUESTS
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов.
+
+    Пока запрос с ключом выполняется, остальные вызовы с тем же ключом
+    ждут его результат, а не идут на биржу повторно. Успешный результат
+    дополнительно хранится `ttl` секунд.
+    """
+
+    def __init__(self, ttl: float = 0, max_entries: int = 4096, name: str = "singleflight"):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight = {}
+        self._results = {}
+
+    async def do(self, key, func):
+        """
+        Результат func() для ключа: из кэша, из уже идущего запроса или новым запросом
+        """
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            CACHE_REQUESTS.labels(self.name, "hit").inc()
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            CACHE_REQUESTS.labels(self.name, "shared").inc()
+        else:
+            CACHE_REQUESTS.labels(self.name, "miss").inc()
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+
+        # shield: отмена одного ожидающего (например, по таймауту) не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    def _done(self, key, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+
+        now = time.monotonic()
+        if len(self._results) >= self.max_entries:
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            if len(self._results) >= self.max_entries:
+                self._results.clear()
+        self._results[key] = (now + self.ttl, task.result())
@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from constants import SNAPSHOT_MAX_AGE, SNAPSHOT_RECONCILE_INTERVAL, SNAPSHOT_REFRESH_INTERVAL
+from utils import canonical_symbol
+
+logger = logging.getLogger(__name__)
+
+# Интервалы обновления для бирж с тяжелыми ответами (секунды)
+REFRESH_INTERVALS = {
+    "BITMART": 60.0,
+    "GATE": 60.0,
+}
+
+
+class FundingSnapshot:
+    """
+    Таблица ставок финансирования в памяти: (биржа, символ) -> запись.
+    Символ хранится в каноническом виде (BTCUSDT), для каждой биржи
+    запоминается время последнего обновления.
+    """
+
+    def __init__(self, max_age: float = SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._table = {}
+        self._by_symbol = {}
+        self._symbols = {}
+        self.updated_at = {}
+        self.replaced_at = {}
+        self.version = 0
+        self._matrix = None
+
+    def update(self, exchange: str, rows: list):
+        """
+        Полностью заменяет данные биржи новым снимком
+        """
+        symbols = set()
+        for row in rows:
+            symbol = canonical_symbol(row["symbol"])
+            if not symbol.endswith("USDT"):
+                continue
+            symbols.add(symbol)
+            self._table[(exchange, symbol)] = row
+            self._by_symbol.setdefault(symbol, {})[exchange] = row
+
+        for symbol in self._symbols.get(exchange, set()) - symbols:
+            self._table.pop((exchange, symbol), None)
+            self._by_symbol.get(symbol, {}).pop(exchange, None)
+
+        self._symbols[exchange] = symbols
+        self.updated_at[exchange] = self.replaced_at[exchange] = time.time()
+        self.version += 1
+
+    def upsert(self, exchange: str, rows: list, fresh: bool = True):
+        """
+        Частичное обновление из потока: поля записей дополняют уже известные,
+        остальные символы биржи не трогаются. Новый символ добавляется, только
+        если известны и ставка, и время выплаты. fresh=False — данные биржи
+        еще неполные и время обновления не сдвигается.
+        """
+        symbols = self._symbols.setdefault(exchange, set())
+        for fields in rows:
+            symbol = canonical_symbol(fields["symbol"])
+            if not symbol.endswith("USDT"):
+                continue
+            old = self._table.get((exchange, symbol))
+            if old is None and ("funding_rate" not in fields or "next_funding_time" not in fields):
+                continue
+            row = {"exchange": exchange} if old is None else dict(old)
+            row.update(fields)
+            symbols.add(symbol)
+            self._table[(exchange, symbol)] = row
+            self._by_symbol.setdefault(symbol, {})[exchange] = row
+
+        if fresh:
+            self.updated_at[exchange] = time.time()
+        self.version += 1
+
+    def symbols(self) -> list:
+        """
+        Все символы снимка
+        """
+        return list(self._by_symbol)
+
+    def items(self):
+        """
+        Все записи снимка: (символ, биржа, запись)
+        """
+        for (exchange, symbol), row in self._table.items():
+            yield symbol, exchange, row
+
+    def age(self, exchange: str) -> float:
+        """
+        Сколько секунд прошло с последнего обновления биржи
+        """
+        updated_at = self.updated_at.get(exchange)
+        if updated_at is None:
+            return float("inf")
+        return time.time() - updated_at
+
+    def replaced_age(self, exchange: str) -> float:
+        """
+        Сколько секунд прошло с последней полной замены данных биржи (update)
+        """
+        replaced_at = self.replaced_at.get(exchange)
+        if replaced_at is None:
+            return float("inf")
+        return time.time() - replaced_at
+
+    def fresh_exchanges(self) -> set:
+        """
+        Биржи, данные которых не старше max_age
+        """
+        return {exchange for exchange in self.updated_at if self.age(exchange) <= self.max_age}
+
+    def get(self, symbol: str) -> list:
+        """
+        Свежие ставки по символу со всех бирж снимка
+        """
+        fresh = self.fresh_exchanges()
+        rows = self._by_symbol.get(canonical_symbol(symbol), {})
+        return [row for exchange, row in rows.items() if exchange in fresh]
+
+    def matrix(self):
+        """
+        Все свежие ставки матрицей (символы x биржи), NaN — символ не торгуется.
+        Матрица пересчитывается только после обновления снимка или устаревания биржи.
+        """
+        fresh = tuple(sorted(self.fresh_exchanges()))
+        if self._matrix is not None and self._matrix[0] == (self.version, fresh):
+            return self._matrix[1]
+
+        symbols = sorted(self._by_symbol)
+        exchange_index = {exchange: i for i, exchange in enumerate(fresh)}
+        rates = np.full((len(symbols), len(fresh)), np.nan)
+        for row, symbol in enumerate(symbols):
+            for exchange, record in self._by_symbol[symbol].items():
+                column = exchange_index.get(exchange)
+                if column is not None:
+                    rates[row, column] = record["funding_rate"]
+
+        result = (symbols, list(fresh), rates)
+        self._matrix = ((self.version, fresh), result)
+        return result
+
+
+class SnapshotRefresher:
+    """
+    Фоновое обновление FundingSnapshot через массовые эндпоинты бирж
+    """
+
+    def __init__(
+        self,
+        snapshot: FundingSnapshot,
+        http,
+        fetchers: dict,
+        intervals: dict = None,
+        reconcile_interval: float = SNAPSHOT_RECONCILE_INTERVAL,
+    ):
+        self.snapshot = snapshot
+        self.http = http
+        self.fetchers = fetchers
+        self.intervals = REFRESH_INTERVALS if intervals is None else intervals
+        self.reconcile_interval = reconcile_interval
+        self._tasks = []
+
+    def start(self):
+        """
+        Запуск отдельного цикла обновления для каждой биржи
+        """
+        for exchange, fetcher in self.fetchers.items():
+            interval = self.intervals.get(exchange, SNAPSHOT_REFRESH_INTERVAL)
+            self._tasks.append(asyncio.create_task(self._run(exchange, fetcher, interval)))
+
+    async def stop(self):
+        """
+        Остановка всех циклов обновления
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def refresh(self, exchange: str, fetcher):
+        """
+        Однократное обновление снимка биржи
+        """
+        rows = await fetcher(self.http)
+        if rows:
+            self.snapshot.update(exchange, rows)
+
+    async def _run(self, exchange: str, fetcher, interval: float):
+        while True:
+            # Биржу, которую обновляет WebSocket-поток, опрашиваем реже: поток
+            # может не присылать время выплаты и не убирает снятые с торгов символы.
+            # После собственного обновления возраст снимка не меньше interval
+            streamed = self.snapshot.age(exchange) < interval
+            if streamed and self.snapshot.replaced_age(exchange) < self.reconcile_interval:
+                await asyncio.sleep(interval)
+                continue
+            try:
+                await self.refresh(exchange, fetcher)
+            except Exception:
+                logger.exception("Не удалось обновить снимок %s", exchange)
+            await asyncio.sleep(interval)
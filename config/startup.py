@@ -0,0 +1,62 @@
+"""
+Отчет о времени запуска: сколько секунд прошло от старта процесса до каждого
+этапа (импорты, готовность ресурсов, начало приема обновлений, прогрев
+процессов отрисовки). Отчет печатается при запуске и есть в метрике startup_seconds.
+"""
+import logging
+import os
+import time
+
+from metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def process_uptime() -> float:
+    """
+    Секунды с момента запуска процесса (на Linux — по /proc, включая
+    старт интерпретатора; иначе — процессорное время процесса)
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Поле 22 — время старта в тиках после загрузки системы; имя процесса
+            # в скобках может содержать пробелы, поэтому поля считаются после ")"
+            started = int(f.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - started
+    except (OSError, ValueError, IndexError):
+        return time.process_time()
+
+
+class StartupReport:
+    """
+    Отметки этапов запуска относительно старта процесса
+    """
+
+    def __init__(self):
+        self._offset = process_uptime() - time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage: str) -> float:
+        elapsed = time.perf_counter() + self._offset
+        self.stages[stage] = elapsed
+        STARTUP_SECONDS.labels(stage).set(round(elapsed, 3))
+        return elapsed
+
+    def report(self, stage: str):
+        """
+        Отметка этапа и строка отчета со всеми этапами до него
+        """
+        self.mark(stage)
+        print("Запуск: " + ", ".join(f"{name} {elapsed:.2f} с" for name, elapsed in self.stages.items()))
+
+    async def warm_up(self, renderer):
+        """
+        Фоновый прогрев процессов отрисовки с отметкой этапа charts
+        """
+        try:
+            await renderer.start()
+        except Exception:
+            logger.exception("Прогрев процессов отрисовки не удался")
+            return
+        self.report("charts")
@@ -0,0 +1,328 @@
+"""
+Ставки финансирования из WebSocket-потоков бирж.
+
+На каждую биржу держится одно постоянное соединение: после подключения
+отправляется подписка, каждое сообщение с ставками сразу попадает
+в FundingSnapshot. При обрыве или долгой тишине соединение
+переоткрывается с экспоненциальной паузой и подписка повторяется.
+Пока поток жив, снимок биржи свежий и /funding не ходит на биржу по REST,
+а SnapshotRefresher перечитывает ее только раз в SNAPSHOT_RECONCILE_INTERVAL
+(время выплаты и список символов); если поток упал, через SNAPSHOT_MAX_AGE
+биржа снова опрашивается по REST с обычным интервалом.
+"""
+import asyncio
+import logging
+import random
+import time
+from abc import ABC, abstractmethod
+
+import aiohttp
+
+from constants import WS_EXCHANGES, WS_IDLE_TIMEOUT, WS_RECONNECT_MAX, WS_URL_OVERRIDE, WS_WARMUP
+from decoding import loads
+from metrics import WS_CONNECTED, WS_MESSAGES, WS_RECONNECTS
+from snapshot import FundingSnapshot
+from symbol_index import SymbolIndex
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items: list, size: int) -> list:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class StreamSource(ABC):
+    """
+    Протокол потока одной биржи: адрес, сообщения подписки,
+    пинг на уровне приложения и разбор сообщений в записи снимка
+    """
+
+    exchange = ""
+    url = ""
+    # Каждое сообщение содержит ставки по всем символам биржи
+    complete = False
+    # Подписка оформляется на каждый контракт из индекса символов
+    per_symbol = True
+    # Контрактов в одном сообщении подписки и всего на соединение
+    chunk = 50
+    max_symbols = None
+    ping_interval = 20.0
+
+    def subscribe(self, natives: list) -> list:
+        return []
+
+    def ping(self):
+        return "ping"
+
+    @abstractmethod
+    def parse(self, data) -> list:
+        """
+        Записи {"symbol": ..., "funding_rate": ..., ...}; полей, которых нет
+        в сообщении, нет и в записи (запись из одного символа — данные не менялись)
+        """
+
+
+class BinanceStream(StreamSource):
+    """
+    !markPrice@arr@1s — ставки всех контрактов раз в секунду, подписка не нужна
+    """
+
+    exchange = "BINANCE"
+    url = "wss://fstream.binance.com/ws/!markPrice@arr@1s"
+    complete = True
+    per_symbol = False
+    # Binance сам присылает ping-кадры, aiohttp отвечает на них
+    ping_interval = None
+
+    def parse(self, data) -> list:
+        if not isinstance(data, list):
+            return []
+        return [
+            {
+                "symbol": item["s"],
+                "funding_rate": float(item.get("r") or 0),
+                "next_funding_time": int(item.get("T") or 0),
+            }
+            for item in data
+        ]
+
+
+class BybitStream(StreamSource):
+    """
+    tickers.<символ>: снимок после подписки, затем только изменившиеся поля
+    """
+
+    exchange = "BYBIT"
+    url = "wss://stream.bybit.com/v5/public/linear"
+    chunk = 10
+
+    def subscribe(self, natives: list) -> list:
+        return [{"op": "subscribe", "args": [f"tickers.{s}" for s in part]} for part in _chunks(natives, self.chunk)]
+
+    def ping(self):
+        return {"op": "ping"}
+
+    def parse(self, data) -> list:
+        if not isinstance(data, dict) or not str(data.get("topic", "")).startswith("tickers."):
+            return []
+        item = data.get("data") or {}
+        row = {"symbol": item.get("symbol") or data["topic"][len("tickers."):]}
+        if item.get("fundingRate"):
+            row["funding_rate"] = float(item["fundingRate"])
+        if item.get("nextFundingTime"):
+            row["next_funding_time"] = int(item["nextFundingTime"])
+        return [row]
+
+
+class OKXStream(StreamSource):
+    """
+    Канал funding-rate: ставка сразу после подписки и при каждом пересчете
+    """
+
+    exchange = "OKX"
+    url = "wss://ws.okx.com:8443/ws/v5/public"
+    chunk = 100
+
+    def subscribe(self, natives: list) -> list:
+        return [
+            {"op": "subscribe", "args": [{"channel": "funding-rate", "instId": s} for s in part]}
+            for part in _chunks(natives, self.chunk)
+        ]
+
+    def parse(self, data) -> list:
+        if not isinstance(data, dict) or data.get("arg", {}).get("channel") != "funding-rate":
+            return []
+        return [
+            {
+                "symbol": item["instId"],
+                "funding_rate": float(item.get("fundingRate") or 0),
+                "next_funding_time": int(item.get("fundingTime") or 0),
+            }
+            for item in data.get("data", [])
+        ]
+
+
+class BitgetStream(StreamSource):
+    """
+    Канал ticker USDT-фьючерсов (не больше 1000 подписок на соединение)
+    """
+
+    exchange = "BITGET"
+    url = "wss://ws.bitget.com/v2/ws/public"
+    max_symbols = 1000
+
+    def subscribe(self, natives: list) -> list:
+        return [
+            {"op": "subscribe", "args": [{"instType": "USDT-FUTURES", "channel": "ticker", "instId": s} for s in part]}
+            for part in _chunks(natives, self.chunk)
+        ]
+
+    def parse(self, data) -> list:
+        if not isinstance(data, dict) or data.get("arg", {}).get("channel") != "ticker":
+            return []
+        rows = []
+        for item in data.get("data", []):
+            row = {"symbol": item["instId"]}
+            if item.get("fundingRate"):
+                row["funding_rate"] = float(item["fundingRate"])
+            if item.get("nextFundingTime"):
+                row["next_funding_time"] = int(item["nextFundingTime"])
+            rows.append(row)
+        return rows
+
+
+class GateStream(StreamSource):
+    """
+    futures.tickers (без времени следующей выплаты — оно берется из REST-снимка,
+    новые символы появляются после очередной сверки по REST)
+    """
+
+    exchange = "GATE"
+    url = "wss://fx-ws.gateio.ws/v4/ws/usdt"
+    chunk = 100
+
+    def subscribe(self, natives: list) -> list:
+        return [
+            {"time": int(time.time()), "channel": "futures.tickers", "event": "subscribe", "payload": part}
+            for part in _chunks(natives, self.chunk)
+        ]
+
+    def ping(self):
+        return {"time": int(time.time()), "channel": "futures.ping"}
+
+    def parse(self, data) -> list:
+        if not isinstance(data, dict) or data.get("channel") != "futures.tickers" or data.get("event") != "update":
+            return []
+        result = data.get("result") or []
+        return [
+            {"symbol": item["contract"], "funding_rate": float(item["funding_rate"])}
+            for item in result
+            if item.get("funding_rate")
+        ]
+
+
+STREAM_SOURCES = {
+    source.exchange: source
+    for source in (BinanceStream(), BybitStream(), OKXStream(), BitgetStream(), GateStream())
+}
+
+
+class StreamIngestor:
+    """
+    Постоянные WebSocket-соединения с биржами, обновляющие FundingSnapshot
+    """
+
+    def __init__(
+        self,
+        snapshot: FundingSnapshot,
+        index: SymbolIndex = None,
+        exchanges: list = WS_EXCHANGES,
+        url_override: str = WS_URL_OVERRIDE,
+        idle_timeout: float = WS_IDLE_TIMEOUT,
+        reconnect_max: float = WS_RECONNECT_MAX,
+        warmup: float = WS_WARMUP,
+    ):
+        self.snapshot = snapshot
+        self.index = index
+        self.sources = {e: STREAM_SOURCES[e] for e in exchanges if e in STREAM_SOURCES}
+        self.url_override = url_override.rstrip("/")
+        self.idle_timeout = idle_timeout
+        self.reconnect_max = reconnect_max
+        self.warmup = warmup
+        self._session = None
+        self._tasks = []
+
+    def start(self):
+        """
+        Запуск соединения с каждой биржей
+        """
+        self._session = aiohttp.ClientSession()
+        for source in self.sources.values():
+            self._tasks.append(asyncio.create_task(self._run(source)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def url(self, source: StreamSource) -> str:
+        if self.url_override:
+            return f"{self.url_override}/{source.exchange.lower()}"
+        return source.url
+
+    def natives(self, source: StreamSource) -> list:
+        """
+        Контракты для подписки (потокам без подписки — пустой список)
+        """
+        if not source.per_symbol:
+            return []
+        natives = self.index.natives(source.exchange) if self.index is not None else []
+        if not natives:
+            raise RuntimeError("список контрактов биржи еще не загружен")
+        if source.max_symbols is not None and len(natives) > source.max_symbols:
+            # Неполная подписка выдала бы биржу за свежую без части символов
+            raise RuntimeError(f"контрактов больше {source.max_symbols}, поток не поместится в одно соединение")
+        return natives
+
+    async def _run(self, source: StreamSource):
+        delay = 1.0
+        while True:
+            try:
+                if await self._connect(source):
+                    delay = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Поток %s оборвался: %r", source.exchange, e)
+            WS_RECONNECTS.labels(source.exchange).inc()
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.reconnect_max)
+
+    async def _connect(self, source: StreamSource) -> bool:
+        """
+        Одно соединение: подписка и прием сообщений до обрыва.
+        True — по соединению успели прийти ставки
+        """
+        natives = self.natives(source)
+        received = False
+        async with self._session.ws_connect(self.url(source), autoping=True) as ws:
+            for message in source.subscribe(natives):
+                await ws.send_json(message)
+            ping = asyncio.create_task(self._ping(ws, source)) if source.ping_interval else None
+            connected = time.monotonic()
+            WS_CONNECTED.labels(source.exchange).set(1)
+            try:
+                while True:
+                    msg = await ws.receive(timeout=self.idle_timeout)
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            return received
+                        continue
+                    if msg.data == "pong":
+                        continue
+                    rows = source.parse(loads(msg.data))
+                    if not rows:
+                        continue
+                    WS_MESSAGES.labels(source.exchange).inc()
+                    # Сразу после подписки пришли ставки не по всем символам
+                    fresh = source.complete or time.monotonic() - connected >= self.warmup
+                    self.snapshot.upsert(source.exchange, rows, fresh)
+                    received = True
+            finally:
+                WS_CONNECTED.labels(source.exchange).set(0)
+                if ping is not None:
+                    ping.cancel()
+
+    @staticmethod
+    async def _ping(ws, source: StreamSource):
+        while True:
+            await asyncio.sleep(source.ping_interval)
+            message = source.ping()
+            if isinstance(message, str):
+                await ws.send_str(message)
+            else:
+                await ws.send_json(message)
@@ -0,0 +1,550 @@
+"""
+Подписки на пороги ставок: /subscribe BTCUSDT spread>0.05, /subscribe * rate<-0.1.
+
+Правила хранятся в SQLite (SubscriptionStore). AlertEngine держит их в индексе:
+для каждого символа (или "*") и ряда значений — отсортированные пороги.
+После обновления снимка для символа, у которого изменилось значение, бинарным
+поиском находятся только пороги между старым и новым значением, остальные
+правила не просматриваются.
+
+Ряды значений по символу (в процентах, как в /funding): максимальная ставка
+среди бирж (rate>), минимальная (rate<) и спред (spread> и spread<).
+
+Гистерезис: сработавшее правило снова сработает, только когда значение уйдет
+за порог в обратную сторону больше чем на hysteresis, а повторное уведомление
+по тому же символу не чаще cooldown. Уведомления одного чата собираются
+в одно сообщение, отправка ограничена по скорости (AlertSender).
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import numpy as np
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from constants import (
+    SUBSCRIPTION_CHAT_INTERVAL,
+    SUBSCRIPTION_CHECK_INTERVAL,
+    SUBSCRIPTION_COOLDOWN,
+    SUBSCRIPTION_HYSTERESIS,
+    SUBSCRIPTION_HYSTERESIS_MIN,
+    SUBSCRIPTION_MAX_LINES,
+    SUBSCRIPTION_SEND_RATE,
+    SUBSCRIPTIONS_DB_PATH,
+)
+from metrics import ALERT_EVALUATE_SECONDS, ALERT_RULES, ALERTS_FIRED, ALERTS_PENDING, ALERTS_SENT
+from rate_limit import TokenBucket
+from utils import RATE_SCALE
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    op TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    created_at INTEGER NOT NULL,
+    rev INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS subscriptions_rev ON subscriptions (rev);
+CREATE INDEX IF NOT EXISTS subscriptions_chat ON subscriptions (chat_id, deleted);
+
+CREATE TABLE IF NOT EXISTS alert_state (
+    rule_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    PRIMARY KEY (rule_id, symbol)
+) WITHOUT ROWID;
+"""
+
+ANY_SYMBOL = "*"
+
+# Ряды значений символа: столбцы матрицы значений AlertEngine
+SERIES = ("high", "low", "spread")
+_CONDITION = re.compile(r"^(rate|spread)\s*([<>])\s*([+-]?\d+(?:[.,]\d+)?)$")
+
+
+def parse_condition(text: str):
+    """
+    "spread>0.05" -> ("spread", ">", 0.05); None, если условие не разобрано
+    """
+    match = _CONDITION.match(text.strip().lower())
+    if match is None:
+        return None
+    metric, op, value = match.groups()
+    return metric, op, float(value.replace(",", "."))
+
+
+class Rule:
+    """
+    Правило подписки: metric op threshold для символа или всех символов ("*")
+    """
+
+    def __init__(self, id: int, chat_id: int, symbol: str, metric: str, op: str, threshold: float):
+        self.id = id
+        self.chat_id = chat_id
+        self.symbol = symbol
+        self.metric = metric
+        self.op = op
+        self.threshold = threshold
+
+    @property
+    def series(self) -> int:
+        if self.metric == "spread":
+            return SERIES.index("spread")
+        return SERIES.index("high" if self.op == ">" else "low")
+
+    def rearm_at(self, hysteresis: float, minimum: float) -> float:
+        """
+        Значение, за которым сработавшее правило снова может сработать
+        """
+        margin = max(abs(self.threshold) * hysteresis, minimum)
+        return self.threshold - margin if self.op == ">" else self.threshold + margin
+
+    def matches(self, value: float) -> bool:
+        return value > self.threshold if self.op == ">" else value < self.threshold
+
+    def __str__(self):
+        return f"#{self.id} {self.symbol} {self.metric}{self.op}{self.threshold:g}"
+
+
+class SubscriptionStore:
+    """
+    Правила подписок и сработавшие правила в SQLite.
+    Каждое изменение получает номер (rev), по нему AlertEngine забирает
+    только новые изменения, в том числе сделанные другими процессами
+    """
+
+    def __init__(self, path: str = SUBSCRIPTIONS_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _next_rev(self) -> int:
+        # Запись сразу берет блокировку базы: номера изменений идут в порядке
+        # фиксации, даже если правила меняют несколько процессов
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM subscriptions").fetchone()[0]
+
+    def add(self, chat_id: int, symbol: str, metric: str, op: str, threshold: float) -> Rule:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO subscriptions (chat_id, symbol, metric, op, threshold, created_at, rev) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, symbol, metric, op, threshold, int(time.time()), self._next_rev()),
+            )
+        return Rule(cursor.lastrowid, chat_id, symbol, metric, op, threshold)
+
+    def remove(self, chat_id: int, rule_id: int = None) -> int:
+        """
+        Удаляет правило чата (или все правила чата, если rule_id не задан)
+        """
+        query = "UPDATE subscriptions SET deleted = 1, rev = ? WHERE chat_id = ? AND deleted = 0"
+        params = [chat_id]
+        if rule_id is not None:
+            query += " AND id = ?"
+            params.append(rule_id)
+        with self._lock, self._conn:
+            return self._conn.execute(query, [self._next_rev(), *params]).rowcount
+
+    def list(self, chat_id: int) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, symbol, metric, op, threshold FROM subscriptions "
+                "WHERE chat_id = ? AND deleted = 0 ORDER BY id",
+                (chat_id,),
+            ).fetchall()
+        return [Rule(*row) for row in rows]
+
+    def changes(self, since: int) -> tuple:
+        """
+        Изменения после rev = since: (последний rev, [(правило, удалено), ...])
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, symbol, metric, op, threshold, deleted, rev FROM subscriptions "
+                "WHERE rev > ? ORDER BY rev",
+                (since,),
+            ).fetchall()
+        if not rows:
+            return since, []
+        return rows[-1][-1], [(Rule(*row[:6]), bool(row[6])) for row in rows]
+
+    def active(self) -> set:
+        with self._lock:
+            return set(self._conn.execute("SELECT rule_id, symbol FROM alert_state").fetchall())
+
+    def save_active(self, added: list, removed: list):
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO alert_state VALUES (?, ?)", added)
+            self._conn.executemany("DELETE FROM alert_state WHERE rule_id = ? AND symbol = ?", removed)
+
+    def forget_rules(self, rule_ids: list):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM alert_state WHERE rule_id = ?", [(i,) for i in rule_ids])
+
+
+class _Thresholds:
+    """
+    Отсортированные точки (порог или точка сброса) с правилами
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.entries = []
+
+    def add(self, key: float, rule: Rule, trigger: bool):
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.entries.insert(i, (rule, trigger))
+
+    def remove(self, key: float, rule: Rule):
+        for i in range(bisect_left(self.keys, key), bisect_right(self.keys, key)):
+            if self.entries[i][0] is rule:
+                del self.keys[i]
+                del self.entries[i]
+                return
+
+    def rising(self, old: float, new: float) -> list:
+        # Точки, которые значение пересекло снизу вверх: old <= key < new
+        return self.entries[bisect_left(self.keys, old):bisect_left(self.keys, new)]
+
+    def falling(self, old: float, new: float) -> list:
+        # Сверху вниз: new < key <= old
+        return self.entries[bisect_right(self.keys, new):bisect_right(self.keys, old)]
+
+
+class RuleIndex:
+    """
+    Пороги правил по (символ, ряд). В up — точки, важные при росте значения
+    (порог ">" и сброс "<"), в down — при падении (порог "<" и сброс ">")
+    """
+
+    def __init__(self, hysteresis: float = SUBSCRIPTION_HYSTERESIS, minimum: float = SUBSCRIPTION_HYSTERESIS_MIN):
+        self.hysteresis = hysteresis
+        self.minimum = minimum
+        self._points = {}
+        self.rules = {}
+
+    def _lists(self, symbol: str, series: int) -> tuple:
+        return self._points.setdefault((symbol, series), (_Thresholds(), _Thresholds()))
+
+    def add(self, rule: Rule):
+        up, down = self._lists(rule.symbol, rule.series)
+        rearm = rule.rearm_at(self.hysteresis, self.minimum)
+        if rule.op == ">":
+            up.add(rule.threshold, rule, True)
+            down.add(rearm, rule, False)
+        else:
+            down.add(rule.threshold, rule, True)
+            up.add(rearm, rule, False)
+        self.rules[rule.id] = rule
+
+    def remove(self, rule_id: int):
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return None
+        up, down = self._points[(rule.symbol, rule.series)]
+        rearm = rule.rearm_at(self.hysteresis, self.minimum)
+        if rule.op == ">":
+            up.remove(rule.threshold, rule)
+            down.remove(rearm, rule)
+        else:
+            down.remove(rule.threshold, rule)
+            up.remove(rearm, rule)
+        return rule
+
+    def crossed(self, symbol: str, series: int, old: float, new: float):
+        """
+        (правило, True — сработало / False — сброшено) для точек между old и new.
+        old = NaN — значение видно впервые, проверяются все пороги
+        """
+        first = np.isnan(old)
+        for scope in (symbol, ANY_SYMBOL):
+            lists = self._points.get((scope, series))
+            if lists is None:
+                continue
+            up, down = lists
+            if first:
+                yield from up.rising(-np.inf, new)
+                yield from down.falling(np.inf, new)
+            elif new > old:
+                yield from up.rising(old, new)
+            elif new < old:
+                yield from down.falling(old, new)
+
+
+class AlertSender:
+    """
+    Очередь уведомлений: строки одного чата объединяются в одно сообщение,
+    сообщения в чат — не чаще chat_interval, всего — не больше rate в секунду
+    """
+
+    def __init__(
+        self,
+        bot,
+        rate: float = SUBSCRIPTION_SEND_RATE,
+        chat_interval: float = SUBSCRIPTION_CHAT_INTERVAL,
+        max_lines: int = SUBSCRIPTION_MAX_LINES,
+        on_blocked=None,
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate, rate)
+        self.chat_interval = chat_interval
+        self.max_lines = max_lines
+        self.on_blocked = on_blocked
+        self._pending = OrderedDict()
+        self.pending = 0
+        self._next_send = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def push(self, chat_id: int, line: str):
+        self._pending.setdefault(chat_id, []).append(line)
+        self.pending += 1
+        ALERTS_PENDING.labels().set(self.pending)
+        self._wakeup.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _text(self, lines: list) -> str:
+        text = "🔔 " + "\n🔔 ".join(lines[:self.max_lines])
+        if len(lines) > self.max_lines:
+            text += f"\n… и еще {len(lines) - self.max_lines}"
+        return text
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = time.monotonic()
+            chat_id = next((c for c in self._pending if self._next_send.get(c, 0.0) <= now), None)
+            if chat_id is None:
+                await asyncio.sleep(min(self._next_send[c] for c in self._pending) - now)
+                continue
+
+            lines = self._pending.pop(chat_id)
+            self.pending -= len(lines)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, self._text(lines))
+                ALERTS_SENT.labels("ok").inc()
+            except TelegramRetryAfter as e:
+                # Вернуть в начало очереди и подождать
+                self._pending[chat_id] = lines + self._pending.get(chat_id, [])
+                self._pending.move_to_end(chat_id, last=False)
+                self.pending += len(lines)
+                self.bucket.block(e.retry_after)
+                ALERTS_SENT.labels("retry").inc()
+                continue
+            except TelegramForbiddenError:
+                # Бот заблокирован пользователем: подписки чата больше не нужны
+                ALERTS_SENT.labels("blocked").inc()
+                if self.on_blocked is not None:
+                    self.on_blocked(chat_id)
+            except Exception:
+                ALERTS_SENT.labels("error").inc()
+                logger.exception("Не удалось отправить уведомление в чат %s", chat_id)
+            finally:
+                ALERTS_PENDING.labels().set(self.pending)
+            self._next_send[chat_id] = time.monotonic() + self.chat_interval
+
+
+class AlertEngine:
+    """
+    Проверка правил после каждого обновления снимка и отправка уведомлений
+    """
+
+    def __init__(
+        self,
+        store: SubscriptionStore,
+        snapshot,
+        bot,
+        interval: float = SUBSCRIPTION_CHECK_INTERVAL,
+        cooldown: float = SUBSCRIPTION_COOLDOWN,
+    ):
+        self.store = store
+        self.snapshot = snapshot
+        self.interval = interval
+        self.cooldown = cooldown
+        self.index = RuleIndex()
+        self.sender = AlertSender(bot, on_blocked=self._blocked)
+        self._rev = 0
+        self._active = store.active()
+        self._added, self._removed = [], []
+        self._notified = {}
+        self._version = None
+        self._symbols = []
+        self._positions = {}
+        self._exchanges = []
+        self._rates = np.empty((0, 0))
+        self._values = np.empty((0, len(SERIES)))
+        self._task = None
+
+    def start(self):
+        self.sender.start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.sender.stop()
+
+    def _blocked(self, chat_id: int):
+        self.store.remove(chat_id)
+
+    async def _run(self):
+        while True:
+            try:
+                self.sync()
+                self.evaluate()
+            except Exception:
+                logger.exception("Ошибка проверки подписок")
+            await asyncio.sleep(self.interval)
+
+    def sync(self):
+        """
+        Изменения правил из SubscriptionStore; новые правила сразу
+        проверяются по текущим значениям
+        """
+        rev, changes = self.store.changes(self._rev)
+        self._rev = rev
+        if not changes:
+            return
+        added, removed = [], []
+        for rule, deleted in changes:
+            self.index.remove(rule.id)
+            if deleted:
+                removed.append(rule.id)
+            else:
+                self.index.add(rule)
+                added.append(rule)
+        if removed:
+            gone = set(removed)
+            self._active = {key for key in self._active if key[0] not in gone}
+            self.store.forget_rules(removed)
+        for rule in added:
+            self._check_rule(rule)
+        self._flush()
+        ALERT_RULES.labels().set(len(self.index.rules))
+
+    def _check_rule(self, rule: Rule):
+        column = self._values[:, rule.series]
+        if rule.symbol == ANY_SYMBOL:
+            rows = np.flatnonzero(column > rule.threshold if rule.op == ">" else column < rule.threshold)
+        else:
+            i = self._positions.get(rule.symbol)
+            rows = [i] if i is not None and rule.matches(column[i]) else []
+        for i in rows:
+            self._trigger(rule, int(i))
+
+    def _values_of(self, rates: np.ndarray) -> np.ndarray:
+        """
+        Максимальная и минимальная ставка и спред по каждому символу, в процентах
+        """
+        listed = ~np.isnan(rates)
+        count = listed.sum(axis=1)
+        high = np.where(listed, rates, -np.inf).max(axis=1, initial=-np.inf)
+        low = np.where(listed, rates, np.inf).min(axis=1, initial=np.inf)
+        values = np.column_stack([high, low, high - low]) * RATE_SCALE
+        values[count == 0] = np.nan
+        values[count < 2, SERIES.index("spread")] = np.nan
+        return values
+
+    def evaluate(self):
+        """
+        Проверка правил после обновления снимка: только символы, у которых
+        изменились значения, и только пороги между старым и новым значением
+        """
+        version = self.snapshot.version
+        if version == self._version:
+            return
+        started = time.perf_counter()
+        symbols, exchanges, rates = self.snapshot.matrix()
+        values = self._values_of(rates)
+
+        if symbols == self._symbols:
+            old = self._values
+        else:
+            old = np.full(values.shape, np.nan)
+            for i, symbol in enumerate(symbols):
+                j = self._positions.get(symbol)
+                if j is not None:
+                    old[i] = self._values[j]
+            self._positions = {symbol: i for i, symbol in enumerate(symbols)}
+        self._version = version
+        self._symbols, self._exchanges, self._rates, self._values = symbols, exchanges, rates, values
+
+        if self.index.rules:
+            changed = (values != old) & ~np.isnan(values)
+            for i, series in zip(*np.nonzero(changed)):
+                for rule, trigger in self.index.crossed(symbols[i], series, old[i, series], values[i, series]):
+                    if trigger:
+                        self._trigger(rule, int(i))
+                    else:
+                        self._rearm(rule, symbols[i])
+            self._flush()
+        ALERT_EVALUATE_SECONDS.labels().observe(time.perf_counter() - started)
+
+    def _trigger(self, rule: Rule, i: int):
+        symbol = self._symbols[i]
+        key = (rule.id, symbol)
+        if key in self._active:
+            return
+        self._active.add(key)
+        self._added.append(key)
+        ALERTS_FIRED.labels(rule.metric).inc()
+
+        now = time.monotonic()
+        if now - self._notified.get(key, -np.inf) < self.cooldown:
+            return
+        self._notified[key] = now
+        self.sender.push(rule.chat_id, self._describe(rule, i))
+
+    def _rearm(self, rule: Rule, symbol: str):
+        key = (rule.id, symbol)
+        if key in self._active:
+            self._active.discard(key)
+            self._removed.append(key)
+
+    def _flush(self):
+        if self._added or self._removed:
+            self.store.save_active(self._added, self._removed)
+            self._added, self._removed = [], []
+
+    def _describe(self, rule: Rule, i: int) -> str:
+        symbol = self._symbols[i]
+        value = self._values[i, rule.series]
+        side = "выше" if rule.op == ">" else "ниже"
+        rates = self._rates[i]
+        high = self._exchanges[int(np.nanargmax(rates))]
+        low = self._exchanges[int(np.nanargmin(rates))]
+        if rule.metric == "spread":
+            what = f"спред {value:.3f}% ({high} ↔ {low})"
+        else:
+            what = f"ставка {value:.3f}% на {high if rule.op == '>' else low}"
+        return f"{symbol}: {what} {side} {rule.threshold:g}% (#{rule.id})"
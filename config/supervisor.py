@@ -0,0 +1,221 @@
+"""
+Многопроцессный режим: python supervisor.py
+
+Один процесс собирает данные (массовые эндпоинты, WebSocket-потоки, индекс
+символов) и публикует таблицу ставок и индекс в общую память (shared_snapshot).
+WORKERS процессов обрабатывают обновления Telegram через webhook на одном
+порту (SO_REUSEPORT, соединения распределяет ядро) и читают ставки из общей
+памяти, поэтому число обработчиков не умножает запросы к биржам.
+Упавший процесс перезапускается.
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+import time
+
+from bot import create_bot, run_webhook
+from chart_cache import ChartCache
+from charts import ChartRenderer
+from constants import METRICS_PORT, SHARED_PUBLISH_INTERVAL, WORKERS, WS_ENABLED
+from funding_fetcher import (
+    BULK_FETCHERS,
+    INSTRUMENT_FETCHERS,
+    LIVE_FETCHERS,
+    history_health,
+    history_probes,
+    live_health,
+    live_probes,
+)
+from history_store import HistoryStore
+from http_client import HttpClientManager
+from metrics import start_metrics_server
+from shared_snapshot import SharedFundingSnapshot, SharedSnapshotWriter, SharedSymbolIndex, SharedTable
+from snapshot import FundingSnapshot, SnapshotRefresher
+from ssl_patch import patch_ssl_correctly
+from startup import StartupReport
+from streaming import StreamIngestor
+from subscriptions import AlertEngine, SubscriptionStore
+from symbol_index import SymbolIndex
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего процесса (секунды)
+RESTART_DELAY = 1.0
+
+
+async def ingest(table_name: str):
+    """
+    Процесс сбора данных: обновление снимка и индекса, публикация в общую память
+    """
+    patch_ssl_correctly()
+    table = SharedTable(list(LIVE_FETCHERS), name=table_name)
+    writer = SharedSnapshotWriter(table)
+    http = HttpClientManager()
+    snapshot = FundingSnapshot()
+    refresher = SnapshotRefresher(snapshot, http, BULK_FETCHERS)
+    index = SymbolIndex()
+    index.load()
+    streams = StreamIngestor(snapshot, index) if WS_ENABLED else None
+
+    refresher.start()
+    index.start(http, INSTRUMENT_FETCHERS)
+    if streams is not None:
+        streams.start()
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
+    try:
+        writer.publish(snapshot, index, force=True)
+        while True:
+            await asyncio.sleep(SHARED_PUBLISH_INTERVAL)
+            writer.publish(snapshot, index)
+    finally:
+        if streams is not None:
+            await streams.stop()
+        await refresher.stop()
+        await index.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await http.close()
+        table.close()
+
+
+async def serve(table_name: str, worker: int):
+    """
+    Процесс-обработчик: webhook на общем порту, ставки и индекс из общей памяти
+    """
+    startup = StartupReport()
+    startup.mark("imports")
+    patch_ssl_correctly()
+    table = SharedTable(list(LIVE_FETCHERS), name=table_name)
+    snapshot = SharedFundingSnapshot(table)
+    index = SharedSymbolIndex(table)
+    bot, dp = create_bot()
+    http = HttpClientManager()
+    store = HistoryStore(index=index)
+    renderer = ChartRenderer()
+    subscriptions = SubscriptionStore()
+    # Подписки проверяет и рассылает один обработчик, правила добавляют все
+    alerts = AlertEngine(subscriptions, snapshot, bot) if worker == 0 else None
+
+    live_health.start(live_probes(http))
+    history_health.start(history_probes(http))
+    if alerts is not None:
+        alerts.start()
+    metrics_runner = await start_metrics_server(port=METRICS_PORT + 1 + worker) if METRICS_PORT else None
+
+    async def on_startup():
+        startup.report("updates")
+
+    dp.startup.register(on_startup)
+    startup.mark("ready")
+    warm_up = asyncio.create_task(startup.warm_up(renderer))
+    try:
+        await run_webhook(
+            bot,
+            dp,
+            reuse_port=True,
+            set_webhook=worker == 0,
+            http=http,
+            snapshot=snapshot,
+            index=index,
+            store=store,
+            renderer=renderer,
+            chart_cache=ChartCache(),
+            subscriptions=subscriptions,
+        )
+    finally:
+        warm_up.cancel()
+        if alerts is not None:
+            await alerts.stop()
+        await live_health.stop()
+        await history_health.stop()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await http.close()
+        store.close()
+        subscriptions.close()
+        renderer.close()
+        table.close()
+
+
+def _process_main(func, *args):
+    # SIGTERM от supervisor завершает процесс так же, как Ctrl+C: с закрытием ресурсов
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        asyncio.run(func(*args))
+    except KeyboardInterrupt:
+        pass
+
+
+class Supervisor:
+    """
+    Процесс сбора данных и `workers` обработчиков с перезапуском упавших
+    """
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self.context = multiprocessing.get_context("spawn")
+        self.table = None
+        self._processes = {}
+
+    def _spawn(self, role: str):
+        if role == "ingest":
+            args = (ingest, self.table.name)
+        else:
+            args = (serve, self.table.name, int(role.split("-")[1]))
+        # Не daemon: у обработчиков свои процессы отрисовки графиков
+        process = self.context.Process(target=_process_main, args=args, name=role)
+        process.start()
+        self._processes[role] = process
+
+    def start(self):
+        self.table = SharedTable(list(LIVE_FETCHERS), create=True)
+        self._spawn("ingest")
+        for worker in range(self.workers):
+            self._spawn(f"worker-{worker}")
+
+    def watch(self):
+        """
+        Перезапуск завершившихся процессов, пока supervisor не остановят
+        """
+        while True:
+            time.sleep(RESTART_DELAY)
+            for role, process in list(self._processes.items()):
+                if not process.is_alive():
+                    logger.warning("Процесс %s завершился с кодом %s, перезапуск", role, process.exitcode)
+                    self._spawn(role)
+
+    def stop(self, timeout: float = 10.0):
+        # Повторный сигнал не должен прервать остановку и оставить блок общей памяти
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+        self._processes.clear()
+        if self.table is not None:
+            self.table.close()
+            self.table.unlink()
+            self.table = None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    supervisor = Supervisor()
+    supervisor.start()
+    print(f"Supervisor: сбор данных и {supervisor.workers} обработчиков запущены")
+    try:
+        supervisor.watch()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
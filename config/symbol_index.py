@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from constants import SYMBOL_INDEX_PATH, SYMBOL_INDEX_REFRESH_INTERVAL
+from utils import canonical_symbol
+
+logger = logging.getLogger(__name__)
+
+
+def _base(symbol: str) -> str:
+    return symbol[:-len("USDT")] if symbol.endswith("USDT") else symbol
+
+
+# Правила перевода BTCUSDT в формат биржи, если ее список контрактов неизвестен
+NATIVE_RULES = {
+    "MEXC": lambda s: f"{_base(s)}_USDT",
+    "WEEX": lambda s: f"{_base(s)}_USDT",
+    "OURBIT": lambda s: f"{_base(s)}_USDT",
+    "GATE": lambda s: f"{_base(s)}_USDT",
+    "BINGX": lambda s: f"{_base(s)}-USDT",
+    "HTX": lambda s: f"{_base(s)}-USDT",
+    "BLOFIN": lambda s: f"{_base(s)}-USDT",
+    "OKX": lambda s: f"{_base(s)}-USDT-SWAP",
+    "KUCOIN": lambda s: "XBTUSDTM" if s == "BTCUSDT" else f"{s}M",
+    "XT": lambda s: f"{_base(s).lower()}_usdt",
+}
+
+
+class SymbolIndex:
+    """
+    Индекс символов: канонический BTCUSDT -> идентификатор контракта на каждой бирже.
+
+    Строится по спискам контрактов бирж, периодически обновляется и
+    сохраняется на диск, чтобы после перезапуска сразу быть готовым.
+    Если символа нет в списке биржи, биржа не опрашивается; символ,
+    которого нет ни на одной бирже индекса, отклоняется сразу, если
+    все опрашиваемые биржи есть в индексе.
+    """
+
+    def __init__(self, path: str = SYMBOL_INDEX_PATH):
+        self.path = path
+        self._native = {}
+        self.updated_at = {}
+        self._task = None
+
+    def load(self):
+        """
+        Загрузка индекса с диска
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Не удалось прочитать индекс символов %s", self.path)
+            return
+        self._native = data.get("native", {})
+        self.updated_at = data.get("updated_at", {})
+
+    def save(self):
+        """
+        Сохранение индекса на диск (через временный файл)
+        """
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"native": self._native, "updated_at": self.updated_at}, f)
+        os.replace(tmp_path, self.path)
+
+    def update(self, exchange: str, natives: list):
+        """
+        Замена списка контрактов биржи
+        """
+        mapping = {}
+        for native in natives:
+            symbol = canonical_symbol(native)
+            if symbol.endswith("USDT"):
+                mapping.setdefault(symbol, native)
+        self._native[exchange] = mapping
+        self.updated_at[exchange] = time.time()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._native)
+
+    def native(self, exchange: str, symbol: str):
+        """
+        Идентификатор символа на бирже или None, если биржа его не листит
+        """
+        symbol = canonical_symbol(symbol)
+        mapping = self._native.get(exchange)
+        if mapping is not None:
+            return mapping.get(symbol)
+        return native_symbol(exchange, symbol)
+
+    def items(self):
+        """
+        (биржа, {символ: контракт}) для всех бирж индекса
+        """
+        return self._native.items()
+
+    def natives(self, exchange: str) -> list:
+        """
+        Все контракты биржи из индекса
+        """
+        return list(self._native.get(exchange, {}).values())
+
+    def is_known(self, symbol: str, exchanges=()) -> bool:
+        """
+        Может ли символ торговаться хотя бы на одной бирже.
+        exchanges — опрашиваемые биржи: если среди них есть биржа без списка
+        контрактов (NATIVE_RULES), символ может быть только на ней и не отклоняется.
+        Пока индекс пуст, все символы считаются известными.
+        """
+        if not self.ready or any(exchange not in self._native for exchange in exchanges):
+            return True
+        symbol = canonical_symbol(symbol)
+        return any(symbol in mapping for mapping in self._native.values())
+
+    async def refresh(self, http, fetchers: dict):
+        """
+        Обновление списков контрактов всех бирж и сохранение на диск
+        """
+        exchanges = list(fetchers)
+        results = await asyncio.gather(*(fetchers[e](http) for e in exchanges), return_exceptions=True)
+        for exchange, res in zip(exchanges, results):
+            if isinstance(res, Exception) or not res:
+                logger.warning("Не удалось обновить список контрактов %s: %r", exchange, res)
+                continue
+            self.update(exchange, res)
+        await asyncio.to_thread(self.save)
+
+    def start(self, http, fetchers: dict, interval: float = SYMBOL_INDEX_REFRESH_INTERVAL):
+        """
+        Фоновое периодическое обновление индекса
+        """
+        self._task = asyncio.create_task(self._run(http, fetchers, interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, http, fetchers: dict, interval: float):
+        while True:
+            try:
+                await self.refresh(http, fetchers)
+            except Exception:
+                logger.exception("Не удалось обновить индекс символов")
+            await asyncio.sleep(interval)
+
+
+def native_symbol(exchange: str, symbol: str, index: SymbolIndex = None):
+    """
+    Символ в формате биржи: по индексу, если он есть, иначе по правилам NATIVE_RULES.
+    None — биржа символ не листит.
+    """
+    if index is not None:
+        return index.native(exchange, symbol)
+    rule = NATIVE_RULES.get(exchange)
+    return rule(symbol) if rule else symbol
@@ -1,35 +1,86 @@
-import itertools
 from datetime import datetime
 
+import numpy as np
+
+# funding_rate в графиках, /top_spreads и подписках переводится в проценты так же, как в /funding
+RATE_SCALE = 100 * 100
+
 
 def calc_spread(rate1, rate2):
     """
     Подсчет спреда
     """
-    if (rate1 >= 0 and rate2 < 0) or (rate1 < 0 and rate2 >= 0):
-        return abs(rate1) + abs(rate2)
     return abs(rate1 - rate2)
 
 
 def calc_max_spread(data):
     """
-    Подсчет максимального спреда
+    Подсчет максимального спреда: разница между максимальной и минимальной ставкой
+    """
+    tracker = SpreadTracker()
+    for row in data:
+        tracker.add(row)
+    return tracker.result()
+
+
+def calc_top_spreads(symbols, exchanges, rates, n):
+    """
+    ТОП-n символов по максимальному спреду между биржами.
+    rates — матрица (символы x биржи), NaN если символ на бирже не торгуется.
+    Возвращает [(символ, спред, биржа с макс. ставкой, биржа с мин. ставкой), ...]
+    """
+    if not len(symbols) or n <= 0:
+        return []
+
+    listed = ~np.isnan(rates)
+    rows = np.flatnonzero(listed.sum(axis=1) >= 2)
+    if not len(rows):
+        return []
+
+    matrix = rates[rows]
+    high = np.nanargmax(matrix, axis=1)
+    low = np.nanargmin(matrix, axis=1)
+    spreads = matrix[np.arange(len(rows)), high] - matrix[np.arange(len(rows)), low]
+
+    n = min(n, len(rows))
+    top = np.argpartition(-spreads, n - 1)[:n]
+    top = top[np.argsort(-spreads[top])]
+    return [
+        (symbols[rows[i]], float(spreads[i]), exchanges[high[i]], exchanges[low[i]])
+        for i in top
+    ]
+
+
+class SpreadTracker:
+    """
+    Инкрементальный подсчет максимального спреда:
+    хранит биржи с минимальной и максимальной ставкой
     """
-    max_spread = 0
-    max_pair = ("", "")
-    for a, b in itertools.combinations(data, 2):
-        spread = calc_spread(a["funding_rate"], b["funding_rate"])
-        if spread > max_spread:
-            max_spread = spread
-            max_pair = (a["exchange"], b["exchange"])
-    return max_spread, max_pair
+
+    def __init__(self):
+        self.low = None
+        self.high = None
+
+    def add(self, row):
+        if self.low is None or row["funding_rate"] < self.low["funding_rate"]:
+            self.low = row
+        if self.high is None or row["funding_rate"] > self.high["funding_rate"]:
+            self.high = row
+
+    def result(self):
+        """
+        (спред, (биржа с максимальной ставкой, биржа с минимальной))
+        """
+        if self.low is None or self.low is self.high:
+            return 0, ("", "")
+        return self.high["funding_rate"] - self.low["funding_rate"], (self.high["exchange"], self.low["exchange"])
 
 
 def normalize_funding_data(data):
     """
     Приводит raw данные из разных бирж к единому виду:
     - funding_rate в процентах, 6 знаков после запятой
-    - next_funding_time в формате HH:MM:SS
+    - next_funding_time в формате HH:MM:SS ("—", если биржа его не отдала)
     """
     normalized = []
     for item in data:
@@ -41,7 +92,7 @@ def normalize_funding_data(data):
 
             ts /= 1000
 
-        dt = datetime.utcfromtimestamp(ts).strftime("%H:%M:%S")
+        dt = datetime.utcfromtimestamp(ts).strftime("%H:%M:%S") if ts else "—"
 
         normalized.append({
             "exchange": item.get("exchange"),
@@ -50,3 +101,16 @@ def normalize_funding_data(data):
             "next_funding_time": dt
         })
     return normalized
+
+
+def canonical_symbol(symbol):
+    """
+    Приводит биржевой символ к единому виду BTCUSDT:
+    BTC_USDT, BTC-USDT, BTC-USDT-SWAP, XBTUSDTM -> BTCUSDT
+    """
+    canonical = symbol.upper().replace("-SWAP", "").replace("_", "").replace("-", "")
+    if canonical.endswith("USDTM"):
+        canonical = canonical[:-1]
+    if canonical.startswith("XBT"):
+        canonical = "BTC" + canonical[3:]
+    return canonical